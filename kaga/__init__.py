@@ -69,6 +69,9 @@ URL = os.environ.get("URL", "")
 PORT = int(os.environ.get("PORT", 5000))
 CERT_PATH = os.environ.get("CERT_PATH") or None
 DB_URI = os.environ.get("DATABASE_URL")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 30))
 MONGO_URI = os.environ.get("MONGO_DB_URI")
 API_ID = os.environ.get('API_ID', None)
 API_HASH = os.environ.get('API_HASH', None)
@@ -81,6 +84,8 @@ SUPPORT_CHAT = os.environ.get('SUPPORT_CHAT', None)
 DEL_CMDS = bool(os.environ.get("DEL_CMDS")) or False
 STRICT_GBAN = bool(os.environ.get("STRICT_GBAN")) or False
 WORKERS = int(os.environ.get("WORKERS", 8))
+ADMIN_CACHE_SIZE = int(os.environ.get("ADMIN_CACHE_SIZE", 50000))
+ADMIN_CACHE_TTL = int(os.environ.get("ADMIN_CACHE_TTL", 60 * 10))
 BAN_STICKER = os.environ.get("BAN_STICKER", "CAACAgQAAx0CSIsLDQACORpf4wqgqJc9c1TFa0Mi_mqItZE2KwACfgEAAj2wWQa-nzvcrdrGrR4E")
 CUSTOM_CMD = os.environ.get("CUSTOM_CMD") or False
 API_WEATHER = os.environ.get("API_OPENWEATHER") or None
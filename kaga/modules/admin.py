@@ -21,8 +21,8 @@ from kaga.modules.helper_funcs.chat_status import (
     bot_admin,
     can_pin,
     can_promote,
+    invalidate_admin_cache,
     user_admin,
-    ADMIN_CACHE,
 )
 from kaga.modules.helper_funcs.extraction import (
     extract_user,
@@ -78,6 +78,7 @@ def promote(update, context):
         can_restrict_members=bot_member.can_restrict_members,
         can_pin_messages=bot_member.can_pin_messages,
     )
+    invalidate_admin_cache(chat_id)
 
     message.reply_text("Promoted🧡")
     return (
@@ -139,6 +140,7 @@ def demote(update, context):
             can_restrict_members=False,
             can_pin_messages=False,
         )
+        invalidate_admin_cache(chat.id)
         message.reply_text("Berhasil diturunkan!")
         return (
             "<b>{}:</b>"
@@ -515,10 +517,7 @@ def set_desc(update, context):
 @user_admin
 @typing_action
 def refresh_admin(update, _):
-    try:
-        ADMIN_CACHE.pop(update.effective_chat.id)
-    except KeyError:
-        pass
+    invalidate_admin_cache(update.effective_chat.id)
 
     update.effective_message.reply_text("Cache admin disegarkan!")
 
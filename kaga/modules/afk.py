@@ -1,6 +1,5 @@
 """Afk module: Tell anyone if you away from keyboard."""
 import random
-from time import sleep
 
 from telegram import MessageEntity
 from telegram.error import BadRequest
@@ -12,6 +11,7 @@ from kaga.modules.disable import (
     DisableAbleCommandHandler,
     DisableAbleMessageHandler,
 )
+from kaga.modules.helper_funcs.alternate import delete_after
 from kaga.modules.no_sql import afk_db
 from kaga.modules.users import get_user_id
 
@@ -46,11 +46,7 @@ def afk(update, context):
     afksend = msg.reply_text(
         afkstr.format(update.effective_user.first_name, notice)
     )
-    sleep(5)
-    try:
-        afksend.delete()
-    except BadRequest:
-        return
+    delete_after(5, afksend)
 
 """This function to check user afk or not""" 
 def no_longer_afk(update, context):
@@ -80,8 +76,7 @@ def no_longer_afk(update, context):
             unafk = update.effective_message.reply_text(
                 chosen_option.format(firstname)
             )
-            sleep(10)
-            unafk.delete()
+            delete_after(10, unafk)
         except BaseException:
             return
 
@@ -161,11 +156,7 @@ def check_afk(update, context, user_id, fst_name, userc_id):
             replafk = update.effective_message.reply_text(
                 res, parse_mode="html"
             )
-        sleep(10)
-        try:
-            replafk.delete()
-        except BadRequest:
-            return
+        delete_after(10, replafk)
 
 
 def __gdpr__(user_id):
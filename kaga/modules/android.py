@@ -1,17 +1,16 @@
-import time
-
 from bs4 import BeautifulSoup
 from hurry.filesize import size as sizee
-from requests import get
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ParseMode
-from telegram.error import BadRequest
 
 from kaga import dispatcher
 from kaga.modules.disable import DisableAbleCommandHandler
-from kaga.modules.helper_funcs.alternate import typing_action
+from kaga.modules.helper_funcs.alternate import delete_after, typing_action
+from kaga.modules.helper_funcs.http_client import get
 
 GITHUB = "https://github.com"
 DEVICES_DATA = "https://raw.githubusercontent.com/androidtrackers/certified-android-devices/master/by_device.json"
+# Release manifests and device lists change a few times a day at most
+RELEASES_TTL = 30 * 60
 
 
 @typing_action
@@ -23,7 +22,7 @@ def magisk(update, context):
         "Beta": ["master/beta", "master"],
         "Canary": ["canary/canary", "canary"],
     }.items():
-        data = get(url + branch[0] + ".json").json()
+        data = get(url + branch[0] + ".json", cache_ttl=RELEASES_TTL).json()
         if str(type) == "Canary":
             data["magisk"]["link"] = (
                 "https://github.com/topjohnwu/magisk_files/raw/canary/"
@@ -50,15 +49,7 @@ def magisk(update, context):
         parse_mode=ParseMode.MARKDOWN,
         disable_web_page_preview=True,
     )
-    time.sleep(300)
-    try:
-        del_msg.delete()
-        update.effective_message.delete()
-    except BadRequest as err:
-        if (err.message == "Message to delete not found") or (
-            err.message == "Message can't be deleted"
-        ):
-            return
+    delete_after(300, del_msg, update.effective_message)
 
 
 @typing_action
@@ -73,17 +64,11 @@ def device(update, context):
             parse_mode=ParseMode.MARKDOWN,
             disable_web_page_preview=True,
         )
-        time.sleep(5)
-        try:
-            del_msg.delete()
-            update.effective_message.delete()
-        except BadRequest as err:
-            if (err.message == "Message to delete not found") or (
-                err.message == "Message can't be deleted"
-            ):
-                return
+        delete_after(5, del_msg, update.effective_message)
+        return
+
     device = " ".join(args)
-    db = get(DEVICES_DATA).json()
+    db = get(DEVICES_DATA, cache_ttl=RELEASES_TTL).json()
     newdevice = device.strip("lte") if device.startswith("beyond") else device
     try:
         reply = f"Hasil pencarian {device}:\n\n"
@@ -103,15 +88,9 @@ def device(update, context):
             parse_mode=ParseMode.MARKDOWN,
             disable_web_page_preview=True,
         )
-        time.sleep(5)
-        try:
-            del_msg.delete()
-            update.effective_message.delete()
-        except BadRequest as err:
-            if (err.message == "Message to delete not found") or (
-                err.message == "Message can't be deleted"
-            ):
-                return
+        delete_after(5, del_msg, update.effective_message)
+        return
+
     update.message.reply_text(
         "{}".format(reply),
         parse_mode=ParseMode.HTML,
@@ -131,16 +110,11 @@ def twrp(update, context):
             parse_mode=ParseMode.MARKDOWN,
             disable_web_page_preview=True,
         )
-        time.sleep(5)
-        try:
-            del_msg.delete()
-            update.effective_message.delete()
-        except BadRequest:
-            pass
+        delete_after(5, del_msg, update.effective_message)
         return
 
     device = " ".join(args)
-    url = get(f"https://eu.dl.twrp.me/{device}/")
+    url = get(f"https://eu.dl.twrp.me/{device}/", cache_ttl=RELEASES_TTL)
     if url.status_code == 404:
         reply = f"Tidak dapat menemukan unduhan twrp untuk {device}!\n"
         del_msg = update.effective_message.reply_text(
@@ -148,18 +122,10 @@ def twrp(update, context):
             parse_mode=ParseMode.MARKDOWN,
             disable_web_page_preview=True,
         )
-        time.sleep(5)
-        try:
-            del_msg.delete()
-            update.effective_message.delete()
-        except BadRequest as err:
-            if (err.message == "Message to delete not found") or (
-                err.message == "Message can't be deleted"
-            ):
-                return
+        delete_after(5, del_msg, update.effective_message)
     else:
         reply = f"*TWRP Resmi terbaru untuk {device}*\n"
-        db = get(DEVICES_DATA).json()
+        db = get(DEVICES_DATA, cache_ttl=RELEASES_TTL).json()
         newdevice = (
             device.strip("lte") if device.startswith("beyond") else device
         )
@@ -209,7 +175,10 @@ def los(update, context) -> str:
         )
         return
 
-    fetch = get(f"https://download.lineageos.org/api/v1/{device}/nightly/*")
+    fetch = get(
+        f"https://download.lineageos.org/api/v1/{device}/nightly/*",
+        cache_ttl=RELEASES_TTL,
+    )
     if fetch.status_code == 200 and len(fetch.json()["response"]) != 0:
         usr = fetch.json()
         data = len(usr["response"]) - 1  # the latest rom are below
@@ -253,7 +222,8 @@ def gsi(update, context):
     update.effective_chat
 
     usr = get(
-        f"https://api.github.com/repos/phhusson/treble_experimentations/releases/latest"
+        f"https://api.github.com/repos/phhusson/treble_experimentations/releases/latest",
+        cache_ttl=RELEASES_TTL,
     ).json()
     reply_text = "*Rilis terbaru Gsi*\n"
     for i in range(len(usr)):
@@ -284,7 +254,10 @@ def bootleg(update, context) -> str:
         )
         return
 
-    fetch = get("https://bootleggersrom-devices.github.io/api/devices.json")
+    fetch = get(
+        "https://bootleggersrom-devices.github.io/api/devices.json",
+        cache_ttl=RELEASES_TTL,
+    )
     if fetch.status_code == 200:
         data = fetch.json()
 
@@ -4,12 +4,12 @@ import textwrap
 
 import bs4
 import jikanpy
-import requests
 from kaga import DEV_USERS, OWNER_ID, dispatcher
 from kaga.modules.disable import DisableAbleCommandHandler
 from telegram import (InlineKeyboardButton, InlineKeyboardMarkup, ParseMode,
                       Update)
 from telegram.ext import CallbackContext, CallbackQueryHandler
+from kaga.modules.helper_funcs import http_client
 from kaga.modules.helper_funcs.alternate import typing_action
 
 info_btn = "More Information"
@@ -157,6 +157,8 @@ query ($id: Int,$search: String) {
 """
 
 url = 'https://graphql.anilist.co'
+# AniList answers are reused for a while, popular titles get asked for a lot
+ANILIST_TTL = 30 * 60
 
 
 @typing_action
@@ -168,11 +170,11 @@ def airing(update, context):
             'Tell Anime Name :) ( /airing <anime name>)')
         return
     variables = {'search': search_str[1]}
-    response = requests.post(
+    response = http_client.post(
         url, json={
             'query': airing_query,
             'variables': variables
-        }).json()['data']['Media']
+        }, cache_ttl=ANILIST_TTL).json()['data']['Media']
     msg = f"*Name*: *{response['title']['romaji']}*(`{response['title']['native']}`)\n*ID*: `{response['id']}`"
     if response['nextAiringEpisode']:
         time = response['nextAiringEpisode']['timeUntilAiring'] * 1000
@@ -193,11 +195,11 @@ def anime(update, context):
     else:
         search = search[1]
     variables = {'search': search}
-    json = requests.post(
+    json = http_client.post(
         url, json={
             'query': anime_query,
             'variables': variables
-        }).json()
+        }, cache_ttl=ANILIST_TTL).json()
     if 'errors' in json.keys():
         update.effective_message.reply_text('Anime not found')
         return
@@ -260,11 +262,11 @@ def character(update, context):
         return
     search = search[1]
     variables = {'query': search}
-    json = requests.post(
+    json = http_client.post(
         url, json={
             'query': character_query,
             'variables': variables
-        }).json()
+        }, cache_ttl=ANILIST_TTL).json()
     if 'errors' in json.keys():
         update.effective_message.reply_text('Character not found')
         return
@@ -295,11 +297,11 @@ def manga(update, contextupdate, context):
         return
     search = search[1]
     variables = {'search': search}
-    json = requests.post(
+    json = http_client.post(
         url, json={
             'query': manga_query,
             'variables': variables
-        }).json()
+        }, cache_ttl=ANILIST_TTL).json()
     msg = ''
     if 'errors' in json.keys():
         update.effective_message.reply_text('Manga not found')
@@ -498,7 +500,7 @@ def site_search(update: Update, context: CallbackContext, site: str):
 
     if site == "kaizoku":
         search_url = f"https://animekaizoku.com/?s={search_query}"
-        html_text = requests.get(search_url).text
+        html_text = http_client.get(search_url, cache_ttl=ANILIST_TTL).text
         soup = bs4.BeautifulSoup(html_text, "html.parser")
         search_result = soup.find_all("h2", {'class': "post-title"})
 
@@ -514,7 +516,7 @@ def site_search(update: Update, context: CallbackContext, site: str):
 
     elif site == "kayo":
         search_url = f"https://animekayo.com/?s={search_query}"
-        html_text = requests.get(search_url).text
+        html_text = http_client.get(search_url, cache_ttl=ANILIST_TTL).text
         soup = bs4.BeautifulSoup(html_text, "html.parser")
         search_result = soup.find_all("h2", {'class': "title"})
 
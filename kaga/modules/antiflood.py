@@ -3,18 +3,26 @@ from typing import Optional
 
 from telegram import Chat, ChatPermissions, Message, User
 from telegram.error import BadRequest
-from telegram.ext import CommandHandler, Filters, MessageHandler
+from telegram.ext import CommandHandler, Filters
 from telegram.utils.helpers import mention_html
 
 from kaga import dispatcher
 from kaga.modules.connection import connected
 from kaga.modules.helper_funcs.alternate import send_message, typing_action
-from kaga.modules.helper_funcs.chat_status import is_user_admin, user_admin
+from kaga.modules.helper_funcs.chat_status import user_admin
+from kaga.modules.helper_funcs.moderation import (
+    register_stage,
+    sender_is_admin,
+    stage_settings,
+)
 from kaga.modules.helper_funcs.string_handling import extract_time
 from kaga.modules.log_channel import loggable
 from kaga.modules.sql import antiflood_sql as sql
 
 FLOOD_GROUP = 3
+# Bounds of the chat rate, in multiples of the flood limit, that starts spike mode
+MIN_SPIKE_FACTOR = 5
+MAX_SPIKE_FACTOR = 100
 
 
 @loggable
@@ -26,9 +34,11 @@ def check_flood(update, context) -> str:
     if not user:  # ignore channels
         return ""
 
+    if not stage_settings(update, "antiflood"):
+        return ""
+
     # ignore admins
-    if is_user_admin(chat, user.id):
-        sql.update_flood(chat.id, None)
+    if sender_is_admin(update):
         return ""
 
     should_ban = sql.update_flood(chat.id, user.id)
@@ -360,6 +370,83 @@ Contoh nilai waktu: 4m = 4 menit, 3h = 3 jam, 6d = 6 hari, 5w = 5 minggu.""",
     return ""
 
 
+@user_admin
+@loggable
+@typing_action
+def flood_spike(update, context) -> str:
+    args = context.args
+    chat = update.effective_chat
+    user = update.effective_user
+    msg = update.effective_message
+
+    if not args:
+        enabled, factor = sql.get_flood_spike(chat.id)
+        send_message(
+            msg,
+            "Mode lonjakan flood: `{}`\n"
+            "Saat seluruh obrolan mengirim lebih dari `{}` kali batas flood "
+            "dalam {} detik, batas flood menjadi setengah (minimal {}).\n"
+            "Penggunaan: `/floodspike on [kelipatan]` atau `/floodspike off`".format(
+                "on" if enabled else "off",
+                factor,
+                sql.FLOOD_WINDOW,
+                sql.MIN_SPIKE_LIMIT,
+            ),
+            parse_mode="markdown",
+        )
+        return ""
+
+    if args[0].lower() in ("off", "no"):
+        sql.set_flood_spike(chat.id, False)
+        send_message(msg, "Mode lonjakan flood : off")
+        return (
+            "<b>{}:</b>"
+            "\n#FLOOD_SPIKE"
+            "\n<b>Admin:</b> {}"
+            "\nHas toggled flood spike mode to <b>OFF</b>.".format(
+                html.escape(chat.title),
+                mention_html(user.id, user.first_name),
+            )
+        )
+
+    if args[0].lower() not in ("on", "yes"):
+        send_message(msg, "Saya hanya mengerti 'on/yes' atau 'off/no'.")
+        return ""
+
+    factor = None
+    if len(args) >= 2:
+        if not args[1].isdigit() or not (
+            MIN_SPIKE_FACTOR <= int(args[1]) <= MAX_SPIKE_FACTOR
+        ):
+            send_message(
+                msg,
+                "Kelipatan harus berupa angka antara {} dan {}.".format(
+                    MIN_SPIKE_FACTOR, MAX_SPIKE_FACTOR
+                ),
+            )
+            return ""
+        factor = int(args[1])
+
+    sql.set_flood_spike(chat.id, True, factor=factor)
+    _, factor = sql.get_flood_spike(chat.id)
+    send_message(
+        msg,
+        "Mode lonjakan flood : on\n"
+        "Batas flood menjadi setengah saat obrolan mengirim lebih dari {} kali "
+        "batas flood dalam {} detik.".format(factor, sql.FLOOD_WINDOW),
+    )
+    return (
+        "<b>{}:</b>"
+        "\n#FLOOD_SPIKE"
+        "\n<b>Admin:</b> {}"
+        "\nHas toggled flood spike mode to <b>ON</b> ({}x the flood limit).".format(
+            html.escape(chat.title),
+            mention_html(user.id, user.first_name),
+            factor,
+        )
+    )
+
+
 def __migrate__(old_chat_id, new_chat_id):
     sql.migrate_chat(old_chat_id, new_chat_id)
 
@@ -375,7 +462,7 @@ def __chat_settings__(chat_id, user_id):
 __help__ = """
 Kau tahu bagaimana kadang-kadang, orang bergabung, mengirim 100 pesan, dan merusak obrolan Anda? Dengan antiflood, itu tidak terjadi lagi!
 
-Antiflood memungkinkan Anda mengambil tindakan pada pengguna yang mengirim lebih dari x pesan berturut-turut. Melebihi flood yang ditetapkan \
+Antiflood memungkinkan Anda mengambil tindakan pada pengguna yang mengirim lebih dari x pesan dalam 10 detik. Melebihi flood yang ditetapkan \
 akan mengakibatkan pembatasan pengguna tersebut.
 
  × /flood: Dapatkan setelan pengendalian flood saat ini
@@ -384,6 +471,7 @@ akan mengakibatkan pembatasan pengguna tersebut.
 
  × /setflood <int/'no'/'off'>: mengaktifkan atau menonaktifkan pengendalian flood.
  × /setfloodmode <ban/kick/mute/tban/tmute> <value>: Aksi yang harus dilakukan ketika pengguna telah melampaui batas flood. ban/kick/mute/tmute/tban
+ × /floodspike <on/off> [kelipatan]: saat seluruh obrolan dibanjiri lebih dari kelipatan x batas flood dalam 10 detik, batas flood menjadi setengah, minimal 3 (bawaan: 10). Nonaktif secara bawaan.
 
  *Catatan*:
  - Nilai harus diisi untuk tban dan tmute!
@@ -397,11 +485,6 @@ akan mengakibatkan pembatasan pengguna tersebut.
 
 __mod_name__ = "Antiflood"
 
-FLOOD_BAN_HANDLER = MessageHandler(
-    Filters.all & ~Filters.status_update & Filters.chat_type.groups,
-    check_flood,
-    run_async=True,
-)
 SET_FLOOD_HANDLER = CommandHandler(
     "setflood", set_flood, pass_args=True, run_async=True
 )  # , filters=Filters.chat_type.groups)
@@ -410,8 +493,22 @@ SET_FLOOD_MODE_HANDLER = CommandHandler(
 )  # , filters=Filters.chat_type.groups)
 # , filters=Filters.chat_type.groups)
 FLOOD_HANDLER = CommandHandler("flood", flood, run_async=True)
+FLOOD_SPIKE_HANDLER = CommandHandler(
+    "floodspike",
+    flood_spike,
+    pass_args=True,
+    filters=Filters.chat_type.groups,
+    run_async=True,
+)
 
-dispatcher.add_handler(FLOOD_BAN_HANDLER, FLOOD_GROUP)
+register_stage(
+    FLOOD_GROUP,
+    "antiflood",
+    check_flood,
+    filters=~Filters.status_update,
+    settings=sql.get_flood_limit,
+)
 dispatcher.add_handler(SET_FLOOD_HANDLER)
 dispatcher.add_handler(SET_FLOOD_MODE_HANDLER)
 dispatcher.add_handler(FLOOD_HANDLER)
+dispatcher.add_handler(FLOOD_SPIKE_HANDLER)
@@ -1,7 +1,6 @@
 import json
-import os
 import time
-from io import BytesIO
+from io import BytesIO, TextIOWrapper
 
 from telegram import ParseMode
 from telegram.error import BadRequest
@@ -97,9 +96,19 @@ def import_data(update, context):
         else:
             data = data[list(data.keys())[0]]["hashes"]
 
+        report = []
         try:
             for mod in DATA_IMPORT:
-                mod.__import_data__(str(chat.id), data)
+                started = time.monotonic()
+                count = mod.__import_data__(str(chat.id), data)
+                elapsed = time.monotonic() - started
+                LOGGER.info(
+                    "Imported %s for %s in %.2fs", mod.__mod_name__, chat.id, elapsed
+                )
+                if isinstance(count, int):
+                    report.append(
+                        " × {}: {} ({:.2f} detik)".format(mod.__mod_name__, count, elapsed)
+                    )
         except Exception:
             msg.reply_text(
                 "Timbul galat saat memulihkan data Anda. Proses gagal. Jika Anda mengalami masalah dengan ini, silakan tanyakan @HayakaRyu"
@@ -119,6 +128,8 @@ def import_data(update, context):
             text = "Pencadangan sepenuhnya dipulihkan pada *{}*.".format(chat_name)
         else:
             text = "Pencadangan sepenuhnya dipulihkan"
+        if report:
+            text += "\n" + "\n".join(report)
         msg.reply_text(text, parse_mode="markdown")
 
 
@@ -167,82 +178,13 @@ def export_data(update, context):
         if user.id != OWNER_ID or user.id not in DEV_USERS:
             put_chat(chat_id, new_jam, chat_data)
 
+    # Notes, with the buttons of every note read in one query
     note_list = sql.get_all_chat_notes(chat_id)
-    backup = {}
-    notes = {}
-    # button = ""
-    buttonlist = []
-    namacat = ""
-    isicat = ""
-    rules = ""
-    count = 0
-    countbtn = 0
-    # Notes
-    for note in note_list:
-        count += 1
-        # getnote = sql.get_note(chat_id, note.name)
-        namacat += "{}<###splitter###>".format(note.name)
-        if note.msgtype == 1:
-            tombol = sql.get_buttons(chat_id, note.name)
-            # keyb = []
-            for btn in tombol:
-                countbtn += 1
-                if btn.same_line:
-                    buttonlist.append(
-                        ("{}".format(btn.name), "{}".format(btn.url), True)
-                    )
-                else:
-                    buttonlist.append(
-                        ("{}".format(btn.name), "{}".format(btn.url), False)
-                    )
-            isicat += (
-                "###button###: {}<###button###>{}<###splitter###>".format(
-                    note.value, str(buttonlist)
-                )
-            )
-            buttonlist.clear()
-        elif note.msgtype == 2:
-            isicat += "###sticker###:{}<###splitter###>".format(note.file)
-        elif note.msgtype == 3:
-            isicat += (
-                "###file###:{}<###TYPESPLIT###>{}<###splitter###>".format(
-                    note.file, note.value
-                )
-            )
-        elif note.msgtype == 4:
-            isicat += (
-                "###photo###:{}<###TYPESPLIT###>{}<###splitter###>".format(
-                    note.file, note.value
-                )
-            )
-        elif note.msgtype == 5:
-            isicat += (
-                "###audio###:{}<###TYPESPLIT###>{}<###splitter###>".format(
-                    note.file, note.value
-                )
-            )
-        elif note.msgtype == 6:
-            isicat += (
-                "###voice###:{}<###TYPESPLIT###>{}<###splitter###>".format(
-                    note.file, note.value
-                )
-            )
-        elif note.msgtype == 7:
-            isicat += (
-                "###video###:{}<###TYPESPLIT###>{}<###splitter###>".format(
-                    note.file, note.value
-                )
-            )
-        elif note.msgtype == 8:
-            isicat += "###video_note###:{}<###TYPESPLIT###>{}<###splitter###>".format(
-                note.file, note.value
-            )
-        else:
-            isicat += "{}<###splitter###>".format(note.value)
-    for x in range(count):
-        notes[
-            "#{}".format(namacat.split("<###splitter###>")[x])
-        ] = "{}".format(isicat.split("<###splitter###>")[x])
+    chat_buttons = sql.get_chat_buttons(chat_id)
+    notes = {
+        "#{}".format(note.name): export_note(note, chat_buttons.get(note.name, []))
+        for note in note_list
+    }
     # Rules
     rules = chat_rules(chat_id)
     # Blacklist
@@ -330,6 +272,7 @@ def export_data(update, context):
     # Warns (TODO)
     # warns = warnssql.get_warns(chat_id)
     # Backing up
+    backup = {}
     backup[chat_id] = {
         "bot": context.bot.id,
         "hashes": {
@@ -340,9 +283,13 @@ def export_data(update, context):
             "locks": locks,
         },
     }
-    baccinfo = json.dumps(backup, indent=4)
-    with open("KagaRobot{}.backup".format(chat_id), "w") as f:
-        f.write(str(baccinfo))
+    # Serialized straight into the buffer that gets uploaded
+    backup_file = BytesIO()
+    writer = TextIOWrapper(backup_file, encoding="utf-8")
+    json.dump(backup, writer, indent=4)
+    writer.flush()
+    writer.detach()
+    backup_file.seek(0)
     context.bot.sendChatAction(current_chat_id, "upload_document")
     tgl = time.strftime("%H:%M:%S - %d/%m/%Y", time.localtime(time.time()))
     try:
@@ -357,7 +304,8 @@ def export_data(update, context):
         pass
     context.bot.sendDocument(
         current_chat_id,
-        document=open("KagaRobot{}.backup".format(chat_id), "rb"),
+        document=backup_file,
+        filename="KagaRobot{}.backup".format(chat_id),
         caption="*Berhasil mencadangkan:*\nChat: `{}`\nChat ID: `{}`\nDi: `{}`\n\nCatatan: Ini `KagaRobot-Backup` dibuat khusus untuk catatan.".format(
             chat.title, chat_id, tgl
         ),
@@ -365,7 +313,32 @@ def export_data(update, context):
         reply_to_message_id=msg.message_id,
         parse_mode=ParseMode.MARKDOWN,
     )
-    os.remove("KagaRobot{}.backup".format(chat_id))  # Cleaning file
+
+
+NOTE_TYPE_PREFIXES = {
+    3: "###file###",
+    4: "###photo###",
+    5: "###audio###",
+    6: "###voice###",
+    7: "###video###",
+    8: "###video_note###",
+}
+
+
+def export_note(note, buttons):
+    if note.msgtype == 1:
+        buttonlist = [
+            ("{}".format(btn.name), "{}".format(btn.url), bool(btn.same_line))
+            for btn in buttons
+        ]
+        return "###button###: {}<###button###>{}".format(note.value, str(buttonlist))
+    if note.msgtype == 2:
+        return "###sticker###:{}".format(note.file)
+    if note.msgtype in NOTE_TYPE_PREFIXES:
+        return "{}:{}<###TYPESPLIT###>{}".format(
+            NOTE_TYPE_PREFIXES[note.msgtype], note.file, note.value
+        )
+    return "{}".format(note.value)
 
 
 # Temporary data
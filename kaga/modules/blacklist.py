@@ -1,21 +1,18 @@
 import html
-import re
 
 from telegram import ChatPermissions, ParseMode
 from telegram.error import BadRequest
-from telegram.ext import CommandHandler, Filters, MessageHandler
+from telegram.ext import CommandHandler, Filters
 from telegram.utils.helpers import mention_html
 
 from kaga import LOGGER, dispatcher
 from kaga.modules.connection import connected
 from kaga.modules.disable import DisableAbleCommandHandler
 from kaga.modules.helper_funcs.alternate import send_message, typing_action
-from kaga.modules.helper_funcs.chat_status import (
-    user_admin,
-    user_not_admin,
-)
+from kaga.modules.helper_funcs.chat_status import user_admin
 from kaga.modules.helper_funcs.extraction import extract_text
 from kaga.modules.helper_funcs.misc import split_message
+from kaga.modules.helper_funcs.moderation import register_stage, stage_settings
 from kaga.modules.helper_funcs.string_handling import extract_time
 from kaga.modules.no_sql import blacklist_db
 from kaga.modules.log_channel import loggable
@@ -353,7 +350,13 @@ def findall(p, s):
         i = s.find(p, i + 1)
 
 
-@user_not_admin
+def chat_blacklist_settings(chat_id):
+    """The blacklist mode of a chat, or None when it has no blacklist."""
+    if not blacklist_db.get_chat_blacklist(chat_id):
+        return None
+    return blacklist_db.get_blacklist_setting(chat_id)
+
+
 def del_blacklist(update, context):
     chat = update.effective_chat
     message = update.effective_message
@@ -363,92 +366,90 @@ def del_blacklist(update, context):
     if not to_match:
         return
 
-    getmode, value = blacklist_db.get_blacklist_setting(chat.id)
-
-    chat_filters = blacklist_db.get_chat_blacklist(chat.id)
-    for trigger in chat_filters:
-        pattern = r"( |^|[^\w])" + re.escape(trigger) + r"( |$|[^\w])"
-        if re.search(pattern, to_match, flags=re.IGNORECASE):
-            try:
-                if getmode == 0:
-                    return
-                elif getmode == 1:
-                    message.delete()
-                elif getmode == 2:
-                    message.delete()
-                    warn(
-                        update.effective_user,
-                        chat,
-                        ("Menggunakan pemicu daftar hitam: {}".format(trigger)),
-                        message,
-                        update.effective_user,
-                    )
-                    return
-                elif getmode == 3:
-                    message.delete()
-                    bot.restrict_chat_member(
-                        chat.id,
-                        update.effective_user.id,
-                        permissions=ChatPermissions(can_send_messages=False),
-                    )
-                    bot.sendMessage(
-                        chat.id,
-                        f"Dibisukan {user.first_name} untuk menggunakan kata dalam Daftar Hitam: {trigger}!",
-                    )
-                    return
-                elif getmode == 4:
-                    message.delete()
-                    res = chat.unban_member(update.effective_user.id)
-                    if res:
-                        bot.sendMessage(
-                            chat.id,
-                            f"Ditendang {user.first_name} untuk menggunakan kata dalam Daftar Hitam: {trigger}!",
-                        )
-                    return
-                elif getmode == 5:
-                    message.delete()
-                    chat.kick_member(user.id)
-                    bot.sendMessage(
-                        chat.id,
-                        f"Dilarang {user.first_name} untuk menggunakan kata dalam Daftar Hitam: {trigger}",
-                    )
-                    return
-                elif getmode == 6:
-                    message.delete()
-                    bantime = extract_time(message, value)
-                    chat.kick_member(user.id, until_date=bantime)
-                    bot.sendMessage(
-                        chat.id,
-                        f"Dilarang {user.first_name} sampai '{value}' untuk menggunakan kata dalam Daftar Hitam: {trigger}!",
-                    )
-                    return
-                elif getmode == 7:
-                    message.delete()
-                    mutetime = extract_time(message, value)
-                    bot.restrict_chat_member(
-                        chat.id,
-                        user.id,
-                        until_date=mutetime,
-                        permissions=ChatPermissions(can_send_messages=False),
-                    )
-                    bot.sendMessage(
-                        chat.id,
-                        f"Dibisukan {user.first_name} sampai '{value}' untuk menggunakan kata dalam Daftar Hitam {trigger}!",
-                    )
-                    return
-            except BadRequest as excp:
-                if excp.message == "Pesan untuk dihapus tidak ditemukan":
-                    pass
-                else:
-                    LOGGER.exception("Kesalahan saat menghapus pesan daftar hitam.")
-            break
+    getmode, value = stage_settings(update, "blacklist")
+
+    trigger = blacklist_db.get_blacklist_match(chat.id, to_match)
+    if not trigger:
+        return
+
+    try:
+        if getmode == 0:
+            return
+        elif getmode == 1:
+            message.delete()
+        elif getmode == 2:
+            message.delete()
+            warn(
+                update.effective_user,
+                chat,
+                ("Menggunakan pemicu daftar hitam: {}".format(trigger)),
+                message,
+                update.effective_user,
+            )
+            return
+        elif getmode == 3:
+            message.delete()
+            bot.restrict_chat_member(
+                chat.id,
+                update.effective_user.id,
+                permissions=ChatPermissions(can_send_messages=False),
+            )
+            bot.sendMessage(
+                chat.id,
+                f"Dibisukan {user.first_name} untuk menggunakan kata dalam Daftar Hitam: {trigger}!",
+            )
+            return
+        elif getmode == 4:
+            message.delete()
+            res = chat.unban_member(update.effective_user.id)
+            if res:
+                bot.sendMessage(
+                    chat.id,
+                    f"Ditendang {user.first_name} untuk menggunakan kata dalam Daftar Hitam: {trigger}!",
+                )
+            return
+        elif getmode == 5:
+            message.delete()
+            chat.kick_member(user.id)
+            bot.sendMessage(
+                chat.id,
+                f"Dilarang {user.first_name} untuk menggunakan kata dalam Daftar Hitam: {trigger}",
+            )
+            return
+        elif getmode == 6:
+            message.delete()
+            bantime = extract_time(message, value)
+            chat.kick_member(user.id, until_date=bantime)
+            bot.sendMessage(
+                chat.id,
+                f"Dilarang {user.first_name} sampai '{value}' untuk menggunakan kata dalam Daftar Hitam: {trigger}!",
+            )
+            return
+        elif getmode == 7:
+            message.delete()
+            mutetime = extract_time(message, value)
+            bot.restrict_chat_member(
+                chat.id,
+                user.id,
+                until_date=mutetime,
+                permissions=ChatPermissions(can_send_messages=False),
+            )
+            bot.sendMessage(
+                chat.id,
+                f"Dibisukan {user.first_name} sampai '{value}' untuk menggunakan kata dalam Daftar Hitam {trigger}!",
+            )
+            return
+    except BadRequest as excp:
+        if excp.message == "Pesan untuk dihapus tidak ditemukan":
+            pass
+        else:
+            LOGGER.exception("Kesalahan saat menghapus pesan daftar hitam.")
 
 
 def __import_data__(chat_id, data):
     # set chat blacklist
     blacklist = data.get("blacklist", {})
-    for trigger in blacklist:
-        blacklist_db.add_to_blacklist(chat_id, trigger)
+    return blacklist_db.add_many_to_blacklist(chat_id, blacklist)
 
 
 def __migrate__(old_chat_id, new_chat_id):
@@ -494,15 +495,16 @@ UNBLACKLIST_HANDLER = CommandHandler(
 BLACKLISTMODE_HANDLER = CommandHandler(
     "blacklistmode", blacklist_mode, pass_args=True, run_async=True
 )
-BLACKLIST_DEL_HANDLER = MessageHandler(
-    (Filters.text | Filters.command | Filters.sticker | Filters.photo)
-    & Filters.chat_type.groups,
-    del_blacklist,
-    run_async=True,
-)
 
 dispatcher.add_handler(BLACKLIST_HANDLER)
 dispatcher.add_handler(ADD_BLACKLIST_HANDLER)
 dispatcher.add_handler(UNBLACKLIST_HANDLER)
 dispatcher.add_handler(BLACKLISTMODE_HANDLER)
-dispatcher.add_handler(BLACKLIST_DEL_HANDLER, group=BLACKLIST_GROUP)
+register_stage(
+    BLACKLIST_GROUP,
+    "blacklist",
+    del_blacklist,
+    filters=Filters.text | Filters.command | Filters.sticker | Filters.photo,
+    skip_admins=True,
+    settings=chat_blacklist_settings,
+)
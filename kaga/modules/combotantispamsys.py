@@ -3,6 +3,7 @@ import re
 from typing import Optional, List
 
 import kaga.modules.helper_funcs.cas_api as cas
+from kaga.modules.helper_funcs.antispam import forget_verdict
 
 from telegram import Message, Chat, Update, Bot, User, CallbackQuery, ChatMember, ParseMode, InlineKeyboardMarkup, InlineKeyboardButton, MessageEntity
 from telegram.error import BadRequest
@@ -177,6 +178,7 @@ def casquery(update, context) -> str:
         msg.reply_text("Terjadi masalah saat mengurai kueri.")
         return
     text = "Permintaan Anda kembali: "
+    forget_verdict(user_id)
     result = cas.banchecker(user_id)
     text += str(result)
     msg.reply_text(text)        
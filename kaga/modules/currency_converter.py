@@ -1,9 +1,9 @@
-import requests
 import time
 from kaga import CASH_API_KEY, dispatcher
 from telegram import Update, ParseMode
 from telegram.error import BadRequest
 from telegram.ext import CommandHandler
+from kaga.modules.helper_funcs import http_client
 from kaga.modules.helper_funcs.alternate import typing_action
 
 
@@ -28,7 +28,7 @@ def convert(update, context):
                        f"&from_currency={orig_cur}"
                        f"&to_currency={new_cur}"
                        f"&apikey={CASH_API_KEY}")
-        response = requests.get(request_url).json()
+        response = http_client.get(request_url, cache_ttl=5 * 60).json()
         try:
             current_rate = float(
                 response['Realtime Currency Exchange Rate']['5. Exchange Rate'])
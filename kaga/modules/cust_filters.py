@@ -1,4 +1,3 @@
-import re
 from html import escape
 
 import telegram
@@ -278,200 +277,198 @@ def reply_filter(update, context):
     if not to_match:
         return
 
-    chat_filters = sql.get_chat_triggers(chat.id)
-    for keyword in chat_filters:
-        pattern = r"( |^|[^\w])" + re.escape(keyword) + r"( |$|[^\w])"
-        if re.search(pattern, to_match, flags=re.IGNORECASE):
-            filt = sql.get_filter(chat.id, keyword)
-            if filt.reply == "harus ada balasan baru":
-                buttons = sql.get_buttons(chat.id, filt.keyword)
-                keyb = build_keyboard_parser(context.bot, chat.id, buttons)
-                keyboard = InlineKeyboardMarkup(keyb)
-
-                VALID_WELCOME_FORMATTERS = [
-                    "first",
-                    "last",
-                    "fullname",
-                    "username",
-                    "id",
-                    "chatname",
-                    "mention",
-                ]
-                if filt.reply_text:
-                    valid_format = escape_invalid_curly_brackets(
-                        filt.reply_text, VALID_WELCOME_FORMATTERS
-                    )
-                    if valid_format:
-                        filtext = valid_format.format(
-                            first=escape(message.from_user.first_name),
-                            last=escape(
-                                message.from_user.last_name
-                                or message.from_user.first_name
-                            ),
-                            fullname=" ".join(
-                                [
-                                    escape(message.from_user.first_name),
-                                    escape(message.from_user.last_name),
-                                ]
-                                if message.from_user.last_name
-                                else [escape(message.from_user.first_name)]
-                            ),
-                            username="@" + escape(message.from_user.username)
-                            if message.from_user.username
-                            else mention_html(
-                                message.from_user.id,
-                                message.from_user.first_name,
-                            ),
-                            mention=mention_html(
-                                message.from_user.id,
-                                message.from_user.first_name,
-                            ),
-                            chatname=escape(message.chat.title)
-                            if message.chat.type != "private"
-                            else escape(message.from_user.first_name),
-                            id=message.from_user.id,
-                        )
-                    else:
-                        filtext = ""
-                else:
-                    filtext = ""
+    keyword = sql.get_chat_trigger_match(chat.id, to_match)
+    if not keyword:
+        return
 
-                if filt.file_type in (sql.Types.BUTTON_TEXT, sql.Types.TEXT):
+    filt = sql.get_filter(chat.id, keyword)
+    if filt.reply == "harus ada balasan baru":
+        buttons = sql.get_buttons(chat.id, filt.keyword)
+        keyb = build_keyboard_parser(context.bot, chat.id, buttons)
+        keyboard = InlineKeyboardMarkup(keyb)
+
+        VALID_WELCOME_FORMATTERS = [
+            "first",
+            "last",
+            "fullname",
+            "username",
+            "id",
+            "chatname",
+            "mention",
+        ]
+        if filt.reply_text:
+            valid_format = escape_invalid_curly_brackets(
+                filt.reply_text, VALID_WELCOME_FORMATTERS
+            )
+            if valid_format:
+                filtext = valid_format.format(
+                    first=escape(message.from_user.first_name),
+                    last=escape(
+                        message.from_user.last_name
+                        or message.from_user.first_name
+                    ),
+                    fullname=" ".join(
+                        [
+                            escape(message.from_user.first_name),
+                            escape(message.from_user.last_name),
+                        ]
+                        if message.from_user.last_name
+                        else [escape(message.from_user.first_name)]
+                    ),
+                    username="@" + escape(message.from_user.username)
+                    if message.from_user.username
+                    else mention_html(
+                        message.from_user.id,
+                        message.from_user.first_name,
+                    ),
+                    mention=mention_html(
+                        message.from_user.id,
+                        message.from_user.first_name,
+                    ),
+                    chatname=escape(message.chat.title)
+                    if message.chat.type != "private"
+                    else escape(message.from_user.first_name),
+                    id=message.from_user.id,
+                )
+            else:
+                filtext = ""
+        else:
+            filtext = ""
+
+        if filt.file_type in (sql.Types.BUTTON_TEXT, sql.Types.TEXT):
+            try:
+                context.bot.send_message(
+                    chat.id,
+                    markdown_to_html(filtext),
+                    reply_to_message_id=message.message_id,
+                    parse_mode=ParseMode.HTML,
+                    reply_markup=keyboard,
+                )
+            except BadRequest as excp:
+                error_catch = get_exception(excp, filt, chat)
+                if error_catch == "noreply":
                     try:
                         context.bot.send_message(
                             chat.id,
                             markdown_to_html(filtext),
-                            reply_to_message_id=message.message_id,
                             parse_mode=ParseMode.HTML,
                             reply_markup=keyboard,
                         )
                     except BadRequest as excp:
-                        error_catch = get_exception(excp, filt, chat)
-                        if error_catch == "noreply":
-                            try:
-                                context.bot.send_message(
-                                    chat.id,
-                                    markdown_to_html(filtext),
-                                    parse_mode=ParseMode.HTML,
-                                    reply_markup=keyboard,
-                                )
-                            except BadRequest as excp:
-                                LOGGER.exception(
-                                    "Error in filters: " + excp.message
-                                )
-                                send_message(
-                                    update.effective_message,
-                                    get_exception(excp, filt, chat),
-                                )
-                        else:
-                            try:
-                                send_message(
-                                    update.effective_message,
-                                    get_exception(excp, filt, chat),
-                                )
-                            except BadRequest as excp:
-                                LOGGER.exception(
-                                    "Failed to send message: " + excp.message
-                                )
+                        LOGGER.exception(
+                            "Error in filters: " + excp.message
+                        )
+                        send_message(
+                            update.effective_message,
+                            get_exception(excp, filt, chat),
+                        )
                 else:
-                    if (
-                        ENUM_FUNC_MAP[filt.file_type]
-                        == dispatcher.bot.send_sticker
-                    ):
-                        ENUM_FUNC_MAP[filt.file_type](
-                            chat.id,
-                            filt.file_id,
-                            reply_to_message_id=message.message_id,
-                            reply_markup=keyboard,
+                    try:
+                        send_message(
+                            update.effective_message,
+                            get_exception(excp, filt, chat),
                         )
-                    else:
-                        ENUM_FUNC_MAP[filt.file_type](
-                            chat.id,
-                            filt.file_id,
-                            caption=markdown_to_html(filtext),
-                            reply_to_message_id=message.message_id,
-                            parse_mode=ParseMode.HTML,
-                            reply_markup=keyboard,
+                    except BadRequest as excp:
+                        LOGGER.exception(
+                            "Failed to send message: " + excp.message
                         )
-                break
+        else:
+            if (
+                ENUM_FUNC_MAP[filt.file_type]
+                == dispatcher.bot.send_sticker
+            ):
+                ENUM_FUNC_MAP[filt.file_type](
+                    chat.id,
+                    filt.file_id,
+                    reply_to_message_id=message.message_id,
+                    reply_markup=keyboard,
+                )
             else:
-                if filt.is_sticker:
-                    message.reply_sticker(filt.reply)
-                elif filt.is_document:
-                    message.reply_document(filt.reply)
-                elif filt.is_image:
-                    message.reply_photo(filt.reply)
-                elif filt.is_audio:
-                    message.reply_audio(filt.reply)
-                elif filt.is_voice:
-                    message.reply_voice(filt.reply)
-                elif filt.is_video:
-                    message.reply_video(filt.reply)
-                elif filt.has_markdown:
-                    buttons = sql.get_buttons(chat.id, filt.keyword)
-                    keyb = build_keyboard_parser(context.bot, chat.id, buttons)
-                    keyboard = InlineKeyboardMarkup(keyb)
-
+                ENUM_FUNC_MAP[filt.file_type](
+                    chat.id,
+                    filt.file_id,
+                    caption=markdown_to_html(filtext),
+                    reply_to_message_id=message.message_id,
+                    parse_mode=ParseMode.HTML,
+                    reply_markup=keyboard,
+                )
+    else:
+        if filt.is_sticker:
+            message.reply_sticker(filt.reply)
+        elif filt.is_document:
+            message.reply_document(filt.reply)
+        elif filt.is_image:
+            message.reply_photo(filt.reply)
+        elif filt.is_audio:
+            message.reply_audio(filt.reply)
+        elif filt.is_voice:
+            message.reply_voice(filt.reply)
+        elif filt.is_video:
+            message.reply_video(filt.reply)
+        elif filt.has_markdown:
+            buttons = sql.get_buttons(chat.id, filt.keyword)
+            keyb = build_keyboard_parser(context.bot, chat.id, buttons)
+            keyboard = InlineKeyboardMarkup(keyb)
+
+            try:
+                send_message(
+                    update.effective_message,
+                    filt.reply,
+                    parse_mode=ParseMode.MARKDOWN,
+                    reply_markup=keyboard,
+                )
+            except BadRequest as excp:
+                if excp.message == "Protokol url tidak didukung":
                     try:
                         send_message(
                             update.effective_message,
+                            "Anda tampaknya mencoba menggunakan protokol url yang tidak didukung. "
+                            "Telegram tidak mendukung tombol untuk beberapa protokol, seperti tg://. Silakan coba "
+                            "lagi.",
+                        )
+                    except BadRequest as excp:
+                        LOGGER.exception(
+                            "Error in filters: " + excp.message
+                        )
+                elif excp.message == "Reply message not found":
+                    try:
+                        context.bot.send_message(
+                            chat.id,
                             filt.reply,
                             parse_mode=ParseMode.MARKDOWN,
                             reply_markup=keyboard,
                         )
                     except BadRequest as excp:
-                        if excp.message == "Protokol url tidak didukung":
-                            try:
-                                send_message(
-                                    update.effective_message,
-                                    "Anda tampaknya mencoba menggunakan protokol url yang tidak didukung. "
-                                    "Telegram tidak mendukung tombol untuk beberapa protokol, seperti tg://. Silakan coba "
-                                    "lagi.",
-                                )
-                            except BadRequest as excp:
-                                LOGGER.exception(
-                                    "Error in filters: " + excp.message
-                                )
-                        elif excp.message == "Reply message not found":
-                            try:
-                                context.bot.send_message(
-                                    chat.id,
-                                    filt.reply,
-                                    parse_mode=ParseMode.MARKDOWN,
-                                    reply_markup=keyboard,
-                                )
-                            except BadRequest as excp:
-                                LOGGER.exception(
-                                    "Error in filters: " + excp.message
-                                )
-                        else:
-                            try:
-                                send_message(
-                                    update.effective_message,
-                                    "Pesan ini tidak dapat dikirim karena formatnya salah.",
-                                )
-                            except BadRequest as excp:
-                                LOGGER.exception(
-                                    "Error in filters: " + excp.message
-                                )
-                            LOGGER.warning(
-                                "Message %s could not be parsed",
-                                str(filt.reply),
-                            )
-                            LOGGER.exception(
-                                "Could not parse filter %s in chat %s",
-                                str(filt.keyword),
-                                str(chat.id),
-                            )
-
+                        LOGGER.exception(
+                            "Error in filters: " + excp.message
+                        )
                 else:
-                    # LEGACY - all new filters will have has_markdown set to
-                    # True.
                     try:
-                        send_message(update.effective_message, filt.reply)
+                        send_message(
+                            update.effective_message,
+                            "Pesan ini tidak dapat dikirim karena formatnya salah.",
+                        )
                     except BadRequest as excp:
-                        LOGGER.exception("Error in filters: " + excp.message)
-                break
+                        LOGGER.exception(
+                            "Error in filters: " + excp.message
+                        )
+                    LOGGER.warning(
+                        "Message %s could not be parsed",
+                        str(filt.reply),
+                    )
+                    LOGGER.exception(
+                        "Could not parse filter %s in chat %s",
+                        str(filt.keyword),
+                        str(chat.id),
+                    )
+
+        else:
+            # LEGACY - all new filters will have has_markdown set to
+            # True.
+            try:
+                send_message(update.effective_message, filt.reply)
+            except BadRequest as excp:
+                LOGGER.exception("Error in filters: " + excp.message)
 
 
 @user_admin
@@ -1,5 +1,3 @@
-from time import sleep
-
 from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.error import BadRequest, Unauthorized
 from telegram.ext import CallbackQueryHandler, CommandHandler
@@ -7,78 +5,95 @@ from telegram.ext import CallbackQueryHandler, CommandHandler
 from kaga.modules.no_sql import gban_db
 from kaga.modules.no_sql import users_db
 from kaga import DEV_USERS, dispatcher
+from kaga.modules.helper_funcs.fanout import fan_out_sync
 from kaga.modules.helper_funcs.filters import CustomFilters
+from kaga.modules.helper_funcs.sweeper import clear_sweep, sweep
 
 
-def get_invalid_chats(bot: Bot, update: Update, remove: bool = False):
-    chat_id = update.effective_chat.id
-    chats = users_db.get_all_chats()
-    kicked_chats, progress = 0, 0
-    chat_list = []
-    progress_message = None
-
-    for chat in chats:
-
-        if ((100 * chats.index(chat)) / len(chats)) > progress:
-            progress_bar = f"{progress}% selesai dalam mendapatkan obrolan yang tidak valid."
-            if progress_message:
-                try:
-                    bot.editMessageText(
-                        progress_bar, chat_id, progress_message.message_id
-                    )
-                except BaseException:
-                    pass
+def chat_candidates(after, limit):
+    return [
+        (chat["_id"], chat["chat_id"])
+        for chat in users_db.get_chats_page(after, limit)
+    ]
+
+
+def gban_candidates(after, limit):
+    return [
+        (user["_id"], user["_id"]) for user in gban_db.get_gbans_page(after, limit)
+    ]
+
+
+def progress_reporter(bot, chat_id, text, total):
+    """Post `text` with the sweep progress in steps of 5%."""
+    state = {"message": None, "progress": 0}
+
+    def report(scanned):
+        if not total or (100 * scanned) / total < state["progress"] + 5:
+            return
+        state["progress"] = min(100, int(100 * scanned / total) // 5 * 5)
+        progress_bar = f"{state['progress']}% {text}"
+        try:
+            if state["message"]:
+                bot.editMessageText(
+                    progress_bar, chat_id, state["message"].message_id
+                )
             else:
-                progress_message = bot.sendMessage(chat_id, progress_bar)
-            progress += 5
+                state["message"] = bot.sendMessage(chat_id, progress_bar)
+        except BaseException:
+            pass
 
-        cid = chat["chat_id"]
-        sleep(0.5)
+    def done():
         try:
-            bot.get_chat(cid, timeout=120)
-        except (BadRequest, Unauthorized):
-            kicked_chats += 1
-            chat_list.append(cid)
+            state["message"].delete()
         except BaseException:
             pass
 
-    try:
-        progress_message.delete()
-    except BaseException:
-        pass
+    return report, done
+
+
+def get_invalid_chats(bot: Bot, update: Update, remove: bool = False):
+    def is_invalid(cid):
+        try:
+            bot.get_chat(cid, timeout=120)
+        except (BadRequest, Unauthorized):
+            return True
+        return False
+
+    report, done = progress_reporter(
+        bot,
+        update.effective_chat.id,
+        "selesai dalam mendapatkan obrolan yang tidak valid.",
+        users_db.num_chats(),
+    )
+    chat_list = sweep(
+        "invalid_chats", chat_candidates, is_invalid, report, reuse=remove
+    )
+    done()
 
     if not remove:
-        return kicked_chats
+        return len(chat_list)
     else:
-        for muted_chat in chat_list:
-            sleep(0.5)
-            users_db.rem_chat(muted_chat)
-        return kicked_chats
+        users_db.rem_chats(chat_list)
+        clear_sweep("invalid_chats")
+        return len(chat_list)
 
 
 def get_invalid_gban(bot: Bot, update: Update, remove: bool = False):
-    banned = gban_db.get_gban_list()
-    ungbanned_users = 0
-    ungban_list = []
-
-    for user in banned:
-        user_id = user["_id"]
-        sleep(0.5)
+    def is_invalid(user_id):
         try:
             bot.get_chat(user_id)
         except BadRequest:
-            ungbanned_users += 1
-            ungban_list.append(user_id)
-        except BaseException:
-            pass
+            return True
+        return False
+
+    ungban_list = sweep("invalid_gbans", gban_candidates, is_invalid, reuse=remove)
 
     if not remove:
-        return ungbanned_users
+        return len(ungban_list)
     else:
-        for user_id in ungban_list:
-            sleep(0.5)
-            gban_db.ungban_user(user_id)
-        return ungbanned_users
+        gban_db.ungban_users(ungban_list)
+        clear_sweep("invalid_gbans")
+        return len(ungban_list)
 
 
 def dbcleanup(update, context):
@@ -103,54 +118,36 @@ def dbcleanup(update, context):
 
 
 def get_muted_chats(bot: Bot, update: Update, leave: bool = False):
-    chat_id = update.effective_chat.id
-    chats = users_db.get_all_chats()
-    muted_chats, progress = 0, 0
-    chat_list = []
-    progress_message = None
-
-    for chat in chats:
-
-        if ((100 * chats.index(chat)) / len(chats)) > progress:
-            progress_bar = f"{progress}% selesai dalam mendapatkan obrolan yang dibisukan."
-            if progress_message:
-                try:
-                    bot.editMessageText(
-                        progress_bar, chat_id, progress_message.message_id
-                    )
-                except BaseException:
-                    pass
-            else:
-                progress_message = bot.sendMessage(chat_id, progress_bar)
-            progress += 5
-
-        cid = chat["chat_id"]
-        sleep(0.5)
-
+    def is_muted(cid):
         try:
             bot.send_chat_action(cid, "TYPING", timeout=120)
         except (BadRequest, Unauthorized):
-            muted_chats += +1
-            chat_list.append(cid)
+            return True
+        return False
+
+    def leave_chat(cid):
+        try:
+            bot.leaveChat(cid, timeout=120)
         except BaseException:
             pass
+        return True
 
-    try:
-        progress_message.delete()
-    except BaseException:
-        pass
+    report, done = progress_reporter(
+        bot,
+        update.effective_chat.id,
+        "selesai dalam mendapatkan obrolan yang dibisukan.",
+        users_db.num_chats(),
+    )
+    chat_list = sweep("muted_chats", chat_candidates, is_muted, report, reuse=leave)
+    done()
 
     if not leave:
-        return muted_chats
+        return len(chat_list)
     else:
-        for muted_chat in chat_list:
-            sleep(0.5)
-            try:
-                bot.leaveChat(muted_chat, timeout=120)
-            except BaseException:
-                pass
-            users_db.rem_chat(muted_chat)
-        return muted_chats
+        fan_out_sync("leave muted chats", chat_list, leave_chat)
+        users_db.rem_chats(chat_list)
+        clear_sweep("muted_chats")
+        return len(chat_list)
 
 
 def leave_muted_chats(update, context):
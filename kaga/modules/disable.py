@@ -8,7 +8,7 @@ from telegram.utils.helpers import escape_markdown
 from kaga import dispatcher
 from kaga.modules.connection import connected
 from kaga.modules.helper_funcs.alternate import send_message, typing_action
-from kaga.modules.helper_funcs.handlers import CMD_STARTERS
+from kaga.modules.helper_funcs.handlers import CMD_STARTERS, parse_command
 from kaga.modules.helper_funcs.misc import is_module_loaded
 
 FILENAME = __name__.rsplit(".", 1)[-1]
@@ -39,47 +39,25 @@ if is_module_loaded(FILENAME):
                     ADMIN_CMDS.extend(command)
 
         def check_update(self, update):
-            if isinstance(update, Update) and update.effective_message:
-                message = update.effective_message
-
-                if message.text and len(message.text) > 1:
-                    fst_word = message.text.split(None, 1)[0]
-                    if len(fst_word) > 1 and any(
-                        fst_word.startswith(start) for start in CMD_STARTERS
-                    ):
-                        args = message.text.split()[1:]
-                        command = fst_word[1:].split("@")
-                        command.append(message.bot.username)
-
-                        if not (
-                            command[0].lower() in self.command
-                            and command[1].lower()
-                            == message.bot.username.lower()
-                        ):
-                            return None
-
-                        filter_result = self.filters(update)
-                        if filter_result:
-                            chat = update.effective_chat
-                            user = update.effective_user
-                            # disabled, admincmd, user admin
-                            if disable_db.is_command_disabled(
-                                chat.id, command[0].lower()
-                            ):
-                                # check if command was disabled
-                                is_disabled = command[
-                                    0
-                                ] in ADMIN_CMDS and is_user_admin(
-                                    chat, user.id
-                                )
-                                if not is_disabled:
-                                    return None
-                                else:
-                                    return args, filter_result
-
-                            return args, filter_result
-                        else:
-                            return False
+            parsed = parse_command(update)
+            if parsed is None or parsed[0] not in self.command:
+                return None
+
+            command, args = parsed
+            filter_result = self.filters(update)
+            if not filter_result:
+                return False
+
+            chat = update.effective_chat
+            user = update.effective_user
+            # disabled, admincmd, user admin
+            if disable_db.is_command_disabled(chat.id, command):
+                # admin commands stay usable by admins when disabled
+                if command in ADMIN_CMDS and is_user_admin(chat, user.id):
+                    return args, filter_result
+                return None
+
+            return args, filter_result
 
     class DisableAbleMessageHandler(MessageHandler):
         def __init__(self, pattern, callback, friendly="", **kwargs):
@@ -90,9 +68,9 @@ if is_module_loaded(FILENAME):
         def check_update(self, update):
             if isinstance(update, Update) and update.effective_message:
                 chat = update.effective_chat
-                return self.filters(update) and not disable_db.is_command_disabled(
+                return not disable_db.is_command_disabled(
                     chat.id, self.friendly
-                )
+                ) and self.filters(update)
 
     @user_admin
     @typing_action
@@ -242,8 +220,10 @@ if is_module_loaded(FILENAME):
 
     def __import_data__(chat_id, data):
         disabled = data.get("disabled", {})
-        for disable_cmd in disabled:
-            disable_db.disable_command(chat_id, disable_cmd)
+        return sum(
+            bool(disable_db.disable_command(chat_id, disable_cmd))
+            for disable_cmd in disabled
+        )
 
     def __stats__():
         return "× {} disabled items, across {} chats.".format(
@@ -4,6 +4,7 @@ import os
 import re
 import time
 import uuid
+from functools import partial
 from io import BytesIO
 
 from telegram import (
@@ -33,12 +34,14 @@ from kaga.modules.helper_funcs.alternate import (
     send_message,
     typing_action,
 )
+from kaga.modules.helper_funcs.broadcast import register_source, start_broadcast
 from kaga.modules.helper_funcs.chat_status import is_user_admin
 from kaga.modules.helper_funcs.extraction import (
     extract_unt_fedban,
     extract_user,
     extract_user_fban,
 )
+from kaga.modules.helper_funcs.fanout import AbortFanOut, fan_out
 from kaga.modules.helper_funcs.string_handling import markdown_parser
 
 # Hello bot owner, I spended for feds many hours of my life, Please don't remove this if you still respect MrYacha and peaktogoo and AyraHikari too
@@ -84,6 +87,90 @@ UNFBAN_ERRORS = {
 }
 
 
+def fed_chats_with_subscribers(fed_id):
+    """Every chat reached by a fed action, mapped to the fed it belongs to."""
+    chats = {}
+    for fedschat in sql.all_fed_chats(fed_id):
+        chats.setdefault(fedschat, fed_id)
+    for fedsid in sql.get_subscriber(fed_id):
+        for fedschat in sql.all_fed_chats(fedsid):
+            chats.setdefault(fedschat, fedsid)
+    return chats
+
+
+def drop_lost_fed_chat(fed_id, chats, fedschat):
+    # A chat that can't be reached anymore leaves the fed, or when it
+    # belongs to a subscriber, that subscription is cancelled.
+    try:
+        dispatcher.bot.getChat(fedschat)
+    except Unauthorized:
+        if chats[fedschat] == fed_id:
+            sql.chat_leave_fed(fedschat)
+            LOGGER.info(
+                "Obrolan {} telah meninggalkan fed {} karena saya ditendang".format(
+                    fedschat, fed_id
+                )
+            )
+        else:
+            sql.unsubs_fed(fed_id, chats[fedschat])
+            LOGGER.info(
+                "Obrolan {} memiliki unsub fed {} karena saya ditendang".format(
+                    fedschat, fed_id
+                )
+            )
+
+
+def fban_in_chat(user_id, fed_id, chats, fedschat):
+    try:
+        return dispatcher.bot.kick_chat_member(fedschat, user_id)
+    except BadRequest as excp:
+        if excp.message in FBAN_ERRORS:
+            drop_lost_fed_chat(fed_id, chats, fedschat)
+            return False
+        elif excp.message == "User_id_invalid":
+            raise AbortFanOut(excp.message)
+        LOGGER.warning(
+            "Tidak bisa fban pada {} karena: {}".format(fedschat, excp.message)
+        )
+        raise
+
+
+def unfban_in_chat(user_id, fed_id, chats, fedschat):
+    try:
+        member = dispatcher.bot.get_chat_member(fedschat, user_id)
+        if member.status != "kicked":
+            return False
+        return dispatcher.bot.unban_chat_member(fedschat, user_id)
+    except BadRequest as excp:
+        if excp.message in UNFBAN_ERRORS:
+            drop_lost_fed_chat(fed_id, chats, fedschat)
+            return False
+        elif excp.message == "User_id_invalid":
+            raise AbortFanOut(excp.message)
+        LOGGER.warning(
+            "Tidak bisa unfban pada {} karena: {}".format(
+                fedschat, excp.message
+            )
+        )
+        raise
+
+
+def fed_fan_out(name, fed_id, action, message, done_text):
+    """Run action in the background for every chat of the fed and its
+    subscribers, then reply to message with done_text and the failures."""
+    chats = fed_chats_with_subscribers(fed_id)
+
+    def report(job):
+        text = done_text.format(job.affected)
+        if job.failed:
+            text += "\nGagal di {} obrolan.".format(len(job.failed))
+        send_message(message, text)
+
+    return fan_out(
+        name, chats, partial(action, fed_id, chats), on_done=report
+    )
+
+
 @typing_action
 def new_fed(update, context):
     chat = update.effective_chat
@@ -686,7 +773,6 @@ def fed_ban(update, context):
             message.reply_text("Gagal mencekal dari federasi!")
             return
 
-        fed_chats = sql.all_fed_chats(fed_id)
         # Will send to current chat
         context.bot.send_message(
             chat.id,
@@ -742,83 +828,13 @@ def fed_ban(update, context):
                     ),
                     parse_mode="HTML",
                 )
-        for fedschat in fed_chats:
-            try:
-                # Do not spam all fed chats
-                """
-                                context.bot.send_message(chat, "<b>FedBan reason updated</b>" \
-                                                         "\n<b>Federation:</b> {}" \
-                                                         "\n<b>Federation Admin:</b> {}" \
-                                                         "\n<b>Pengguna:</b> {}" \
-                                                         "\n<b>ID Pengguna:</b> <code>{}</code>" \
-                                                         "\n<b>Alasan:</b> {}".format(fed_name, mention_html(user.id, user.first_name), user_target, fban_user_id, reason), parse_mode="HTML")
-                                """
-                context.bot.kick_chat_member(fedschat, fban_user_id)
-            except BadRequest as excp:
-                if excp.message in FBAN_ERRORS:
-                    try:
-                        dispatcher.bot.getChat(fedschat)
-                    except Unauthorized:
-                        sql.chat_leave_fed(fedschat)
-                        LOGGER.info(
-                            "Obrolan {} telah meninggalkan fed {} karena saya ditendang".format(
-                                fedschat, info["fname"]
-                            )
-                        )
-                        continue
-                elif excp.message == "User_id_invalid":
-                    break
-                else:
-                    LOGGER.warning(
-                        "Tidak bisa fban pada {} karena: {}".format(
-                            chat, excp.message
-                        )
-                    )
-            except TelegramError:
-                pass
-        # Also do not spam all fed admins
-
-        # send_to_list(bot, FEDADMIN,
-        # "<b>FedBan reason updated</b>" \
-        # "\n<b>Federation:</b> {}" \
-        # "\n<b>Federation Admin:</b> {}" \
-        # "\n<b>User:</b> {}" \
-        # "\n<b>User ID:</b> <code>{}</code>" \
-        # "\n<b>Reason:</b> {}".format(fed_name, mention_html(user.id, user.first_name), user_target, fban_user_id, reason),
-        # html=True)
-
-        # Fban for fed subscriber
-        subscriber = list(sql.get_subscriber(fed_id))
-        if len(subscriber) != 0:
-            for fedsid in subscriber:
-                all_fedschat = sql.all_fed_chats(fedsid)
-                for fedschat in all_fedschat:
-                    try:
-                        context.bot.kick_chat_member(fedschat, fban_user_id)
-                    except BadRequest as excp:
-                        if excp.message in FBAN_ERRORS:
-                            try:
-                                dispatcher.bot.getChat(fedschat)
-                            except Unauthorized:
-                                targetfed_id = sql.get_fed_id(fedschat)
-                                sql.unsubs_fed(fed_id, targetfed_id)
-                                LOGGER.info(
-                                    "Obrolan {} memiliki unsub fed {} karena saya ditendang".format(
-                                        fedschat, info["fname"]
-                                    )
-                                )
-                                continue
-                        elif excp.message == "User_id_invalid":
-                            break
-                        else:
-                            LOGGER.warning(
-                                "Tak dapat mengikuti {} karena: {}".format(
-                                    fedschat, excp.message
-                                )
-                            )
-                    except TelegramError:
-                        pass
-        # send_message(update.effective_message, "Fedban Reason has been updated.")
+        fed_fan_out(
+            "fban {} in {}".format(fban_user_id, fed_id),
+            fed_id,
+            partial(fban_in_chat, fban_user_id),
+            message,
+            "Alasan fedban diperbarui, memengaruhi {} obrolan.",
+        )
         return
 
     fed_name = info["fname"]
@@ -846,7 +862,6 @@ def fed_ban(update, context):
         message.reply_text("Gagal mencekal dari federasi!")
         return
 
-    fed_chats = sql.all_fed_chats(fed_id)
     # Will send to current chat
     context.bot.send_message(
         chat.id,
@@ -902,84 +917,13 @@ def fed_ban(update, context):
                 ),
                 parse_mode="HTML",
             )
-    chats_in_fed = 0
-    for fedschat in fed_chats:
-        chats_in_fed += 1
-        try:
-            # Do not spamming all fed chats
-            """
-                        context.bot.send_message(chat, "<b>Alasan FedBan diperbarui</b>" \
-                                                        "\n<b>Federation:</b> {}" \
-                                                        "\n<b>Federation Admin:</b> {}" \
-                                                        "\n<b>Pengguna:</b> {}" \
-                                                        "\n<b>ID Pengguna:</b> <code>{}</code>" \
-                                                        "\n<b>Alasan:</b> {}".format(fed_name, mention_html(user.id, user.first_name), user_target, fban_user_id, reason), parse_mode="HTML")
-                        """
-            context.bot.kick_chat_member(fedschat, fban_user_id)
-        except BadRequest as excp:
-            if excp.message in FBAN_ERRORS:
-                pass
-            elif excp.message == "User_id_invalid":
-                break
-            else:
-                LOGGER.warning(
-                    "Tidak bisa fban pada {} karena: {}".format(
-                        chat, excp.message
-                    )
-                )
-        except TelegramError:
-            pass
-
-        # Also do not spamming all fed admins
-        """
-		send_to_list(bot, FEDADMIN,
-				 "<b>Alasan FedBan diperbarui</b>" \
-							 "\n<b>Federation:</b> {}" \
-							 "\n<b>Federation Admin:</b> {}" \
-							 "\n<b>Pengguna:</b> {}" \
-							 "\n<b>ID Pengguna:</b> <code>{}</code>" \
-							 "\n<b>Alasan:</b> {}".format(fed_name, mention_html(user.id, user.first_name), user_target, fban_user_id, reason),
-							html=True)
-		"""
-
-        # Fban for fed subscriber
-        subscriber = list(sql.get_subscriber(fed_id))
-        if len(subscriber) != 0:
-            for fedsid in subscriber:
-                all_fedschat = sql.all_fed_chats(fedsid)
-                for fedschat in all_fedschat:
-                    try:
-                        context.bot.kick_chat_member(fedschat, fban_user_id)
-                    except BadRequest as excp:
-                        if excp.message in FBAN_ERRORS:
-                            try:
-                                dispatcher.bot.getChat(fedschat)
-                            except Unauthorized:
-                                targetfed_id = sql.get_fed_id(fedschat)
-                                sql.unsubs_fed(fed_id, targetfed_id)
-                                LOGGER.info(
-                                    "Obrolan {} memiliki unsub fed {} karena saya ditendang".format(
-                                        fedschat, info["fname"]
-                                    )
-                                )
-                                continue
-                        elif excp.message == "User_id_invalid":
-                            break
-                        else:
-                            LOGGER.warning(
-                                "Tak dapat fban {} karena: {}".format(
-                                    fedschat, excp.message
-                                )
-                            )
-                    except TelegramError:
-                        pass
-    if chats_in_fed == 0:
-        send_message(update.effective_message, "Fedban memengaruhi 0 obrolan. ")
-    elif chats_in_fed > 0:
-        send_message(
-            update.effective_message,
-            "Fedban memengaruhi 0 obrolan. ".format(chats_in_fed),
-        )
+    fed_fan_out(
+        "fban {} in {}".format(fban_user_id, fed_id),
+        fed_id,
+        partial(fban_in_chat, fban_user_id),
+        message,
+        "Fedban memengaruhi {} obrolan.",
+    )
 
 
 @typing_action
@@ -1056,7 +1000,6 @@ def unfban(update, context):
         )
     )
 
-    chat_list = sql.all_fed_chats(fed_id)
     # Will send to current chat
     context.bot.send_message(
         chat.id,
@@ -1106,34 +1049,6 @@ def unfban(update, context):
                 ),
                 parse_mode="HTML",
             )
-    unfbanned_in_chats = 0
-    for fedchats in chat_list:
-        unfbanned_in_chats += 1
-        try:
-            member = context.bot.get_chat_member(fedchats, user_id)
-            if member.status == "kicked":
-                context.bot.unban_chat_member(fedchats, user_id)
-            # Do not spamming all fed chats
-            """
-			context.bot.send_message(chat, "<b>Un-FedBan</b>" \
-						 "\n<b>Federation:</b> {}" \
-						 "\n<b>Federation Admin:</b> {}" \
-						 "\n<b>Pengguna:</b> {}" \
-						 "\n<b>ID Pengguna:</b> <code>{}</code>".format(info['fname'], mention_html(user.id, user.first_name), user_target, fban_user_id), parse_mode="HTML")
-			"""
-        except BadRequest as excp:
-            if excp.message in UNFBAN_ERRORS:
-                pass
-            elif excp.message == "User_id_invalid":
-                break
-            else:
-                LOGGER.warning(
-                    "Tidak bisa fban pada {} karena: {}".format(
-                        chat, excp.message
-                    )
-                )
-        except TelegramError:
-            pass
 
     try:
         x = sql.un_fban_user(fed_id, user_id)
@@ -1146,50 +1061,13 @@ def unfban(update, context):
     except Exception:
         pass
 
-    # UnFban for fed subscriber
-    subscriber = list(sql.get_subscriber(fed_id))
-    if len(subscriber) != 0:
-        for fedsid in subscriber:
-            all_fedschat = sql.all_fed_chats(fedsid)
-            for fedschat in all_fedschat:
-                try:
-                    context.bot.unban_chat_member(fedchats, user_id)
-                except BadRequest as excp:
-                    if excp.message in FBAN_ERRORS:
-                        try:
-                            dispatcher.bot.getChat(fedschat)
-                        except Unauthorized:
-                            targetfed_id = sql.get_fed_id(fedschat)
-                            sql.unsubs_fed(fed_id, targetfed_id)
-                            LOGGER.info(
-                                "Obrolan {} memiliki unsub fed {} karena saya ditendang".format(
-                                    fedschat, info["fname"]
-                                )
-                            )
-                            continue
-                    elif excp.message == "User_id_invalid":
-                        break
-                    else:
-                        LOGGER.warning(
-                            "Tak dapat fban {} karena: {}".format(
-                                fedschat, excp.message
-                            )
-                        )
-                except TelegramError:
-                    pass
-
-    if unfbanned_in_chats == 0:
-        send_message(
-            update.effective_message,
-            "Orang ini telah di fbanned dari 0 obrolan.",
-        )
-    if unfbanned_in_chats > 0:
-        send_message(
-            update.effective_message,
-            "Orang ini telah difban dari {} obrolan.".format(
-                unfbanned_in_chats
-            ),
-        )
+    fed_fan_out(
+        "unfban {} in {}".format(fban_user_id, fed_id),
+        fed_id,
+        partial(unfban_in_chat, fban_user_id),
+        message,
+        "Orang ini telah di-unfban dari {} obrolan.",
+    )
     # Also do not spamming all fed admins
     """
 	FEDADMIN = sql.all_fed_users(fed_id)
@@ -1332,37 +1210,34 @@ def fed_broadcast(update, context):
         except BaseException:
             broadcaster = user.first_name + " " + user.last_name
         text += "\n\n- {}".format(mention_markdown(user.id, broadcaster))
-        chat_list = sql.all_fed_chats(fed_id)
-        failed = 0
-        for chat in chat_list:
-            title = "*Siaran baru dari Fed {}*\n".format(fedinfo["fname"])
-            try:
-                context.bot.sendMessage(
-                    chat, title + text, parse_mode="markdown"
-                )
-            except TelegramError:
-                try:
-                    dispatcher.bot.getChat(chat)
-                except Unauthorized:
-                    failed += 1
-                    sql.chat_leave_fed(chat)
-                    LOGGER.info(
-                        "Obrolan {} telah meninggalkan fed {} karena saya ditendang".format(
-                            chat, fedinfo["fname"]
-                        )
-                    )
-                    continue
-                failed += 1
-                LOGGER.warning(
-                    "Tidak dapat mengirim siaran ke {}".format(str(chat))
-                )
+        title = "*Siaran baru dari Fed {}*\n".format(fedinfo["fname"])
+        start_broadcast(title + text, [("fed", fed_id)], chat.id)
+        update.effective_message.reply_text(
+            "Siaran federasi dimulai, saya akan mengabari jika sudah selesai."
+        )
+
+
+def fed_broadcast_chats(fed_id, after, limit):
+    chats = sorted(
+        fedschat
+        for fedschat in sql.all_fed_chats(fed_id)
+        if after is None or fedschat > after
+    )
+    return [(fedschat, int(fedschat)) for fedschat in chats[:limit]]
+
 
-        send_text = "Siaran federasi selesai"
-        if failed >= 1:
-            send_text += "{} kelompok gagal menerima pesan, mungkin karena meninggalkan Federasi.".format(
-                failed
+def fed_broadcast_failed(fed_id, chat_id, excp):
+    try:
+        dispatcher.bot.getChat(chat_id)
+    except Unauthorized:
+        sql.chat_leave_fed(str(chat_id))
+        LOGGER.info(
+            "Obrolan {} telah meninggalkan fed {} karena saya ditendang".format(
+                chat_id, fed_id
             )
-        update.effective_message.reply_text(send_text)
+        )
+    except TelegramError:
+        pass
 
 
 @send_action(ChatAction.UPLOAD_DOCUMENT)
@@ -2444,6 +2319,8 @@ Anda bahkan dapat menetapkan federasi admin, sehingga admin tepercaya Anda dapat
 """
 
 
+register_source("fed", fed_broadcast_chats, fed_broadcast_failed)
+
 NEW_FED_HANDLER = CommandHandler("newfed", new_fed, run_async=True)
 DEL_FED_HANDLER = CommandHandler(
     "delfed", del_fed, pass_args=True, run_async=True
@@ -1,19 +1,21 @@
 import datetime
 from typing import List
 
-import requests
 from kaga import TIME_API_KEY, dispatcher
 from kaga.modules.disable import DisableAbleCommandHandler
 from telegram import ParseMode, Update
+from kaga.modules.helper_funcs import http_client
 from kaga.modules.helper_funcs.alternate import typing_action
 
 
 def generate_time(to_find: str, findtype: List[str]) -> str:
-    data = requests.get(
+    # Only offsets are used, the current time is worked out locally
+    data = http_client.get(
         f"https://api.timezonedb.com/v2.1/list-time-zone"
         f"?key={TIME_API_KEY}"
         f"&format=json"
-        f"&fields=countryCode,countryName,zoneName,gmtOffset,timestamp,dst"
+        f"&fields=countryCode,countryName,zoneName,gmtOffset,timestamp,dst",
+        cache_ttl=60 * 60,
     ).json()
 
     for zone in data["zones"]:
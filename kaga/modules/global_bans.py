@@ -1,10 +1,9 @@
 import html
 from io import BytesIO
 
-from requests import get
 from telegram import ChatAction, ParseMode
 from telegram.error import BadRequest, TelegramError, Unauthorized
-from telegram.ext import CommandHandler, Filters, MessageHandler
+from telegram.ext import CommandHandler, Filters
 from telegram.utils.helpers import mention_html
 
 import kaga.modules.no_sql.gban_db as gban_db
@@ -16,22 +15,32 @@ from kaga import (
     SUDO_USERS,
     SUPPORT_USERS,
     dispatcher,
-    spamwtc,
 )
 from kaga.modules.helper_funcs.alternate import (
     send_action,
     send_message,
     typing_action,
 )
-from kaga.modules.helper_funcs.chat_status import is_user_admin, user_admin
+from kaga.modules.helper_funcs.antispam import get_cas_result, get_spamwatch_ban
+from kaga.modules.helper_funcs.chat_status import (
+    bot_has_right,
+    is_user_admin,
+    user_admin,
+)
 from kaga.modules.helper_funcs.extraction import (
     extract_user,
     extract_user_and_text,
 )
 from kaga.modules.helper_funcs.filters import CustomFilters
+from kaga.modules.helper_funcs.moderation import (
+    register_stage,
+    sender_is_admin,
+    stage_settings,
+)
 from kaga.modules.no_sql.users_db import get_all_chats
 
-GBAN_ENFORCE_GROUP = 6
+# Gbans are enforced before every other moderation stage
+GBAN_STAGE = 0
 
 GBAN_ERRORS = {
     "Bot tidak dapat menambahkan anggota obrolan baru",
@@ -329,14 +338,7 @@ def gbanlist(update, context):
 
 
 def check_cas(user_id):
-    cas_url = "https://api.cas.chat/check?user_id={}".format(user_id)
-    try:
-        r = get(cas_url, timeout=3)
-        data = r.json()
-    except BaseException:
-        # LOGGER.info(f"CAS check failed for {user_id}")
-        return False
-    if data and data["ok"]:
+    if get_cas_result(user_id) is not None:
         return "https://cas.chat/query?u={}".format(user_id)
     else:
         return False
@@ -344,7 +346,7 @@ def check_cas(user_id):
 
 def check_and_ban(update, user_id, should_message=True):
     try:
-        spmban = spamwtc.get_ban(int(user_id))
+        spmban = get_spamwatch_ban(user_id)
         cas_banned = check_cas(user_id)
 
         if spmban or cas_banned:
@@ -366,7 +368,7 @@ def check_and_ban(update, user_id, should_message=True):
                     f"oleh {banner} dan telah dihapusd!\nAlasan: {reason}",
                     parse_mode=ParseMode.HTML,
                 )
-                return
+            return True
 
     except Exception:
         pass
@@ -384,24 +386,23 @@ def check_and_ban(update, user_id, should_message=True):
                 f"*Waspada! pengguna ini telah diblokir dan telah dihapus!*\n*Alasan*: {greason}",
                 parse_mode=ParseMode.MARKDOWN,
             )
-            return
+        return True
+    return False
 
 
 def enforce_gban(update, context):
     # Not using @restrict handler to avoid spamming - just ignore if cant gban.
     try:
-        if (
-            gban_db.does_chat_gban(update.effective_chat.id)
-            and update.effective_chat.get_member(
-                context.bot.id
-            ).can_restrict_members
+        if stage_settings(update, "gban") and bot_has_right(
+            update.effective_chat, context.bot.id, "can_restrict_members"
         ):
             user = update.effective_user
             chat = update.effective_chat
             msg = update.effective_message
 
-            if user and not is_user_admin(chat, user.id):
-                check_and_ban(update, user.id)
+            if user and not sender_is_admin(update):
+                if check_and_ban(update, user.id):
+                    return True
 
             if msg.new_chat_members:
                 new_members = update.effective_message.new_chat_members
@@ -449,18 +450,18 @@ def __stats__():
 
 
 def __user_info__(user_id):
-    is_gbanned = gban_db.is_user_gbanned(user_id)
-    spmban = spamwtc.get_ban(int(user_id))
-    cas_banned = check_cas(user_id)
-
-    text = "<b>Globally banned</b>: {}"
-
     if int(user_id) in DEV_USERS + SUDO_USERS + SUPPORT_USERS:
         return ""
 
     if user_id in (777000, 1087968824):
         return ""
 
+    is_gbanned = gban_db.is_user_gbanned(user_id)
+    spmban = get_spamwatch_ban(user_id)
+    cas_banned = check_cas(user_id)
+
+    text = "<b>Globally banned</b>: {}"
+
     if cas_banned or spmban or is_gbanned:
         text = text.format("Yes")
         if is_gbanned:
@@ -522,9 +523,6 @@ GBAN_STATUS = CommandHandler(
     run_async=True,
 )
 
-GBAN_ENFORCER = MessageHandler(
-    Filters.all & Filters.chat_type.groups, enforce_gban, run_async=True
-)
 
 dispatcher.add_handler(GBAN_HANDLER)
 dispatcher.add_handler(UNGBAN_HANDLER)
@@ -532,4 +530,10 @@ dispatcher.add_handler(GBAN_LIST)
 dispatcher.add_handler(GBAN_STATUS)
 
 if STRICT_GBAN:  # enforce GBANS if this is set
-    dispatcher.add_handler(GBAN_ENFORCER, GBAN_ENFORCE_GROUP)
+    register_stage(
+        GBAN_STAGE,
+        "gban",
+        enforce_gban,
+        settings=gban_db.does_chat_gban,
+        final=True,
+    )
@@ -1,6 +1,14 @@
+import heapq
+import threading
+import time
 from functools import wraps
 from telegram import error, ChatAction
-from kaga import LOGGER
+from kaga import LOGGER, dispatcher
+
+# Due deletions are checked by a single repeating job
+AUTO_DELETE_INTERVAL = 1
+PENDING_DELETES = []
+DELETE_LOCK = threading.Lock()
 
 
 def send_message(message, text, *args, **kwargs):
@@ -47,3 +55,38 @@ def send_action(action):
         return command_func
 
     return decorator
+
+
+def delete_after(seconds, *messages):
+    """Delete the given messages after `seconds`, without blocking the caller."""
+    due = time.monotonic() + seconds
+    with DELETE_LOCK:
+        for message in messages:
+            if message is not None:
+                heapq.heappush(
+                    PENDING_DELETES, (due, message.chat_id, message.message_id)
+                )
+
+
+def __delete_due(context):
+    now = time.monotonic()
+    due = []
+    with DELETE_LOCK:
+        while PENDING_DELETES and PENDING_DELETES[0][0] <= now:
+            due.append(heapq.heappop(PENDING_DELETES))
+
+    for _, chat_id, message_id in due:
+        try:
+            context.bot.delete_message(chat_id, message_id)
+        except (error.BadRequest, error.Unauthorized):
+            # Already gone, too old or we lost the rights for it
+            pass
+        except error.TelegramError:
+            LOGGER.warning(
+                "Could not delete message %s in %s", message_id, chat_id
+            )
+
+
+dispatcher.job_queue.run_repeating(
+    __delete_due, interval=AUTO_DELETE_INTERVAL, first=AUTO_DELETE_INTERVAL
+)
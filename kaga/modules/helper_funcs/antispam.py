@@ -0,0 +1,116 @@
+"""Shared SpamWatch and CAS verdicts, cached per user."""
+
+import threading
+from collections import namedtuple
+
+from cachetools import TTLCache
+
+from kaga import LOGGER, spamwtc
+from kaga.modules.helper_funcs import http_client
+
+CAS_QUERY_URL = "https://api.cas.chat/check?user_id={}"
+CAS_TIMEOUT = 3
+
+# Bans rarely get lifted, clean users may get banned at any time, and a
+# failed lookup is tried again soon.
+BANNED_TTL = 60 * 60
+CLEAN_TTL = 10 * 60
+FAILED_TTL = 30
+CACHE_SIZE = 100000
+
+# `spamwatch` is the SpamWatch ban object or None,
+# `cas` is the CAS result dict or None.
+Verdict = namedtuple("Verdict", ["spamwatch", "cas"])
+
+# Keyed (source, user_id), so SpamWatch and CAS are looked up separately
+BANNED = TTLCache(maxsize=CACHE_SIZE, ttl=BANNED_TTL)
+CLEAN = TTLCache(maxsize=CACHE_SIZE, ttl=CLEAN_TTL)
+FAILED = TTLCache(maxsize=CACHE_SIZE, ttl=FAILED_TTL)
+IN_FLIGHT = {}
+CACHE_LOCK = threading.Lock()
+
+
+def __check_spamwatch(user_id):
+    return spamwtc.get_ban(user_id) or None
+
+
+def __check_cas(user_id):
+    data = http_client.get(
+        CAS_QUERY_URL.format(user_id), timeout=CAS_TIMEOUT
+    ).json()
+    if data and data["ok"]:
+        return data.get("result") or {}
+    return None
+
+
+SOURCES = {"spamwatch": __check_spamwatch, "cas": __check_cas}
+
+
+def __cached(key):
+    for cache in (BANNED, CLEAN, FAILED):
+        if key in cache:
+            return True, cache[key]
+    return False, None
+
+
+def __lookup(source, user_id):
+    """Ask one source about a user, through the cache.
+
+    Concurrent lookups of the same user share a single request. A failed
+    lookup counts as clean for FAILED_TTL, so an API outage doesn't stall
+    every message.
+    """
+    key = (source, user_id)
+    with CACHE_LOCK:
+        found, result = __cached(key)
+        if found:
+            return result
+
+        event = IN_FLIGHT.get(key)
+        leader = event is None
+        if leader:
+            event = IN_FLIGHT[key] = threading.Event()
+
+    if not leader:
+        event.wait(CAS_TIMEOUT * 2)
+        with CACHE_LOCK:
+            return __cached(key)[1]
+
+    try:
+        try:
+            result = SOURCES[source](user_id)
+            cache = CLEAN if result is None else BANNED
+        except Exception:
+            LOGGER.warning("%s check failed for %s", source, user_id)
+            result, cache = None, FAILED
+        with CACHE_LOCK:
+            cache[key] = result
+        return result
+    finally:
+        with CACHE_LOCK:
+            IN_FLIGHT.pop(key, None)
+        event.set()
+
+
+def get_spamwatch_ban(user_id):
+    """The SpamWatch ban of a user, or None. CAS isn't asked."""
+    if spamwtc is None:
+        return None
+    return __lookup("spamwatch", int(user_id))
+
+
+def get_cas_result(user_id):
+    """The CAS result dict of a banned user, or None. SpamWatch isn't asked."""
+    return __lookup("cas", int(user_id))
+
+
+def get_verdict(user_id) -> Verdict:
+    """Return the SpamWatch and CAS verdict of a user."""
+    return Verdict(get_spamwatch_ban(user_id), get_cas_result(user_id))
+
+
+def forget_verdict(user_id):
+    with CACHE_LOCK:
+        for source in SOURCES:
+            for cache in (BANNED, CLEAN, FAILED):
+                cache.pop((source, int(user_id)), None)
@@ -0,0 +1,157 @@
+"""Broadcast a message to many chats, resuming after a restart."""
+
+import threading
+import time
+
+from telegram.error import RetryAfter, TelegramError
+
+from kaga import LOGGER, dispatcher
+from kaga.modules.helper_funcs.fanout import fan_out_sync
+from kaga.modules.no_sql import broadcast_db
+
+# Recipients are read and checkpointed one page at a time, a restart
+# sends at most one page twice.
+PAGE_SIZE = 100
+
+# name -> (recipients(arg, after, limit), on_failure(arg, chat_id, excp))
+SOURCES = {}
+RUNNING = set()
+RUNNING_LOCK = threading.Lock()
+
+
+def register_source(name, recipients, on_failure=None):
+    """Register where a broadcast finds its chats.
+
+    `recipients(arg, after, limit)` returns up to `limit` (key, chat_id)
+    pairs ordered by key, starting after the key `after` (None at the start).
+    `on_failure(arg, chat_id, excp)` is called when a chat can't be reached.
+    """
+    SOURCES[name] = (recipients, on_failure)
+
+
+def start_broadcast(text, targets, report_chat, parse_mode="MARKDOWN"):
+    """Broadcast text to every (source, arg) in targets in the background.
+
+    The result is sent to report_chat once every target is done.
+    """
+    job = {
+        "text": text,
+        "parse_mode": parse_mode,
+        "targets": [[source, arg] for source, arg in targets],
+        "report_chat": report_chat,
+        "phase": 0,
+        "checkpoint": None,
+        "sent": 0,
+        "failed": 0,
+        "elapsed": 0.0,
+        "status": "running",
+    }
+    job["_id"] = broadcast_db.new_broadcast(job)
+    __spawn(job)
+    return job["_id"]
+
+
+def resume_broadcasts(context=None):
+    for job in broadcast_db.get_running_broadcasts():
+        LOGGER.info(
+            "Resuming broadcast %s at target %d", job["_id"], job["phase"]
+        )
+        __spawn(job)
+
+
+def __spawn(job):
+    with RUNNING_LOCK:
+        if job["_id"] in RUNNING:
+            return
+        RUNNING.add(job["_id"])
+    threading.Thread(
+        target=__run, args=(job,), name="broadcast", daemon=True
+    ).start()
+
+
+def __send_page(job, chat_ids, arg, on_failure):
+    bot = dispatcher.bot
+
+    def send(chat_id):
+        try:
+            bot.send_message(
+                chat_id,
+                job["text"],
+                parse_mode=job["parse_mode"],
+                disable_web_page_preview=True,
+            )
+        except RetryAfter:
+            raise
+        except TelegramError as excp:
+            if on_failure:
+                on_failure(arg, chat_id, excp)
+            raise
+        return True
+
+    return fan_out_sync("broadcast {}".format(job["_id"]), chat_ids, send)
+
+
+def __run(job):
+    try:
+        while job["phase"] < len(job["targets"]):
+            source, arg = job["targets"][job["phase"]]
+            recipients, on_failure = SOURCES[source]
+            page = recipients(arg, job["checkpoint"], PAGE_SIZE)
+            if not page:
+                job["phase"] += 1
+                job["checkpoint"] = None
+                broadcast_db.update_broadcast(
+                    job["_id"], phase=job["phase"], checkpoint=None
+                )
+                continue
+
+            started = time.monotonic()
+            result = __send_page(
+                job, [chat_id for _, chat_id in page], arg, on_failure
+            )
+            job["sent"] += result.affected
+            job["failed"] += len(result.failed)
+            job["elapsed"] += time.monotonic() - started
+            job["checkpoint"] = page[-1][0]
+            broadcast_db.update_broadcast(
+                job["_id"],
+                checkpoint=job["checkpoint"],
+                sent=job["sent"],
+                failed=job["failed"],
+                elapsed=job["elapsed"],
+            )
+
+        broadcast_db.update_broadcast(job["_id"], status="done")
+        __report(job)
+    except Exception:
+        # Left as running, the next start picks it up from the checkpoint
+        LOGGER.exception("Broadcast %s stopped", job["_id"])
+    finally:
+        with RUNNING_LOCK:
+            RUNNING.discard(job["_id"])
+
+
+def __report(job):
+    rate = job["sent"] / job["elapsed"] if job["elapsed"] else 0
+    LOGGER.info(
+        "Broadcast %s finished in %.1fs: %d sent, %d failed",
+        job["_id"],
+        job["elapsed"],
+        job["sent"],
+        job["failed"],
+    )
+    if not job["report_chat"]:
+        return
+    try:
+        dispatcher.bot.send_message(
+            job["report_chat"],
+            "Siaran selesai.\nTerkirim: {}.\nGagal: {}.\nWaktu: {:.1f} detik ({:.1f} pesan/detik).".format(
+                job["sent"], job["failed"], job["elapsed"], rate
+            ),
+        )
+    except TelegramError:
+        LOGGER.warning("Could not report broadcast %s", job["_id"])
+
+
+# Unfinished broadcasts continue once the bot is running again
+dispatcher.job_queue.run_once(resume_broadcasts, 0)
@@ -1,16 +1,13 @@
-import urllib.request as url
-import json
 import datetime
-import requests
+
+from kaga.modules.helper_funcs.antispam import get_cas_result
 
 VERSION = "1.3.3"
-CAS_QUERY_URL = "https://api.cas.chat/check?user_id="
 DL_DIR = "./csvExports"
 
 def get_user_data(user_id):
-    with requests.request('GET', CAS_QUERY_URL + str(user_id)) as userdata_raw:
-        userdata = json.loads(userdata_raw.text)
-        return userdata
+    result = get_cas_result(user_id)
+    return {'ok': result is not None, 'result': result}
 
 def isbanned(userdata):
     return userdata['ok']
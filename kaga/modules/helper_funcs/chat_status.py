@@ -3,6 +3,8 @@ from telegram import User, Chat, ChatMember
 from telegram.error import BadRequest, Unauthorized
 
 from kaga import (
+    ADMIN_CACHE_SIZE,
+    ADMIN_CACHE_TTL,
     DEL_CMDS,
     DEV_USERS,
     SUDO_USERS,
@@ -10,15 +12,78 @@ from kaga import (
     dispatcher,
 )
 from cachetools import TTLCache
-from threading import RLock
+from threading import Event, Lock
 
-# refresh cache 10m
-ADMIN_CACHE = TTLCache(maxsize=512, ttl=60 * 10)
-THREAD_LOCK = RLock()
+# chat_id -> {user_id: ChatMember} of every admin, the bot included
+ADMIN_CACHE = TTLCache(maxsize=ADMIN_CACHE_SIZE, ttl=ADMIN_CACHE_TTL)
+IN_FLIGHT = {}
+CACHE_LOCK = Lock()
+FETCH_TIMEOUT = 10
+
+
+def __fetch_admins(chat_id):
+    try:
+        return {
+            admin.user.id: admin
+            for admin in dispatcher.bot.getChatAdministrators(chat_id)
+        }
+    except (BadRequest, Unauthorized):
+        return None
+
+
+def get_chat_admins(chat_id) -> dict:
+    """Return the admins of a chat as {user_id: ChatMember}.
+
+    Only one request per chat is made at a time, other callers for the same
+    chat wait for it; chats we can't read return an empty dict, uncached.
+    """
+    with CACHE_LOCK:
+        admins = ADMIN_CACHE.get(chat_id)
+        if admins is not None:
+            return admins
+
+        event = IN_FLIGHT.get(chat_id)
+        leader = event is None
+        if leader:
+            event = IN_FLIGHT[chat_id] = Event()
+
+    if not leader:
+        event.wait(FETCH_TIMEOUT)
+        with CACHE_LOCK:
+            return ADMIN_CACHE.get(chat_id) or {}
+
+    try:
+        admins = __fetch_admins(chat_id)
+        if admins is None:
+            return {}
+        with CACHE_LOCK:
+            ADMIN_CACHE[chat_id] = admins
+        return admins
+    finally:
+        with CACHE_LOCK:
+            IN_FLIGHT.pop(chat_id, None)
+        event.set()
+
+
+def invalidate_admin_cache(chat_id) -> None:
+    with CACHE_LOCK:
+        ADMIN_CACHE.pop(chat_id, None)
+
+
+def forget_chat_member(chat_id, user_id) -> None:
+    """Drop the cached admins of a chat if user_id was one of them."""
+    with CACHE_LOCK:
+        if user_id in ADMIN_CACHE.get(chat_id, ()):
+            ADMIN_CACHE.pop(chat_id, None)
+
+
+def bot_has_right(chat: Chat, bot_id: int, right: str) -> bool:
+    """Whether the bot holds an admin right, read from the cached admins."""
+    return bool(getattr(get_chat_admins(chat.id).get(bot_id), right, False))
 
 
 def can_delete(chat: Chat, bot_id: int) -> bool:
-    return chat.get_member(bot_id).can_delete_messages
+    return bot_has_right(chat, bot_id, "can_delete_messages")
 
 
 def is_user_ban_protected(
@@ -35,7 +100,7 @@ def is_user_ban_protected(
         return True
 
     if not member:
-        member = chat.get_member(user_id)
+        return user_id in get_chat_admins(chat.id)
     return member.status in ("administrator", "creator")
 
 
@@ -50,23 +115,8 @@ def is_user_admin(chat: Chat, user_id: int, member: ChatMember = None) -> bool:
         return True
 
     if not member:
-        with THREAD_LOCK:
-            # try to fetch from cache first.
-            try:
-                return user_id in ADMIN_CACHE[chat.id]
-            except KeyError:
-                # keyerror happend means cache is deleted,
-                # so query bot api again and return user status
-                # while saving it in cache for future useage...
-                try:
-                    chat_admins = dispatcher.bot.getChatAdministrators(chat.id)
-                    admin_list = [x.user.id for x in chat_admins]
-                    ADMIN_CACHE[chat.id] = admin_list
-
-                    if user_id in admin_list:
-                        return True
-                except Unauthorized:
-                    return False
+        return user_id in get_chat_admins(chat.id)
+    return member.status in ("administrator", "creator")
 
 
 def is_bot_admin(
@@ -76,7 +126,7 @@ def is_bot_admin(
         return True
 
     if not bot_member:
-        bot_member = chat.get_member(bot_id)
+        return bot_id in get_chat_admins(chat.id)
     return bot_member.status in ("administrator", "creator")
 
 
@@ -102,7 +152,9 @@ def bot_can_delete(func):
 def can_pin(func):
     @wraps(func)
     def pin_rights(update, context, *args, **kwargs):
-        if update.effective_chat.get_member(context.bot.id).can_pin_messages:
+        if bot_has_right(
+            update.effective_chat, context.bot.id, "can_pin_messages"
+        ):
             return func(update, context, *args, **kwargs)
         else:
             update.effective_message.reply_text(
@@ -116,9 +168,9 @@ def can_pin(func):
 def can_promote(func):
     @wraps(func)
     def promote_rights(update, context, *args, **kwargs):
-        if update.effective_chat.get_member(
-            context.bot.id
-        ).can_promote_members:
+        if bot_has_right(
+            update.effective_chat, context.bot.id, "can_promote_members"
+        ):
             return func(update, context, *args, **kwargs)
         else:
             update.effective_message.reply_text(
@@ -132,9 +184,9 @@ def can_promote(func):
 def can_restrict(func):
     @wraps(func)
     def promote_rights(update, context, *args, **kwargs):
-        if update.effective_chat.get_member(
-            context.bot.id
-        ).can_restrict_members:
+        if bot_has_right(
+            update.effective_chat, context.bot.id, "can_restrict_members"
+        ):
             return func(update, context, *args, **kwargs)
         else:
             update.effective_message.reply_text(
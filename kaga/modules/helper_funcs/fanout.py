@@ -0,0 +1,224 @@
+"""Run one Bot API action against many chats, off the dispatcher workers."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from telegram.error import RetryAfter, TimedOut
+
+from kaga import LOGGER
+
+FANOUT_WORKERS = 16
+INTERACTIVE_WORKERS = 8
+MAX_RETRIES = 3
+# Telegram allows about 30 requests per second overall, and one per second
+# in a single chat before it starts answering with flood waits.
+GLOBAL_RATE = 30
+CHAT_INTERVAL = 1
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated) * self.rate,
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Hold every caller back for `seconds`, used after a flood wait."""
+        with self.lock:
+            self.tokens = min(self.tokens, -seconds * self.rate)
+            self.updated = time.monotonic()
+
+
+class ChatThrottle:
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, chat_id):
+        with self.lock:
+            now = time.monotonic()
+            if len(self.next_slot) > 10000:
+                self.next_slot = {
+                    k: v for k, v in self.next_slot.items() if v > now
+                }
+            slot = max(now, self.next_slot.get(chat_id, now))
+            self.next_slot[chat_id] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+GLOBAL_BUCKET = TokenBucket(GLOBAL_RATE)
+CHAT_THROTTLE = ChatThrottle(CHAT_INTERVAL)
+EXECUTOR = ThreadPoolExecutor(
+    max_workers=FANOUT_WORKERS, thread_name_prefix="fanout"
+)
+# For jobs someone is waiting on, like purges and raid mutes, so they don't
+# queue behind a bulk fan out over thousands of chats
+INTERACTIVE_EXECUTOR = ThreadPoolExecutor(
+    max_workers=INTERACTIVE_WORKERS, thread_name_prefix="fanout-interactive"
+)
+
+
+def call_limited(bucket, throttle, func, chat_id, *args, **kwargs):
+    """Call func(chat_id, ...) within `bucket` and the per chat `throttle`
+    (None for no per chat limit), retrying flood waits and timeouts."""
+    for attempt in range(MAX_RETRIES + 1):
+        if throttle is not None:
+            throttle.acquire(chat_id)
+        bucket.acquire()
+        try:
+            return func(chat_id, *args, **kwargs)
+        except RetryAfter as excp:
+            if attempt == MAX_RETRIES:
+                raise
+            bucket.pause(excp.retry_after)
+            time.sleep(excp.retry_after)
+        except TimedOut:
+            if attempt == MAX_RETRIES:
+                raise
+
+
+def call_rate_limited(func, chat_id, *args, **kwargs):
+    """Call func(chat_id, ...) within the rate limits, retrying flood waits."""
+    return call_limited(
+        GLOBAL_BUCKET, CHAT_THROTTLE, func, chat_id, *args, **kwargs
+    )
+
+
+class AbortFanOut(Exception):
+    """Raised by an action to skip every chat that hasn't been processed yet."""
+
+
+class FanOutJob:
+    """Progress of a fan out.
+
+    `action(chat_id)` returns True when the chat was affected and False when
+    it was skipped; anything it raises is recorded as a failure for that chat.
+    Calls go through `bucket` and the per chat `throttle`, the Bot API
+    sending limits by default.
+    """
+
+    def __init__(
+        self,
+        name,
+        chat_ids,
+        action,
+        on_done=None,
+        bucket=GLOBAL_BUCKET,
+        throttle=CHAT_THROTTLE,
+    ):
+        self.name = name
+        self.chat_ids = list(dict.fromkeys(chat_ids))
+        self.action = action
+        self.on_done = on_done
+        self.bucket = bucket
+        self.throttle = throttle
+        self.affected = 0
+        self.skipped = 0
+        self.failed = {}
+        self.cancelled = False
+        self.started = time.monotonic()
+        self.finished = None
+        self._pending = len(self.chat_ids)
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self.finished is not None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    def cancel(self):
+        """Skip every chat that hasn't been processed yet."""
+        self.cancelled = True
+
+    def _run(self, chat_id):
+        result, error = False, None
+        try:
+            if not self.cancelled:
+                result = call_limited(
+                    self.bucket, self.throttle, self.action, chat_id
+                )
+        except AbortFanOut as excp:
+            self.cancel()
+            error = str(excp)
+        except Exception as excp:
+            error = getattr(excp, "message", None) or str(excp)
+        self._finish(chat_id, result, error)
+
+    def _finish(self, chat_id, result, error):
+        with self._lock:
+            if error is not None:
+                self.failed[chat_id] = error
+            elif result:
+                self.affected += 1
+            else:
+                self.skipped += 1
+            self._pending -= 1
+            if self._pending > 0:
+                return
+        self._complete()
+
+    def _complete(self):
+        self.finished = time.monotonic()
+        LOGGER.info(
+            "Fan out %s finished in %.1fs: %d affected, %d skipped, %d failed",
+            self.name,
+            self.elapsed,
+            self.affected,
+            self.skipped,
+            len(self.failed),
+        )
+        if self.on_done:
+            try:
+                self.on_done(self)
+            except Exception:
+                LOGGER.exception("Error reporting fan out %s", self.name)
+
+
+def fan_out(
+    name, chat_ids, action, on_done=None, executor=EXECUTOR, **limits
+) -> FanOutJob:
+    """Run action for every chat in the background and return its job.
+
+    on_done(job) is called once, from a fan out thread, after the last chat.
+    Bulk jobs share EXECUTOR; pass INTERACTIVE_EXECUTOR for jobs a user is
+    waiting on. `limits` can replace the job's `bucket` and `throttle`.
+    """
+    job = FanOutJob(name, chat_ids, action, on_done, **limits)
+    if not job.chat_ids:
+        job._complete()
+        return job
+
+    for chat_id in job.chat_ids:
+        executor.submit(job._run, chat_id)
+    return job
+
+
+def fan_out_sync(name, chat_ids, action) -> FanOutJob:
+    """Like fan_out, but return the job once every chat is done."""
+    finished = threading.Event()
+    job = fan_out(name, chat_ids, action, on_done=lambda _: finished.set())
+    finished.wait()
+    return job
@@ -1,7 +1,10 @@
+import threading
+
 import telegram.ext as tg
 from telegram import Update
+from telegram.ext.dispatcher import DEFAULT_GROUP
 
-from kaga import LOGGER
+from kaga import LOGGER, dispatcher
 
 try:
     from kaga import CUSTOM_CMD
@@ -14,6 +17,38 @@ if CUSTOM_CMD:
 else:
     CMD_STARTERS = "/"
 
+# Captured before CustomCommandHandler may replace tg.CommandHandler
+CommandHandler = tg.CommandHandler
+
+# The dispatcher checks every handler against the same update in turn, the
+# command is parsed for the first and reused by the rest.
+PARSED = threading.local()
+
+
+def parse_command(update):
+    """(command, args) for an update starting with a command to this bot.
+
+    The command is lowercased, with the prefix and any @botname removed.
+    Returns None for updates that aren't commands or are meant for another
+    bot.
+    """
+    if getattr(PARSED, "update", None) is update:
+        return PARSED.command
+
+    command = None
+    message = update.effective_message if isinstance(update, Update) else None
+    if message and message.text and len(message.text) > 1:
+        words = message.text.split()
+        fst_word = words[0]
+        if len(fst_word) > 1 and fst_word.startswith(tuple(CMD_STARTERS)):
+            name, _, username = fst_word[1:].partition("@")
+            if not username or username.lower() == message.bot.username.lower():
+                command = (name.lower(), words[1:])
+
+    PARSED.update = update
+    PARSED.command = command
+    return command
+
 
 class CustomCommandHandler(tg.CommandHandler):
     def __init__(self, command, callback, **kwargs):
@@ -22,28 +57,84 @@ class CustomCommandHandler(tg.CommandHandler):
         super().__init__(command, callback, **kwargs)
 
     def check_update(self, update):
-        if isinstance(update, Update) and update.effective_message:
-            message = update.effective_message
-
-            if message.text and len(message.text) > 1:
-                fst_word = message.text.split(None, 1)[0]
-                if len(fst_word) > 1 and any(
-                    fst_word.startswith(start) for start in CMD_STARTERS
-                ):
-                    args = message.text.split()[1:]
-                    command = fst_word[1:].split("@")
-                    command.append(
-                        message.bot.username
-                    )  # in case the command was sent without a username
-
-                    if not (
-                        command[0].lower() in self.command
-                        and command[1].lower() == message.bot.username.lower()
-                    ):
-                        return None
-
-                    filter_result = self.filters(update)
-                    if filter_result:
-                        return args, filter_result
-                    else:
-                        return False
+        parsed = parse_command(update)
+        if parsed is None or parsed[0] not in self.command:
+            return None
+
+        filter_result = self.filters(update)
+        if filter_result:
+            return parsed[1], filter_result
+        else:
+            return False
+
+
+class CommandRouter(tg.Handler):
+    """Stands in for every command handler of a dispatcher group.
+
+    The update's command is looked up in a dict of the group's command
+    handlers, only those registered for it get their check_update called,
+    in the order they were added.
+    """
+
+    def __init__(self):
+        super().__init__(None)
+        self.commands = {}
+
+    def add(self, handler):
+        for command in handler.command:
+            self.commands.setdefault(command, []).append(handler)
+
+    def remove(self, handler) -> bool:
+        removed = False
+        for command in handler.command:
+            handlers = self.commands.get(command, [])
+            if handler in handlers:
+                handlers.remove(handler)
+                removed = True
+        return removed
+
+    def check_update(self, update):
+        parsed = parse_command(update)
+        if parsed is None:
+            return None
+        for handler in self.commands.get(parsed[0], ()):
+            check = handler.check_update(update)
+            if check is not None and check is not False:
+                return handler, check
+        return None
+
+    def handle_update(self, update, dispatcher, check_result, context=None):
+        handler, check = check_result
+        return handler.handle_update(update, dispatcher, check, context)
+
+
+# group -> CommandRouter
+ROUTERS = {}
+__add_handler = dispatcher.add_handler
+__remove_handler = dispatcher.remove_handler
+
+
+def add_handler(handler, group=DEFAULT_GROUP):
+    """dispatcher.add_handler, with command handlers going to the router.
+
+    A group's router takes the place of its first command handler.
+    """
+    if not isinstance(handler, CommandHandler):
+        return __add_handler(handler, group)
+
+    router = ROUTERS.get(group)
+    if router is None:
+        router = ROUTERS[group] = CommandRouter()
+        __add_handler(router, group)
+    router.add(handler)
+
+
+def remove_handler(handler, group=DEFAULT_GROUP):
+    router = ROUTERS.get(group)
+    if router is not None and router.remove(handler):
+        return
+    __remove_handler(handler, group)
+
+
+dispatcher.add_handler = add_handler
+dispatcher.remove_handler = remove_handler
@@ -0,0 +1,89 @@
+"""Shared HTTP session for the modules calling external APIs."""
+
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from cachetools import LRUCache
+from requests.adapters import HTTPAdapter
+
+DEFAULT_TIMEOUT = 10
+# Connections kept open per host, and requests allowed in flight per host
+POOL_SIZE = 16
+HOST_CONCURRENCY = 4
+CACHE_SIZE = 2000
+
+SESSION = requests.Session()
+ADAPTER = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+SESSION.mount("http://", ADAPTER)
+SESSION.mount("https://", ADAPTER)
+
+HOST_LIMITS = {}
+HOST_LIMITS_LOCK = threading.Lock()
+
+# key -> (expires, response)
+RESPONSES = LRUCache(maxsize=CACHE_SIZE)
+CACHE_LOCK = threading.Lock()
+
+
+def __host_limit(url):
+    host = urlsplit(url).netloc
+    with HOST_LIMITS_LOCK:
+        limit = HOST_LIMITS.get(host)
+        if limit is None:
+            limit = HOST_LIMITS[host] = threading.BoundedSemaphore(
+                HOST_CONCURRENCY
+            )
+    return limit
+
+
+def __cache_key(method, url, kwargs):
+    return (
+        method,
+        url,
+        json.dumps(
+            {
+                key: kwargs.get(key)
+                for key in ("params", "data", "json", "headers")
+            },
+            sort_keys=True,
+            default=str,
+        ),
+    )
+
+
+def request(method, url, cache_ttl=0, **kwargs) -> requests.Response:
+    """requests.request through the shared session.
+
+    Requests get DEFAULT_TIMEOUT unless they set their own. With cache_ttl,
+    successful responses are kept for that many seconds and repeated
+    requests with the same url and arguments are answered from memory.
+    """
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    key = None
+    if cache_ttl:
+        key = __cache_key(method, url, kwargs)
+        with CACHE_LOCK:
+            cached = RESPONSES.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+    with __host_limit(url):
+        response = SESSION.request(method, url, **kwargs)
+
+    if key is not None and response.ok:
+        # Read the body now, the cached response outlives the connection
+        response.content
+        with CACHE_LOCK:
+            RESPONSES[key] = (time.monotonic() + cache_ttl, response)
+    return response
+
+
+def get(url, cache_ttl=0, **kwargs) -> requests.Response:
+    return request("GET", url, cache_ttl=cache_ttl, **kwargs)
+
+
+def post(url, cache_ttl=0, **kwargs) -> requests.Response:
+    return request("POST", url, cache_ttl=cache_ttl, **kwargs)
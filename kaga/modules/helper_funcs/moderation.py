@@ -0,0 +1,128 @@
+"""Run the per-message moderation checks of every module in one handler."""
+
+import threading
+from collections import namedtuple
+
+from telegram.ext import Filters, MessageHandler
+from telegram.ext.dispatcher import DispatcherHandlerStop
+
+from kaga import LOGGER, dispatcher
+from kaga.modules.helper_funcs.chat_status import is_user_admin
+
+MODERATION_GROUP = 1
+
+Stage = namedtuple(
+    "Stage",
+    ["order", "name", "callback", "filters", "skip_admins", "settings", "final"],
+)
+STAGES = []
+
+# The state of the update the pipeline is running on in this thread
+CURRENT = threading.local()
+
+
+class ModerationState:
+    """What the stages of a single update share.
+
+    `settings` is the snapshot of every stage's chat settings, read once when
+    the update comes in. The sender's admin status is worked out on first use.
+    """
+
+    def __init__(self, update):
+        self.update = update
+        self.chat = update.effective_chat
+        self.user = update.effective_user
+        self.settings = {
+            stage.name: stage.settings(self.chat.id)
+            for stage in STAGES
+            if stage.settings is not None
+        }
+        self._sender_is_admin = None
+
+    @property
+    def sender_is_admin(self) -> bool:
+        if self._sender_is_admin is None:
+            self._sender_is_admin = bool(self.user) and bool(
+                is_user_admin(self.chat, self.user.id)
+            )
+        return self._sender_is_admin
+
+
+def register_stage(
+    order,
+    name,
+    callback,
+    filters=None,
+    skip_admins=False,
+    settings=None,
+    final=False,
+):
+    """Add a check to the moderation pipeline.
+
+    Stages run by ascending `order` for group messages matching `filters`.
+    `settings(chat_id)` returns the stage's settings for a chat, which the
+    stage reads back with stage_settings(); the stage doesn't run in chats
+    where they are falsy. With `skip_admins`, the stage doesn't run for
+    messages sent by admins.
+    `callback(update, context)` returns a truthy value once it has acted on
+    the message. Only a `final` stage, one that removes the sender, ends the
+    pipeline when it does; every other stage still runs.
+    """
+    STAGES.append(
+        Stage(order, name, callback, filters, skip_admins, settings, final)
+    )
+    STAGES.sort(key=lambda stage: stage.order)
+
+
+def __current_state(update):
+    state = getattr(CURRENT, "state", None)
+    if state is not None and state.update is update:
+        return state
+    return None
+
+
+def sender_is_admin(update) -> bool:
+    """Whether the sender is an admin, computed once per update."""
+    state = __current_state(update)
+    if state is not None:
+        return state.sender_is_admin
+    user = update.effective_user
+    return bool(user) and bool(is_user_admin(update.effective_chat, user.id))
+
+
+def stage_settings(update, name):
+    """The settings of stage `name` for the update's chat, from the snapshot."""
+    state = __current_state(update)
+    if state is not None and name in state.settings:
+        return state.settings[name]
+    for stage in STAGES:
+        if stage.name == name and stage.settings is not None:
+            return stage.settings(update.effective_chat.id)
+    return None
+
+
+def moderate(update, context):
+    state = CURRENT.state = ModerationState(update)
+    try:
+        for stage in STAGES:
+            if stage.settings is not None and not state.settings[stage.name]:
+                continue
+            if stage.filters is not None and not stage.filters(update):
+                continue
+            if stage.skip_admins and state.sender_is_admin:
+                continue
+            try:
+                if stage.callback(update, context) and stage.final:
+                    return
+            except DispatcherHandlerStop:
+                return
+            except Exception:
+                LOGGER.exception("Moderation stage %s failed", stage.name)
+    finally:
+        CURRENT.state = None
+
+
+dispatcher.add_handler(
+    MessageHandler(Filters.all & Filters.chat_type.groups, moderate, run_async=True),
+    MODERATION_GROUP,
+)
@@ -302,3 +302,29 @@ def markdown_to_html(text):
         tags=["strong", "em", "a", "code", "pre", "strike", "u"],
         strip=True,
     )[:-1]
+
+
+def compile_keywords(keywords):
+    """A matcher for keywords as whole words, for first_keyword_match()."""
+    keywords = list(keywords)
+    # Every keyword gets its own group, in priority order, wrapped in a
+    # lookahead so a single finditer sees overlapping matches too.
+    alternation = "|".join("({})".format(re.escape(x)) for x in keywords)
+    pattern = re.compile(
+        r"(?<!\w)(?=(?:" + alternation + r")(?!\w))", flags=re.IGNORECASE
+    )
+    return keywords, pattern
+
+
+def first_keyword_match(matcher, text):
+    """The keyword of the matcher found in text that comes first in its list,
+    or None."""
+    keywords, pattern = matcher
+    best = None
+    for match in pattern.finditer(text):
+        if best is None or match.lastindex < best:
+            best = match.lastindex
+            if best == 1:
+                break
+
+    return keywords[best - 1] if best is not None else None
@@ -0,0 +1,72 @@
+"""Probe every entry of a table for dead chats or users, resumably."""
+
+import time
+
+from kaga import LOGGER
+from kaga.modules.helper_funcs.fanout import fan_out_sync
+from kaga.modules.no_sql import sweep_db
+
+# Candidates are probed and checkpointed one page at a time
+PAGE_SIZE = 200
+# Findings older than this aren't acted upon, the table is swept again
+FINDINGS_TTL = 60 * 60
+
+
+def __probe_all(name, entry_ids, probe) -> list:
+    dead = []
+
+    def run_probe(entry_id):
+        if probe(entry_id):
+            dead.append(entry_id)
+            return True
+        return False
+
+    fan_out_sync("sweep {}".format(name), entry_ids, run_probe)
+    return dead
+
+
+def sweep(name, candidates, probe, on_progress=None, reuse=False) -> list:
+    """Probe every candidate and return the ids found dead.
+
+    `candidates(after, limit)` returns up to `limit` (key, id) pairs ordered by
+    key, starting after the key `after` (None at the start). `probe(id)`
+    returns True when the id is dead; anything it raises counts as alive.
+    An interrupted sweep of the same name continues from its checkpoint.
+    With `reuse`, the findings of a sweep finished within FINDINGS_TTL are
+    probed again and those still dead are returned, otherwise a finished
+    sweep starts over.
+    """
+    state = sweep_db.get_sweep(name)
+    if state and state.get("finished"):
+        age = time.time() - state.get("finished_at", 0)
+        if reuse and age <= FINDINGS_TTL:
+            return __probe_all(name, state.get("found", []), probe)
+        sweep_db.clear_sweep(name)
+        state = None
+
+    state = state or {}
+    checkpoint = state.get("checkpoint")
+    scanned = state.get("scanned", 0)
+    found = list(state.get("found", []))
+
+    while True:
+        page = candidates(checkpoint, PAGE_SIZE)
+        if not page:
+            break
+
+        dead = __probe_all(name, [entry_id for _, entry_id in page], probe)
+        checkpoint = page[-1][0]
+        scanned += len(page)
+        found += dead
+        sweep_db.save_sweep_page(name, checkpoint, len(page), dead)
+        if on_progress:
+            on_progress(scanned)
+
+    sweep_db.finish_sweep(name)
+    LOGGER.info("Sweep %s found %d of %d entries dead", name, len(found), scanned)
+    return found
+
+
+def clear_sweep(name) -> None:
+    """Forget the findings of a sweep, once they have been acted upon."""
+    sweep_db.clear_sweep(name)
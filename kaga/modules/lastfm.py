@@ -1,13 +1,11 @@
-import time
-
-import requests
-from telegram import ParseMode, error
+from telegram import ParseMode
 from telegram.ext import CommandHandler
 
 from kaga import LASTFM_API_KEY, dispatcher
 from kaga.modules.no_sql import get_collection
 from kaga.modules.disable import DisableAbleCommandHandler
-from kaga.modules.helper_funcs.alternate import typing_action
+from kaga.modules.helper_funcs import http_client
+from kaga.modules.helper_funcs.alternate import delete_after, typing_action
 
 
 LASTFM_USER = get_collection("LAST_FM")
@@ -32,11 +30,7 @@ def set_user(update, context):
         del_msg = msg.reply_text(
             "That's Bukan begitu cara kerjanyanot how this works...\nJalankan /setuser diikuti dengan nama pengguna Anda!"
         )
-    time.sleep(10)
-    try:
-        del_msg.delete()
-    except error.BadRequest:
-        return
+    delete_after(10, del_msg)
 
 
 @typing_action
@@ -46,8 +40,7 @@ def clear_user(update, context):
     clear = update.effective_message.reply_text(
         "Nama pengguna Last.fm berhasil dihapus dari database saya!"
     )
-    time.sleep(10)
-    clear.delete()
+    delete_after(10, clear)
 
 
 @typing_action
@@ -61,7 +54,7 @@ def last_fm(update, context):
         return
     username = data["username"]
     base_url = "http://ws.audioscrobbler.com/2.0"
-    res = requests.get(
+    res = http_client.get(
         f"{base_url}?method=user.getrecenttracks&limit=3&extended=1&user={username}&api_key={LASTFM_API_KEY}&format=json"
     )
     if not res.status_code == 200:
@@ -97,7 +90,7 @@ def last_fm(update, context):
         for artist, song in track_dict.items():
             rep += f"🎧  <code>{artist} - {song}</code>\n"
         last_user = (
-            requests.get(
+            http_client.get(
                 f"{base_url}?method=user.getinfo&user={username}&api_key={LASTFM_API_KEY}&format=json"
             )
             .json()
@@ -107,12 +100,7 @@ def last_fm(update, context):
         rep += f"\n(<code>{scrobbles}</code> scrobbles so far)"
 
     send = msg.reply_text(rep, parse_mode=ParseMode.HTML)
-    time.sleep(60)
-    try:
-        send.delete()
-        msg.delete()
-    except error.BadRequest:
-        return
+    delete_after(60, send, msg)
  
 def __stats__():
     return "× {} menyimpan nama pengguna Last.FM.".format(
@@ -3,7 +3,7 @@ import html
 from alphabet_detector import AlphabetDetector
 from telegram import ChatPermissions, MessageEntity, ParseMode, TelegramError
 from telegram.error import BadRequest
-from telegram.ext import CommandHandler, Filters, MessageHandler
+from telegram.ext import CommandHandler, Filters
 from telegram.utils.helpers import mention_html
 
 import kaga.modules.sql.locks_sql as sql
@@ -16,8 +16,8 @@ from kaga.modules.helper_funcs.chat_status import (
     is_bot_admin,
     is_user_admin,
     user_admin,
-    user_not_admin,
 )
+from kaga.modules.helper_funcs.moderation import register_stage, stage_settings
 from kaga.modules.log_channel import loggable
 
 ad = AlphabetDetector()
@@ -376,16 +376,19 @@ def unlock(update, context) -> str:
     return ""
 
 
-@user_not_admin
 def del_lockables(update, context):
     chat = update.effective_chat
     message = update.effective_message
 
+    locks = stage_settings(update, "locks")
+    if not locks:
+        return
+
     for lockable, filter in LOCK_TYPES.items():
+        if not locks & sql.LOCK_BITS[lockable]:
+            continue
         if lockable == "rtl":
-            if sql.is_locked(chat.id, lockable) and can_delete(
-                chat, context.bot.id
-            ):
+            if can_delete(chat, context.bot.id):
                 if message.caption:
                     check = ad.detect_alphabet(u"{}".format(message.caption))
                     if "ARABIC" in check:
@@ -396,7 +399,7 @@ def del_lockables(update, context):
                                 pass
                             else:
                                 LOGGER.exception("ERROR in lockables")
-                        break
+                        return True
                 if message.text:
                     check = ad.detect_alphabet(u"{}".format(message.text))
                     if "ARABIC" in check:
@@ -407,12 +410,10 @@ def del_lockables(update, context):
                                 pass
                             else:
                                 LOGGER.exception("ERROR in lockables")
-                        break
+                        return True
             continue
         if lockable == "button":
-            if sql.is_locked(chat.id, lockable) and can_delete(
-                chat, context.bot.id
-            ):
+            if can_delete(chat, context.bot.id):
                 if (
                     message.reply_markup
                     and message.reply_markup.inline_keyboard
@@ -424,12 +425,10 @@ def del_lockables(update, context):
                             pass
                         else:
                             LOGGER.exception("ERROR in lockables")
-                    break
+                    return True
             continue
         if lockable == "inline":
-            if sql.is_locked(chat.id, lockable) and can_delete(
-                chat, context.bot.id
-            ):
+            if can_delete(chat, context.bot.id):
                 if message and message.via_bot:
                     try:
                         message.delete()
@@ -438,13 +437,9 @@ def del_lockables(update, context):
                             pass
                         else:
                             LOGGER.exception("ERROR in lockables")
-                    break
+                    return True
             continue
-        if (
-            filter(update)
-            and sql.is_locked(chat.id, lockable)
-            and can_delete(chat, context.bot.id)
-        ):
+        if filter(update) and can_delete(chat, context.bot.id):
             if lockable == "bots":
                 new_members = update.effective_message.new_chat_members
                 for new_mem in new_members:
@@ -472,7 +467,7 @@ def del_lockables(update, context):
                     else:
                         LOGGER.exception("ERROR in lockables")
 
-                break
+                return True
 
 
 def build_lock_message(chat_id):
@@ -634,6 +629,10 @@ dispatcher.add_handler(UNLOCK_HANDLER)
 dispatcher.add_handler(LOCKTYPES_HANDLER)
 dispatcher.add_handler(LOCKED_HANDLER)
 
-dispatcher.add_handler(
-    MessageHandler(Filters.all & Filters.chat_type.groups, del_lockables), PERM_GROUP
+register_stage(
+    PERM_GROUP,
+    "locks",
+    del_lockables,
+    skip_admins=True,
+    settings=sql.get_lock_mask,
 )
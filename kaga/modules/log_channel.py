@@ -1,3 +1,5 @@
+import threading
+from collections import deque
 from datetime import datetime
 from functools import wraps
 
@@ -8,15 +10,31 @@ from kaga.modules.helper_funcs.misc import is_module_loaded
 FILENAME = __name__.rsplit(".", 1)[-1]
 
 if is_module_loaded(FILENAME):
-    from telegram import ParseMode, Update
-    from telegram.error import BadRequest, Unauthorized
+    from telegram import MAX_MESSAGE_LENGTH, ParseMode, Update
+    from telegram.error import (
+        BadRequest,
+        NetworkError,
+        TelegramError,
+        Unauthorized,
+    )
     from telegram.ext import CommandHandler, JobQueue, run_async
     from telegram.utils.helpers import escape_markdown
 
     from kaga import EVENT_LOGS, LOGGER, dispatcher
     from kaga.modules.helper_funcs.chat_status import user_admin
+    from kaga.modules.helper_funcs.fanout import call_rate_limited
     from kaga.modules.sql import log_channel_sql as sql
 
+    # Logs are queued and sent in the background, entries for the same log
+    # channel that pile up between flushes go out as one message.
+    LOG_FLUSH_INTERVAL = 3
+    MAX_PENDING_LOGS = 1000
+    LOG_SEPARATOR = "\n\n"
+
+    # log_chat_id -> deque of (orig_chat_ids, result)
+    PENDING_LOGS = {}
+    PENDING_LOGS_LOCK = threading.Lock()
+
     def loggable(func):
 
         @wraps(func)
@@ -30,23 +48,28 @@ if is_module_loaded(FILENAME):
             else:
                 result = func(update, context, job_queue, *args, **kwargs)
 
-            chat = update.effective_chat
-            message = update.effective_message
-
             if result:
-                datetime_fmt = "%H:%M - %d-%m-%Y"
-                result += f"\n<b>Event Stamp</b>: <code>{datetime.utcnow().strftime(datetime_fmt)}</code>"
-
-                if message.chat.type == chat.SUPERGROUP and message.chat.username:
-                    result += f'\n<b>Link:</b> <a href="https://t.me/{chat.username}/{message.message_id}">click here</a>'
-                log_chat = sql.get_chat_log_channel(chat.id)
-                if log_chat:
-                    send_log(context, log_chat, chat.id, result)
+                result = log_result(context, update.effective_chat,
+                                    update.effective_message, result)
 
             return result
 
         return log_action
 
+    def log_result(context: CallbackContext, chat, message, result: str):
+        """Send result to the chat's log channel, for actions that finish
+        after their handler has returned."""
+        datetime_fmt = "%H:%M - %d-%m-%Y"
+        result += f"\n<b>Event Stamp</b>: <code>{datetime.utcnow().strftime(datetime_fmt)}</code>"
+
+        if message.chat.type == chat.SUPERGROUP and message.chat.username:
+            result += f'\n<b>Link:</b> <a href="https://t.me/{chat.username}/{message.message_id}">click here</a>'
+        log_chat = sql.get_chat_log_channel(chat.id)
+        if log_chat:
+            send_log(context, log_chat, chat.id, result)
+
+        return result
+
     def gloggable(func):
 
         @wraps(func)
@@ -73,28 +96,107 @@ if is_module_loaded(FILENAME):
 
     def send_log(context: CallbackContext, log_chat_id: str, orig_chat_id: str,
                  result: str):
-        bot = context.bot
+        """Queue result for log_chat_id, without waiting for it to be sent."""
+        with PENDING_LOGS_LOCK:
+            PENDING_LOGS.setdefault(
+                str(log_chat_id), deque(maxlen=MAX_PENDING_LOGS)
+            ).append((frozenset((orig_chat_id,)), result[:MAX_MESSAGE_LENGTH]))
+
+    def __merge_logs(entries):
+        """Join entries into as few messages as fit the length limit."""
+        batches = []
+        for orig_chat_ids, result in entries:
+            if batches and len(batches[-1][1]) + len(LOG_SEPARATOR) + len(
+                    result) <= MAX_MESSAGE_LENGTH:
+                batches[-1][0].update(orig_chat_ids)
+                batches[-1][1] += LOG_SEPARATOR + result
+            else:
+                batches.append([set(orig_chat_ids), result])
+        return batches
+
+    def __unset_log_channel(bot, log_chat_id, orig_chat_ids, notice):
+        """Stop logging orig_chat_ids to a log channel that is gone."""
+        for orig_chat_id in orig_chat_ids:
+            # The chat may have set another log channel in the meantime
+            if str(sql.get_chat_log_channel(orig_chat_id)) != str(log_chat_id):
+                continue
+            sql.stop_chat_logging(orig_chat_id)
+            try:
+                bot.send_message(orig_chat_id, notice)
+            except TelegramError:
+                LOGGER.warning("Could not tell %s its log channel is gone",
+                               orig_chat_id)
+
+    def __deliver_logs(bot, log_chat_id, orig_chat_ids, text) -> bool:
+        """Send one merged batch, False once the log channel is gone."""
         try:
-            bot.send_message(
-                log_chat_id,
-                result,
-                parse_mode=ParseMode.HTML,
-                disable_web_page_preview=True)
+            call_rate_limited(bot.send_message,
+                              log_chat_id,
+                              text,
+                              parse_mode=ParseMode.HTML,
+                              disable_web_page_preview=True)
         except BadRequest as excp:
             if excp.message == "Chat not found":
-                bot.send_message(
-                    orig_chat_id,
+                __unset_log_channel(
+                    bot, log_chat_id, orig_chat_ids,
                     "This log channel has been deleted - unsetting.")
-                sql.stop_chat_logging(orig_chat_id)
-            else:
-                LOGGER.warning(excp.message)
-                LOGGER.warning(result)
-                LOGGER.exception("Could not parse")
+                return False
 
-                bot.send_message(
-                    log_chat_id, result +
-                    "\n\nFormatting has been disabled due to an unexpected error."
-                )
+            LOGGER.warning(excp.message)
+            LOGGER.warning(text)
+            LOGGER.exception("Could not parse")
+
+            call_rate_limited(
+                bot.send_message, log_chat_id, text[:MAX_MESSAGE_LENGTH - 64] +
+                "\n\nFormatting has been disabled due to an unexpected error."
+            )
+        except Unauthorized:
+            LOGGER.warning("Can't send logs to %s anymore", log_chat_id)
+            __unset_log_channel(
+                bot, log_chat_id, orig_chat_ids,
+                "I can't post in this log channel anymore - unsetting.")
+            return False
+        return True
+
+    def __requeue_logs(log_chat_id, batches):
+        """Put unsent batches back in front of the logs queued since."""
+        with PENDING_LOGS_LOCK:
+            entries = [(frozenset(chat_ids), text)
+                       for chat_ids, text in batches]
+            entries.extend(PENDING_LOGS.get(log_chat_id, ()))
+            # Over the cap the oldest go, as when appending to a full queue
+            dropped = max(0, len(entries) - MAX_PENDING_LOGS)
+            PENDING_LOGS[log_chat_id] = deque(entries[dropped:],
+                                              maxlen=MAX_PENDING_LOGS)
+        if dropped:
+            LOGGER.warning("Dropped %d pending logs for %s", dropped,
+                           log_chat_id)
+
+    def __flush_logs(context: CallbackContext):
+        with PENDING_LOGS_LOCK:
+            pending = [(log_chat_id, list(entries))
+                       for log_chat_id, entries in PENDING_LOGS.items()
+                       if entries]
+            PENDING_LOGS.clear()
+
+        for log_chat_id, entries in pending:
+            batches = __merge_logs(entries)
+            for sent, (orig_chat_ids, text) in enumerate(batches):
+                try:
+                    if not __deliver_logs(context.bot, log_chat_id,
+                                          orig_chat_ids, text):
+                        break
+                except BadRequest:
+                    # Won't go through on a retry either, drop the batch
+                    LOGGER.exception("Could not send logs to %s", log_chat_id)
+                except NetworkError:
+                    # Still failing after the retries, what's left goes out
+                    # with the next flush
+                    LOGGER.warning("Could not send logs to %s", log_chat_id)
+                    __requeue_logs(log_chat_id, batches[sent:])
+                    break
+                except Exception:
+                    LOGGER.exception("Error sending logs to %s", log_chat_id)
 
     @run_async
     @user_admin
@@ -206,6 +308,9 @@ Setting the log channel is done by:
     dispatcher.add_handler(SET_LOG_HANDLER)
     dispatcher.add_handler(UNSET_LOG_HANDLER)
 
+    dispatcher.job_queue.run_repeating(
+        __flush_logs, interval=LOG_FLUSH_INTERVAL, first=LOG_FLUSH_INTERVAL)
+
 else:
     # run anyway if module not loaded
     def loggable(func):
@@ -213,3 +318,6 @@ else:
 
     def gloggable(func):
         return func
+
+    def log_result(context, chat, message, result):
+        return result
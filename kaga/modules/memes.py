@@ -1,11 +1,8 @@
 import random
 import re
-import time
 import os
 
 import base64
-import requests
-import requests as r
 from io import BytesIO
 from PIL import Image
 from telegram import MAX_MESSAGE_LENGTH, ParseMode, TelegramError
@@ -20,6 +17,7 @@ from kaga.modules.disable import (
     DisableAbleCommandHandler,
     DisableAbleMessageHandler,
 )
+from kaga.modules.helper_funcs import http_client
 from kaga.modules.helper_funcs.alternate import typing_action
 from kaga.modules.helper_funcs.extraction import extract_user
 from kaga.modules.helper_funcs.filters import CustomFilters
@@ -131,9 +129,22 @@ def punch(update, context):
 @typing_action
 def police(update, context):
     message = update.effective_message.reply_text("Wuanjayy...")
-    for i in fun.POLICE:
-        message.edit_text(i)
-        time.sleep(0.5)
+    # Each frame is an edit scheduled on the job queue, not a sleeping worker
+    context.job_queue.run_repeating(
+        police_frame, interval=0.5, first=0.5, context=(message, iter(fun.POLICE))
+    )
+
+
+def police_frame(context):
+    message, frames = context.job.context
+    frame = next(frames, None)
+    if frame is None:
+        context.job.schedule_removal()
+        return
+    try:
+        message.edit_text(frame)
+    except BadRequest:
+        context.job.schedule_removal()
 
 
 @typing_action
@@ -200,14 +211,15 @@ def changemymind(update, context):
         msg.reply_text("perlu membalas pesan untuk membuat stiker.")
     else:
         text = msg.reply_to_message.text
-        r = requests.get(
-            f"https://nekobot.xyz/api/imagegen?type=changemymind&text={text}").json()
+        r = http_client.get(
+            f"https://nekobot.xyz/api/imagegen?type=changemymind&text={text}",
+            cache_ttl=60 * 60).json()
         url = r.get("message")
         if not url:
             msg.reply_text("Tidak ada URL yang diterima dari API!")
             return
         with open("temp.png", "wb") as f:
-            f.write(requests.get(url).content)
+            f.write(http_client.get(url).content)
         img = Image.open("temp.png")
         img.save("temp.webp", "webp")
         msg.reply_document(open("temp.webp", "rb"))
@@ -244,7 +256,7 @@ def decide(update, context):
 def yesnowtf(update, context):
     msg = update.effective_message
     chat = update.effective_chat
-    res = r.get("https://yesno.wtf/api")
+    res = http_client.get("https://yesno.wtf/api")
     if res.status_code != 200:
         return msg.reply_text(random.choice(fun.DECIDE))
     else:
@@ -532,14 +544,15 @@ def changemymind(update, context):
         msg.reply_text("perlu membalas pesan untuk membuat stiker.")
     else:
         text = msg.reply_to_message.text
-        r = requests.get(
-            f"https://nekobot.xyz/api/imagegen?type=changemymind&text={text}").json()
+        r = http_client.get(
+            f"https://nekobot.xyz/api/imagegen?type=changemymind&text={text}",
+            cache_ttl=60 * 60).json()
         url = r.get("message")
         if not url:
             msg.reply_text("No URL was received from the API!")
             return
         with open("temp.png", "wb") as f:
-            f.write(requests.get(url).content)
+            f.write(http_client.get(url).content)
         img = Image.open("temp.png")
         img.save("temp.webp", "webp")
         msg.reply_document(open("temp.webp", "rb"))
@@ -553,14 +566,15 @@ def trumptweet(update, context):
         msg.reply_text("perlu membalas pesan ke tweet")
     else:
         text = msg.reply_to_message.text
-        r = requests.get(
-            f"https://nekobot.xyz/api/imagegen?type=trumptweet&text={text}").json()
+        r = http_client.get(
+            f"https://nekobot.xyz/api/imagegen?type=trumptweet&text={text}",
+            cache_ttl=60 * 60).json()
         url = r.get("message")
         if not url:
             msg.reply_text("No URL was received from the API!")
             return
         with open("temp.png", "wb") as f:
-            f.write(requests.get(url).content)
+            f.write(http_client.get(url).content)
         img = Image.open("temp.png")
         img.save("temp.webp", "webp")
         msg.reply_document(open("temp.webp", "rb"))
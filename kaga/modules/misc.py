@@ -9,10 +9,8 @@ from io import BytesIO
 from random import randint
 from typing import Optional
 
-import requests as r
 import wikipedia
 from covid import Covid
-from requests import get, post
 from telegram import (
     Chat,
     ChatAction,
@@ -35,15 +33,17 @@ from kaga import (
     WALL_API,
     WHITELIST_USERS,
     dispatcher,
-    spamwtc,
 )
 from kaga.__main__ import GDPR, STATS, USER_INFO
 from kaga.modules.disable import DisableAbleCommandHandler
 from kaga.modules.global_bans import check_cas
 from kaga.modules.helper_funcs.alternate import send_action, typing_action
+from kaga.modules.helper_funcs.antispam import get_spamwatch_ban
 from kaga.modules.helper_funcs.extraction import extract_user
 from kaga.modules.helper_funcs.filters import CustomFilters
+from kaga.modules.helper_funcs.http_client import get, post
 from kaga.modules.no_sql.afk_db import is_afk
+from kaga.modules.sql import pool_status
 
 
 @typing_action
@@ -164,16 +164,11 @@ def info(update, context):
                 elif status in {"administrator", "creator"}:
                     text += _stext.format("Admin")
 
-    try:
-        sw = spamwtc.get_ban(int(user.id))
-        if sw:
-            text += "\n\n<b>Orang ini dilarang di Spamwatch!</b>"
-            text += f"\n<b>Alasan:</b> <pre>{sw.reason}</pre>"
-            text += "\nAda yang salah coba tanyakan di @SpamWatchSupport"
-        else:
-            pass
-    except BaseException:
-        pass  # don't crash if api is down somehow...
+    sw = get_spamwatch_ban(user.id)
+    if sw:
+        text += "\n\n<b>Orang ini dilarang di Spamwatch!</b>"
+        text += f"\n<b>Alasan:</b> <pre>{sw.reason}</pre>"
+        text += "\nAda yang salah coba tanyakan di @SpamWatchSupport"
 
     cas_banned = check_cas(user.id)
     if cas_banned:
@@ -323,7 +318,9 @@ def ud(update, context):
         return
     try:
         results = get(
-            f"http://api.urbandictionary.com/v0/define?term={text}"
+            "http://api.urbandictionary.com/v0/define",
+            params={"term": text},
+            cache_ttl=60 * 60,
         ).json()
         reply_text = (
             f'Kata: {text}\nDefinisi: {results["list"][0]["definition"]}'
@@ -365,8 +362,9 @@ def wall(update, context):
     else:
         caption = query
         term = query.replace(" ", "%20")
-        json_rep = r.get(
-            f"https://wall.alphacoders.com/api2.0/get.php?auth={WALL_API}&method=search&term={term}"
+        json_rep = get(
+            f"https://wall.alphacoders.com/api2.0/get.php?auth={WALL_API}&method=search&term={term}",
+            cache_ttl=30 * 60,
         ).json()
         if not json_rep.get("success"):
             msg.reply_text("Terjadi kesalahan!")
@@ -443,8 +441,13 @@ def staff_ids(update, context):
 
 
 def stats(update, context):
+    pool = pool_status()
     update.effective_message.reply_text(
-        "Statistik saat ini:\n" + "\n".join([mod.__stats__() for mod in STATS])
+        "Statistik saat ini:\n"
+        + "\n".join([mod.__stats__() for mod in STATS])
+        + "\n× Koneksi database: {checked_out}/{size} dipakai, {overflow} tambahan, "
+        "{checkouts} diambil, {timeouts} timeout, tunggu rata-rata {avg_wait:.3f}s "
+        "(maks {max_wait:.3f}s).".format(**pool)
     )
 
 
@@ -1,5 +1,9 @@
 """Chat blacklist database."""
 
+import re
+import threading
+
+from pymongo import UpdateOne
 
 from kaga.modules.no_sql import get_collection
 
@@ -11,6 +15,11 @@ BL_SETTING = get_collection("BLACKLIST_SETTINGS")
 CHAT_BLACKLISTS = {}
 CHAT_SETTINGS_BLACKLISTS = {}
 
+# chat_id -> (word triggers, compiled pattern for the rest), built lazily
+CHAT_BLACKLIST_INDEX = {}
+BLACKLIST_INDEX_LOCK = threading.RLock()
+WORD_REGEX = re.compile(r"\w+")
+
 
 def add_to_blacklist(chat_id, trigger):
     BL.find_one_and_update(
@@ -18,10 +27,39 @@ def add_to_blacklist(chat_id, trigger):
         {"$set": {'chat_id': chat_id, 'trigger': trigger}},
         upsert=True)
     global CHAT_BLACKLISTS
-    if CHAT_BLACKLISTS.get(str(chat_id), set()) == set():
-        CHAT_BLACKLISTS[str(chat_id)] = {trigger}
-    else:
-        CHAT_BLACKLISTS.get(str(chat_id), set()).add(trigger)
+    with BLACKLIST_INDEX_LOCK:
+        if CHAT_BLACKLISTS.get(str(chat_id), set()) == set():
+            CHAT_BLACKLISTS[str(chat_id)] = {trigger}
+        else:
+            CHAT_BLACKLISTS.get(str(chat_id), set()).add(trigger)
+
+        index = CHAT_BLACKLIST_INDEX.get(str(chat_id))
+        if index is not None and WORD_REGEX.fullmatch(trigger):
+            index[0].setdefault(trigger.lower(), trigger)
+        else:
+            CHAT_BLACKLIST_INDEX.pop(str(chat_id), None)
+
+
+def add_many_to_blacklist(chat_id, triggers) -> int:
+    """Add every trigger with one write, for imports."""
+    triggers = set(triggers)
+    if not triggers:
+        return 0
+    BL.bulk_write(
+        [
+            UpdateOne(
+                {'chat_id': chat_id, 'trigger': trigger},
+                {"$set": {'chat_id': chat_id, 'trigger': trigger}},
+                upsert=True,
+            )
+            for trigger in triggers
+        ],
+        ordered=False,
+    )
+    with BLACKLIST_INDEX_LOCK:
+        CHAT_BLACKLISTS.setdefault(str(chat_id), set()).update(triggers)
+        CHAT_BLACKLIST_INDEX.pop(str(chat_id), None)
+    return len(triggers)
 
 
 def rm_from_blacklist(chat_id, trigger) -> bool:
@@ -29,8 +67,11 @@ def rm_from_blacklist(chat_id, trigger) -> bool:
         {'chat_id': chat_id, 'trigger': trigger}
         )
     if data:
-        if trigger in CHAT_BLACKLISTS.get(str(chat_id), set()):
-            CHAT_BLACKLISTS.get(str(chat_id), set()).remove(trigger)
+        with BLACKLIST_INDEX_LOCK:
+            if trigger in CHAT_BLACKLISTS.get(str(chat_id), set()):
+                CHAT_BLACKLISTS.get(str(chat_id), set()).remove(trigger)
+            # other triggers may share the lowercased word, so rebuild
+            CHAT_BLACKLIST_INDEX.pop(str(chat_id), None)
         return True
     return False
 
@@ -39,6 +80,55 @@ def get_chat_blacklist(chat_id) -> set:
     return CHAT_BLACKLISTS.get(str(chat_id), set())
 
 
+def __build_blacklist_index(triggers):
+    """Split triggers into plain words, looked up by hash, and everything
+    else, combined into a single pattern."""
+    words = {}
+    others = []
+    for trigger in triggers:
+        if WORD_REGEX.fullmatch(trigger):
+            words.setdefault(trigger.lower(), trigger)
+        else:
+            others.append(trigger)
+
+    pattern = None
+    if others:
+        others.sort(key=lambda x: (-len(x), x))
+        pattern = re.compile(
+            r"(?<!\w)(?:"
+            + "|".join("({})".format(re.escape(x)) for x in others)
+            + r")(?!\w)",
+            flags=re.IGNORECASE,
+        )
+    return words, others, pattern
+
+
+def get_blacklist_match(chat_id, text):
+    """Return a blacklisted trigger of the chat found in text, or None."""
+    index = CHAT_BLACKLIST_INDEX.get(str(chat_id))
+    if index is None:
+        with BLACKLIST_INDEX_LOCK:
+            triggers = CHAT_BLACKLISTS.get(str(chat_id))
+            if not triggers:
+                return None
+            index = __build_blacklist_index(triggers)
+            CHAT_BLACKLIST_INDEX[str(chat_id)] = index
+
+    words, others, pattern = index
+    if words:
+        for word in WORD_REGEX.findall(text):
+            trigger = words.get(word.lower())
+            if trigger is not None:
+                return trigger
+
+    if pattern is not None:
+        match = pattern.search(text)
+        if match:
+            return others[match.lastindex - 1]
+
+    return None
+
+
 def num_blacklist_filters() -> int:
     return BL.count_documents({})
 
@@ -109,6 +199,7 @@ def migrate_chat(old_chat_id, new_chat_id):
         {'chat_id': old_chat_id},
         {"$set": {'chat_id':new_chat_id}}
         )
+    CHAT_BLACKLIST_INDEX.clear()
     __load_chat_blacklists()
     __load_chat_settings_blacklists()
 
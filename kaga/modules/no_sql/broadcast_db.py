@@ -0,0 +1,18 @@
+"""Broadcast jobs database, keeps the progress of running broadcasts."""
+
+from kaga.modules.no_sql import get_collection
+
+
+BROADCASTS = get_collection("BROADCASTS")
+
+
+def new_broadcast(job: dict):
+    return BROADCASTS.insert_one(job).inserted_id
+
+
+def update_broadcast(job_id, **fields) -> None:
+    BROADCASTS.update_one({'_id': job_id}, {"$set": fields})
+
+
+def get_running_broadcasts() -> list:
+    return [job for job in BROADCASTS.find({'status': "running"})]
@@ -1,45 +1,52 @@
 """Group disabled commands database."""
 
+import threading
+
 from kaga.modules.no_sql import get_collection
 
 DISABLED_COMMANDS = get_collection("DISABLED_COMMANDS")
 
+# chat_id -> frozenset of disabled commands. Writers swap in a new set
+# under the lock, readers never wait.
 DISABLED = {}
+DISABLED_LOCK = threading.Lock()
+NOTHING_DISABLED = frozenset()
 
 
 def disable_command(chat_id, disable) -> bool:
-    data = DISABLED_COMMANDS.find_one(
-        {'chat_id': chat_id, 'command': disable})
-    if not data:
-        DISABLED.setdefault(str(chat_id), set()).add(disable)
+    with DISABLED_LOCK:
+        if disable in DISABLED.get(str(chat_id), NOTHING_DISABLED):
+            return False
 
         DISABLED_COMMANDS.insert_one(
             {'chat_id': chat_id, 'command': disable})
+        DISABLED[str(chat_id)] = DISABLED.get(
+            str(chat_id), NOTHING_DISABLED) | {disable}
         return True
-    return False
 
 
 def enable_command(chat_id, enable) -> bool:
-    data = DISABLED_COMMANDS.find_one(
-        {'chat_id': chat_id, 'command':  enable}
-    )
-    if data:
-        if enable in DISABLED.get(str(chat_id)):  # sanity check
-            DISABLED.setdefault(str(chat_id), set()).remove(enable)
-
-        DISABLED_COMMANDS.delete_one(
+    with DISABLED_LOCK:
+        if enable not in DISABLED.get(str(chat_id), NOTHING_DISABLED):
+            return False
+
+        DISABLED_COMMANDS.delete_many(
             {'chat_id': chat_id, 'command': enable}
         )
+        remaining = DISABLED[str(chat_id)] - {enable}
+        if remaining:
+            DISABLED[str(chat_id)] = remaining
+        else:
+            DISABLED.pop(str(chat_id), None)
         return True
-    return False
 
 
 def is_command_disabled(chat_id, cmd) -> bool:
-    return cmd in DISABLED.get(str(chat_id), set())
+    return cmd in DISABLED.get(str(chat_id), NOTHING_DISABLED)
 
 
-def get_all_disabled(chat_id) -> dict:
-    return DISABLED.get(str(chat_id), set())
+def get_all_disabled(chat_id) -> frozenset:
+    return DISABLED.get(str(chat_id), NOTHING_DISABLED)
 
 
 def num_chats() -> int:
@@ -52,19 +59,25 @@ def num_disabled() -> int:
 
 
 def migrate_chat(old_chat_id, new_chat_id) -> None:
-    DISABLED_COMMANDS.update_many(
-        {'chat_id': old_chat_id}, {"$set": {'chat_id': new_chat_id}}
-    )
+    with DISABLED_LOCK:
+        DISABLED_COMMANDS.update_many(
+            {'chat_id': old_chat_id}, {"$set": {'chat_id': new_chat_id}}
+        )
 
-    if str(old_chat_id) in DISABLED:
-        DISABLED[str(old_chat_id)] = DISABLED.get(str(old_chat_id), set())
+        disabled = DISABLED.pop(str(old_chat_id), None)
+        if disabled:
+            DISABLED[str(new_chat_id)] = disabled | DISABLED.get(
+                str(new_chat_id), NOTHING_DISABLED)
 
 
 def __load_disabled_commands() -> None:
     global DISABLED
-    all_chats = DISABLED_COMMANDS.find()
-    for chat in all_chats:
-        DISABLED.setdefault(chat["chat_id"], set()).add(chat["command"])
+    disabled = {}
+    for chat in DISABLED_COMMANDS.find():
+        disabled.setdefault(str(chat["chat_id"]), set()).add(chat["command"])
+    DISABLED = {
+        chat_id: frozenset(commands) for chat_id, commands in disabled.items()
+    }
 
 
 __load_disabled_commands()
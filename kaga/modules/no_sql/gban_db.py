@@ -35,6 +35,15 @@ def ungban_user(user_id) -> None:
     __load_gbanned_userid_list()
 
 
+def ungban_users(user_ids) -> int:
+    user_ids = list(user_ids)
+    if not user_ids:
+        return 0
+    res = GBAN_USER.delete_many({'_id': {'$in': user_ids}})
+    GBANNED_LIST.difference_update(user_ids)
+    return res.deleted_count
+
+
 def is_user_gbanned(user_id):
     return user_id in GBANNED_LIST
 
@@ -47,6 +56,12 @@ def get_gban_list() -> dict:
     return [i for i in GBAN_USER.find()]
 
 
+def get_gbans_page(after=None, limit=100) -> list:
+    """Gbans ordered by user id, starting after the id of the previous page."""
+    query = {'_id': {'$gt': after}} if after is not None else {}
+    return [i for i in GBAN_USER.find(query).sort('_id', 1).limit(limit)]
+
+
 def enable_gbans(chat_id) -> None:
     __gban_setting(chat_id, True)
     if str(chat_id) in GBANSTAT_LIST:
@@ -0,0 +1,34 @@
+"""Database sweeps, keeps the position and findings of a running sweep."""
+
+import time
+
+from kaga.modules.no_sql import get_collection
+
+
+SWEEPS = get_collection("SWEEPS")
+
+
+def get_sweep(name) -> dict:
+    return SWEEPS.find_one({'_id': name})
+
+
+def save_sweep_page(name, checkpoint, scanned, found) -> None:
+    SWEEPS.update_one(
+        {'_id': name},
+        {
+            "$set": {'checkpoint': checkpoint, 'finished': False},
+            "$inc": {'scanned': scanned},
+            "$push": {'found': {"$each": list(found)}},
+        },
+        upsert=True)
+
+
+def finish_sweep(name) -> None:
+    SWEEPS.update_one(
+        {'_id': name},
+        {"$set": {'finished': True, 'finished_at': time.time()}},
+        upsert=True)
+
+
+def clear_sweep(name) -> None:
+    SWEEPS.delete_one({'_id': name})
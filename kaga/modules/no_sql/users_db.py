@@ -1,6 +1,13 @@
 """User database utils."""
 
-from kaga import dispatcher
+import atexit
+import threading
+
+from cachetools import LRUCache
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from kaga import dispatcher, LOGGER
 from kaga.modules.no_sql import get_collection
 
 
@@ -8,6 +15,20 @@ USERS_DB = get_collection("USERS")
 CHATS_DB = get_collection("CHATS")
 CHAT_MEMBERS_DB = get_collection("CHAT_MEMBERS")
 
+# update_user only buffers, the buffer is written out in bulk by flush_users
+FLUSH_INTERVAL = 5  # seconds
+FLUSH_THRESHOLD = 1000  # pending entries
+
+BUFFER_LOCK = threading.Lock()
+PENDING_USERS = {}
+PENDING_CHATS = {}
+PENDING_MEMBERS = set()
+
+# What was last written, so repeated messages don't cause writes
+KNOWN_USERS = LRUCache(maxsize=100000)
+KNOWN_CHATS = LRUCache(maxsize=50000)
+KNOWN_MEMBERS = LRUCache(maxsize=200000)
+
 
 def ensure_bot_in_db():
     USERS_DB.update_one(
@@ -18,22 +39,91 @@ def ensure_bot_in_db():
 
 
 def update_user(user_id, username, chat_id=None, chat_name=None):
-    USERS_DB.update_one(
-        {'_id': user_id},
-        {"$set": {'username': username}},
-        upsert=True)
-    
-    if not (chat_id or chat_name):
-        return
-    
-    CHATS_DB.update_one(
-        {'chat_id': chat_id},
-        {"$set": {'chat_name': chat_name}},
-        upsert=True)
-
-    member = CHAT_MEMBERS_DB.find_one({'chat_id': chat_id, 'user_id': user_id})
-    if member is None:
-        CHAT_MEMBERS_DB.insert_one({'chat_id': chat_id, 'user_id': user_id})
+    with BUFFER_LOCK:
+        if KNOWN_USERS.get(user_id, ()) != username:
+            PENDING_USERS[user_id] = username
+
+        if chat_id or chat_name:
+            if KNOWN_CHATS.get(chat_id, ()) != chat_name:
+                PENDING_CHATS[chat_id] = chat_name
+            if (chat_id, user_id) not in KNOWN_MEMBERS:
+                PENDING_MEMBERS.add((chat_id, user_id))
+
+        pending = len(PENDING_USERS) + len(PENDING_CHATS) + len(PENDING_MEMBERS)
+
+    if pending >= FLUSH_THRESHOLD:
+        flush_users()
+
+
+def __bulk_write(collection, requests) -> bool:
+    try:
+        collection.bulk_write(requests, ordered=False)
+        return True
+    except PyMongoError:
+        LOGGER.exception("Failed to flush buffered %s", collection.name)
+        return False
+
+
+def flush_users():
+    """Write all buffered users, chats and memberships to the database.
+
+    Whatever fails to be written goes back into the buffer for the next flush.
+    """
+    global PENDING_USERS, PENDING_CHATS, PENDING_MEMBERS
+    with BUFFER_LOCK:
+        users, chats, members = PENDING_USERS, PENDING_CHATS, PENDING_MEMBERS
+        PENDING_USERS, PENDING_CHATS, PENDING_MEMBERS = {}, {}, set()
+
+    if users:
+        written = __bulk_write(
+            USERS_DB,
+            [
+                UpdateOne(
+                    {'_id': user_id},
+                    {"$set": {'username': username}},
+                    upsert=True)
+                for user_id, username in users.items()
+            ])
+        with BUFFER_LOCK:
+            if written:
+                KNOWN_USERS.update(users)
+            else:
+                # Anything buffered since is newer and takes precedence
+                for user_id, username in users.items():
+                    PENDING_USERS.setdefault(user_id, username)
+
+    if chats:
+        written = __bulk_write(
+            CHATS_DB,
+            [
+                UpdateOne(
+                    {'chat_id': chat_id},
+                    {"$set": {'chat_name': chat_name}},
+                    upsert=True)
+                for chat_id, chat_name in chats.items()
+            ])
+        with BUFFER_LOCK:
+            if written:
+                KNOWN_CHATS.update(chats)
+            else:
+                for chat_id, chat_name in chats.items():
+                    PENDING_CHATS.setdefault(chat_id, chat_name)
+
+    if members:
+        written = __bulk_write(
+            CHAT_MEMBERS_DB,
+            [
+                UpdateOne(
+                    {'chat_id': chat_id, 'user_id': user_id},
+                    {"$set": {'chat_id': chat_id, 'user_id': user_id}},
+                    upsert=True)
+                for chat_id, user_id in members
+            ])
+        with BUFFER_LOCK:
+            if written:
+                KNOWN_MEMBERS.update(dict.fromkeys(members, True))
+            else:
+                PENDING_MEMBERS.update(members)
 
 
 def get_userid_by_name(username) -> dict:
@@ -56,6 +146,18 @@ def get_all_users() -> list:
     return [user for user in USERS_DB.find()]
 
 
+def get_chats_page(after=None, limit=100) -> list:
+    """Chats ordered by `_id`, starting after the `_id` of the previous page."""
+    query = {'_id': {'$gt': after}} if after is not None else {}
+    return [chat for chat in CHATS_DB.find(query).sort('_id', 1).limit(limit)]
+
+
+def get_users_page(after=None, limit=100) -> list:
+    """Users ordered by id, starting after the id of the previous page."""
+    query = {'_id': {'$gt': after}} if after is not None else {}
+    return [user for user in USERS_DB.find(query).sort('_id', 1).limit(limit)]
+
+
 def get_user_num_chats(user_id) -> int:
     return CHAT_MEMBERS_DB.count_documents(
         {'user_id': user_id})
@@ -71,9 +173,26 @@ def num_users() -> int:
 
 def rem_chat(chat_id) -> None:
     CHATS_DB.delete_one({'chat_id': chat_id})
+    with BUFFER_LOCK:
+        # Written again the next time the chat is seen, not by a stale flush
+        KNOWN_CHATS.pop(chat_id, None)
+        PENDING_CHATS.pop(chat_id, None)
+
+
+def rem_chats(chat_ids) -> int:
+    chat_ids = list(chat_ids)
+    if not chat_ids:
+        return 0
+    res = CHATS_DB.delete_many({'chat_id': {'$in': chat_ids}})
+    with BUFFER_LOCK:
+        for chat_id in chat_ids:
+            KNOWN_CHATS.pop(chat_id, None)
+            PENDING_CHATS.pop(chat_id, None)
+    return res.deleted_count
 
 
 def migrate_chat(old_chat_id, new_chat_id) -> None:
+    flush_users()
     CHATS_DB.update_one({'chat_id': old_chat_id}, {"$set": {'chat_id': new_chat_id}})
 
     chat_members = (
@@ -84,3 +203,4 @@ def migrate_chat(old_chat_id, new_chat_id) -> None:
 
 
 ensure_bot_in_db()
+atexit.register(flush_users)
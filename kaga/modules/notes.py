@@ -27,12 +27,8 @@ from kaga.modules.helper_funcs.chat_status import (
     user_admin,
     user_admin_no_reply,
 )
-from kaga.modules.helper_funcs.misc import build_keyboard, revert_buttons
+from kaga.modules.helper_funcs.misc import revert_buttons
 from kaga.modules.helper_funcs.msg_types import get_note_type
-from kaga.modules.helper_funcs.string_handling import (
-    escape_invalid_curly_brackets,
-    markdown_to_html,
-)
 
 FILE_MATCHER = re.compile(r"^###file_id(!photo)?###:(.*?)(?:\s|$)")
 STICKER_MATCHER = re.compile(r"^###sticker(!photo)?###:")
@@ -116,20 +112,11 @@ def get(bot, update, notename, show_none=True, no_format=False):
                     else:
                         raise
         else:
-            VALID_NOTE_FORMATTERS = [
-                "first",
-                "last",
-                "fullname",
-                "username",
-                "id",
-                "chatname",
-                "mention",
-            ]
-            valid_format = escape_invalid_curly_brackets(
-                note.value, VALID_NOTE_FORMATTERS
-            )
-            if valid_format:
-                text = valid_format.format(
+            # The note comes parsed from the cache, only the sender's
+            # details are filled in here
+            template = note.text if no_format else note.html
+            if template:
+                text = template.format(
                     first=escape(message.from_user.first_name),
                     last=escape(
                         message.from_user.last_name
@@ -159,17 +146,13 @@ def get(bot, update, notename, show_none=True, no_format=False):
             else:
                 text = ""
 
-            keyb = []
-            parseMode = ParseMode.HTML
-            buttons = sql.get_buttons(chat_id, notename)
             if no_format:
                 parseMode = None
-                text += revert_buttons(buttons)
+                text += revert_buttons(note.buttons)
+                keyboard = InlineKeyboardMarkup([])
             else:
-                text = markdown_to_html(text)
-                keyb = build_keyboard(buttons)
-
-            keyboard = InlineKeyboardMarkup(keyb)
+                parseMode = ParseMode.HTML
+                keyboard = note.keyboard
 
             try:
                 if note.msgtype in (sql.Types.BUTTON_TEXT, sql.Types.TEXT):
@@ -452,6 +435,7 @@ def rmbutton(update, context):
 
 def __import_data__(chat_id, data):
     failures = []
+    imported = []
     for notename, notedata in data.get("extra", {}).items():
         match = FILE_MATCHER.match(notedata)
         matchsticker = STICKER_MATCHER.match(notedata)
@@ -467,18 +451,14 @@ def __import_data__(chat_id, data):
             failures.append(notename)
             notedata = notedata[match.end() :].strip()
             if notedata:
-                sql.add_note_to_db(
-                    chat_id, notename[1:], notedata, sql.Types.TEXT
+                imported.append(
+                    (notename[1:], notedata, sql.Types.TEXT, None, None)
                 )
         elif matchsticker:
             content = notedata[matchsticker.end() :].strip()
             if content:
-                sql.add_note_to_db(
-                    chat_id,
-                    notename[1:],
-                    notedata,
-                    sql.Types.STICKER,
-                    file=content,
+                imported.append(
+                    (notename[1:], notedata, sql.Types.STICKER, None, content)
                 )
         elif matchbtn:
             parse = notedata[matchbtn.end() :].strip()
@@ -486,12 +466,8 @@ def __import_data__(chat_id, data):
             buttons = parse.split("<###button###>")[1]
             buttons = ast.literal_eval(buttons)
             if buttons:
-                sql.add_note_to_db(
-                    chat_id,
-                    notename[1:],
-                    notedata,
-                    sql.Types.BUTTON_TEXT,
-                    buttons=buttons,
+                imported.append(
+                    (notename[1:], notedata, sql.Types.BUTTON_TEXT, buttons, None)
                 )
         elif matchfile:
             file = notedata[matchfile.end() :].strip()
@@ -499,12 +475,8 @@ def __import_data__(chat_id, data):
             notedata = file[1]
             content = file[0]
             if content:
-                sql.add_note_to_db(
-                    chat_id,
-                    notename[1:],
-                    notedata,
-                    sql.Types.DOCUMENT,
-                    file=content,
+                imported.append(
+                    (notename[1:], notedata, sql.Types.DOCUMENT, None, content)
                 )
         elif matchphoto:
             photo = notedata[matchphoto.end() :].strip()
@@ -512,12 +484,8 @@ def __import_data__(chat_id, data):
             notedata = photo[1]
             content = photo[0]
             if content:
-                sql.add_note_to_db(
-                    chat_id,
-                    notename[1:],
-                    notedata,
-                    sql.Types.PHOTO,
-                    file=content,
+                imported.append(
+                    (notename[1:], notedata, sql.Types.PHOTO, None, content)
                 )
         elif matchaudio:
             audio = notedata[matchaudio.end() :].strip()
@@ -525,12 +493,8 @@ def __import_data__(chat_id, data):
             notedata = audio[1]
             content = audio[0]
             if content:
-                sql.add_note_to_db(
-                    chat_id,
-                    notename[1:],
-                    notedata,
-                    sql.Types.AUDIO,
-                    file=content,
+                imported.append(
+                    (notename[1:], notedata, sql.Types.AUDIO, None, content)
                 )
         elif matchvoice:
             voice = notedata[matchvoice.end() :].strip()
@@ -538,12 +502,8 @@ def __import_data__(chat_id, data):
             notedata = voice[1]
             content = voice[0]
             if content:
-                sql.add_note_to_db(
-                    chat_id,
-                    notename[1:],
-                    notedata,
-                    sql.Types.VOICE,
-                    file=content,
+                imported.append(
+                    (notename[1:], notedata, sql.Types.VOICE, None, content)
                 )
         elif matchvideo:
             video = notedata[matchvideo.end() :].strip()
@@ -551,12 +511,8 @@ def __import_data__(chat_id, data):
             notedata = video[1]
             content = video[0]
             if content:
-                sql.add_note_to_db(
-                    chat_id,
-                    notename[1:],
-                    notedata,
-                    sql.Types.VIDEO,
-                    file=content,
+                imported.append(
+                    (notename[1:], notedata, sql.Types.VIDEO, None, content)
                 )
         elif matchvn:
             video_note = notedata[matchvn.end() :].strip()
@@ -564,15 +520,15 @@ def __import_data__(chat_id, data):
             notedata = video_note[1]
             content = video_note[0]
             if content:
-                sql.add_note_to_db(
-                    chat_id,
-                    notename[1:],
-                    notedata,
-                    sql.Types.VIDEO_NOTE,
-                    file=content,
+                imported.append(
+                    (notename[1:], notedata, sql.Types.VIDEO_NOTE, None, content)
                 )
         else:
-            sql.add_note_to_db(chat_id, notename[1:], notedata, sql.Types.TEXT)
+            imported.append(
+                (notename[1:], notedata, sql.Types.TEXT, None, None)
+            )
+
+    count = sql.add_notes_to_db(chat_id, imported)
 
     if failures:
         with BytesIO(str.encode("\n".join(failures))) as output:
@@ -586,6 +542,8 @@ def __import_data__(chat_id, data):
                 "dihindari. Maaf untuk ketidaknyamanannya!",
             )
 
+    return count
+
 
 def __stats__():
     return "× {} catatan, di {} obrolan.".format(
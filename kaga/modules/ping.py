@@ -1,12 +1,12 @@
 import time
 from typing import List
 
-import requests
 from telegram import Bot, Update, ParseMode
 from telegram.ext import run_async
 
 from kaga import dispatcher, StartTime
 from kaga.modules.disable import DisableAbleCommandHandler
+from kaga.modules.helper_funcs import http_client
 from kaga.modules.helper_funcs.alternate import typing_action
 
 sites_list = {
@@ -52,7 +52,7 @@ def ping_func(to_ping: List[str]) -> List[str]:
 
         start_time = time.time()
         site_to_ping = sites_list[each_ping]
-        r = requests.get(site_to_ping)
+        r = http_client.get(site_to_ping)
         end_time = time.time()
         ping_time = str(round((end_time - start_time), 2)) + "s"
 
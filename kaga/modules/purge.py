@@ -1,4 +1,4 @@
-import html, time
+import html
 from typing import Optional, List
 
 from telegram import Message, Chat, Update, Bot, User
@@ -8,13 +8,54 @@ from telegram.utils.helpers import mention_html
 
 from kaga import dispatcher, LOGGER
 from kaga.modules.disable import DisableAbleCommandHandler
+from kaga.modules.helper_funcs.alternate import delete_after
 from kaga.modules.helper_funcs.chat_status import user_admin, can_delete
 from kaga.modules.helper_funcs.admin_rights import user_can_delete
-from kaga.modules.log_channel import loggable
+from kaga.modules.helper_funcs.fanout import (
+    INTERACTIVE_EXECUTOR,
+    AbortFanOut,
+    TokenBucket,
+    fan_out,
+)
+from kaga.modules.log_channel import loggable, log_result
+
+# Deleting doesn't count towards the sending limits, but Telegram still
+# answers a fast enough purge with flood waits
+PURGE_RATE = 30
+PURGE_BUCKET = TokenBucket(PURGE_RATE)
+
+
+def purge_messages(bot, chat_id, message_ids, on_done):
+    """Delete message_ids, newest first, in a background fan out.
+
+    Stops at the first message Telegram refuses to delete, the ones before
+    it are older and would fail the same way; the job is then cancelled.
+    on_done(job) gets the job, with the number deleted in job.affected.
+    """
+
+    def delete(message_id):
+        try:
+            bot.delete_message(chat_id, message_id)
+            return True
+        except BadRequest as err:
+            if err.message == "Message can't be deleted":
+                raise AbortFanOut(err.message)
+            if err.message != "Message to delete not found":
+                LOGGER.exception("Kesalahan saat membersihkan pesan obrolan.")
+            return False
+
+    return fan_out(
+        "purge {}".format(chat_id),
+        message_ids,
+        delete,
+        on_done,
+        executor=INTERACTIVE_EXECUTOR,
+        bucket=PURGE_BUCKET,
+        throttle=None,
+    )
 
 
 @user_admin
-@loggable
 def purge(update, context):
     args = context.args
     msg = update.effective_message  # type: Optional[Message]
@@ -23,7 +64,7 @@ def purge(update, context):
         chat = update.effective_chat  # type: Optional[Chat]
         if user_can_delete(chat, user, context.bot.id) == False:
            msg.reply_text("Anda tidak memiliki cukup hak untuk menghapus pesan!")
-           return ""
+           return
         if can_delete(chat, context.bot.id):
             message_id = msg.reply_to_message.message_id
             delete_to = msg.message_id - 1
@@ -33,48 +74,36 @@ def purge(update, context):
                 if new_del < delete_to:
                     delete_to = new_del
 
-            for m_id in range(delete_to, message_id - 1, -1):  # Reverse iteration over message ids
-                try:
-                    context.bot.deleteMessage(chat.id, m_id)
-                except BadRequest as err:
-                    if err.message == "Message can't be deleted":
-                        context.bot.send_message(chat.id, "Tidak dapat menghapus semua pesan. Pesannya mungkin terlalu lama, saya mungkin "
-                                                  "tidak memiliki hak hapus, atau ini mungkin bukan grup super.")
-
-                    elif err.message != "Message to delete not found":
-                        LOGGER.exception("Kesalahan saat membersihkan pesan obrolan.")
+            def done(job):
+                if job.cancelled:
+                    context.bot.send_message(chat.id, "Tidak dapat menghapus semua pesan. Pesannya mungkin terlalu lama, saya mungkin "
+                                              "tidak memiliki hak hapus, atau ini mungkin bukan grup super.")
+                del_msg = context.bot.send_message(
+                    chat.id, "Pembersihan selesai, {} pesan dihapus.".format(job.affected))
+                delete_after(2, del_msg)
+                LOGGER.info("Purged %d messages in %s in %.1fs",
+                            job.affected, chat.id, job.elapsed)
+
+                log_result(context, chat, msg,
+                           "<b>{}:</b>"
+                           "\n#PURGE"
+                           "\n<b>Admin:</b> {}"
+                           "\nPurged <code>{}</code> messages.".format(html.escape(chat.title),
+                                                                       mention_html(user.id, user.first_name),
+                                                                       job.affected))
 
             try:
                 msg.delete()
             except BadRequest as err:
-                if err.message == "Message can't be deleted":
-                    context.bot.send_message(chat.id, "Tidak dapat menghapus semua pesan. Pesannya mungkin terlalu lama, saya mungkin "
-                                              "tidak memiliki hak hapus, atau ini mungkin bukan grup super.")
-
-                elif err.message != "Message to delete not found":
+                if err.message not in ("Message can't be deleted", "Message to delete not found"):
                     LOGGER.exception("Kesalahan saat membersihkan pesan obrolan.")
 
-            del_msg = context.bot.send_message(chat.id, "Pembersihan selesai.")
-            time.sleep(2)
-
-            try:
-                del_msg.delete()
-
-            except BadRequest:
-                pass
-
-            return "<b>{}:</b>" \
-                   "\n#PURGE" \
-                   "\n<b>Admin:</b> {}" \
-                   "\nPurged <code>{}</code> messages.".format(html.escape(chat.title),
-                                                               mention_html(user.id, user.first_name),
-                                                               delete_to - message_id)
+            message_ids = range(delete_to, message_id - 1, -1)  # Newest first
+            purge_messages(context.bot, chat.id, message_ids, done)
 
     else:
         msg.reply_text("Balas pesan untuk memilih dari mana mulai membersihkan.")
 
-    return ""
-
     
 @user_admin
 @loggable
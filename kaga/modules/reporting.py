@@ -21,6 +21,7 @@ from telegram.utils.helpers import mention_html
 from kaga import LOGGER, dispatcher
 from kaga.modules.helper_funcs.alternate import typing_action
 from kaga.modules.helper_funcs.chat_status import (
+    get_chat_admins,
     user_admin,
     user_not_admin,
 )
@@ -108,10 +109,10 @@ def report(update, context) -> str:
         # type: Optional[User]
         reported_user = message.reply_to_message.from_user
         chat_name = chat.title or chat.first or chat.username
-        admin_list = chat.get_administrators()
+        admins = get_chat_admins(chat.id)
+        admin_list = admins.values()
 
-        isadmeme = chat.get_member(reported_user.id).status
-        if isadmeme == "administrator" or isadmeme == "creator":
+        if reported_user.id in admins:
             return ""  # No point of reporting admins!
 
         if user.id == reported_user.id:
@@ -3,12 +3,12 @@ import re
 import urllib
 from urllib.error import HTTPError, URLError
 
-import requests
 from bs4 import BeautifulSoup
 from telegram import InputMediaPhoto, TelegramError
 
 from kaga import dispatcher
 from kaga.modules.disable import DisableAbleCommandHandler
+from kaga.modules.helper_funcs import http_client
 from kaga.modules.helper_funcs.alternate import typing_action
 
 opener = urllib.request.build_opener()
@@ -94,7 +94,7 @@ def reverse(update, context):
             "encoded_image": (imagename, open(imagename, "rb")),
             "image_content": "",
         }
-        response = requests.post(
+        response = http_client.post(
             searchUrl, files=multipart, allow_redirects=False
         )
         fetchUrl = response.headers["Location"]
@@ -1,17 +1,120 @@
+import threading
+import time
+from contextlib import contextmanager
 
 from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool
 
-from kaga import DB_URI
+from kaga import DB_MAX_OVERFLOW, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_URI
 
 
-def start() -> scoped_session:
-    engine = create_engine(DB_URI, client_encoding="utf8")
+class PoolStats:
+    """How often connections were checked out and how long that waited."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, waited, timed_out=False):
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+
+POOL_STATS = PoolStats()
+
+
+class MeteredQueuePool(QueuePool):
+    def _do_get(self):
+        started = time.monotonic()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            POOL_STATS.record(time.monotonic() - started, timed_out=True)
+            raise
+        POOL_STATS.record(time.monotonic() - started)
+        return conn
+
+
+def start():
+    engine = create_engine(
+        DB_URI,
+        client_encoding="utf8",
+        poolclass=MeteredQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+    )
     BASE.metadata.bind = engine
     BASE.metadata.create_all(engine)
-    return scoped_session(sessionmaker(bind=engine, autoflush=False))
+    return engine, sessionmaker(bind=engine, autoflush=False)
+
+
+@contextmanager
+def session_scope():
+    """A session of its own for one unit of work.
+
+    Committed when the block ends, rolled back if it raises, and its
+    connection goes back to the pool either way.
+    """
+    session = SESSION_FACTORY()
+    try:
+        yield session
+        session.commit()
+    except BaseException:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def upsert(session, model, returning=None, **values):
+    """INSERT the row, or UPDATE the given columns if its key already exists.
+
+    One statement, so concurrent writers to the same row don't need a lock.
+    With `returning` columns, the written row is returned with them.
+    """
+    table = model.__table__
+    keys = [column.name for column in table.primary_key]
+    stmt = insert(table).values(**values)
+    changes = {name: stmt.excluded[name] for name in values if name not in keys}
+    if changes:
+        stmt = stmt.on_conflict_do_update(index_elements=keys, set_=changes)
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=keys)
+    if returning is None:
+        session.execute(stmt)
+        return None
+    return session.execute(stmt.returning(*returning)).first()
+
+
+def pool_status() -> dict:
+    pool = ENGINE.pool
+    with POOL_STATS.lock:
+        attempts = POOL_STATS.checkouts + POOL_STATS.timeouts
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(0, pool.overflow()),
+            "checkouts": POOL_STATS.checkouts,
+            "timeouts": POOL_STATS.timeouts,
+            "avg_wait": POOL_STATS.total_wait / attempts if attempts else 0.0,
+            "max_wait": POOL_STATS.max_wait,
+        }
 
 
 BASE = declarative_base()
-SESSION = start()
+ENGINE, SESSION_FACTORY = start()
+# Kept for the modules still sharing a session per thread
+SESSION = scoped_session(SESSION_FACTORY)
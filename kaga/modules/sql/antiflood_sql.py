@@ -1,13 +1,18 @@
 
 import threading
+import time
+from collections import deque
 
-from sqlalchemy import String, Column, Integer, UnicodeText
+from cachetools import TTLCache
+from sqlalchemy import Boolean, String, Column, Integer, UnicodeText
 
-from kaga.modules.sql import SESSION, BASE
+from kaga.modules.sql import SESSION, BASE, session_scope, upsert
 
 DEF_COUNT = 0
 DEF_LIMIT = 0
-DEF_OBJ = (None, DEF_COUNT, DEF_LIMIT)
+DEF_SPIKE_FACTOR = 10
+# The lowest limit /setflood accepts; spike mode never tightens below it
+MIN_SPIKE_LIMIT = 3
 
 
 class FloodControl(BASE):
@@ -41,53 +46,102 @@ class FloodSettings(BASE):
         )
 
 
+class FloodSpike(BASE):
+    __tablename__ = "antiflood_spike"
+    chat_id = Column(String(14), primary_key=True)
+    status = Column(Boolean, default=False)
+    factor = Column(Integer, default=DEF_SPIKE_FACTOR)
+
+    def __repr__(self):
+        return "<flood spike mode for {}: {}>".format(self.chat_id, self.status)
+
+
 FloodControl.__table__.create(checkfirst=True)
 FloodSettings.__table__.create(checkfirst=True)
+FloodSpike.__table__.create(checkfirst=True)
 
 INSERTION_FLOOD_LOCK = threading.RLock()
 INSERTION_FLOOD_SETTINGS_LOCK = threading.RLock()
 
-CHAT_FLOOD = {}
+# A user floods when sending more than `limit` messages within FLOOD_WINDOW.
+# In chats with spike mode on, while the whole chat goes over `factor` times
+# the limit in that window (a raid), users are already cut off at half their
+# limit, but never below MIN_SPIKE_LIMIT.
+FLOOD_WINDOW = 10  # seconds
+TRACKED_USERS = 200000
+TRACKED_CHATS = 50000
 
+CHAT_FLOOD = {}  # chat_id -> limit
+CHAT_FLOOD_SETTINGS = {}  # chat_id -> (flood_type, value)
+CHAT_SPIKE = {}  # chat_id -> (enabled, factor)
 
-def set_flood(chat_id, amount):
-    with INSERTION_FLOOD_LOCK:
-        flood = SESSION.query(FloodControl).get(str(chat_id))
-        if not flood:
-            flood = FloodControl(str(chat_id))
+FLOOD_TRACK_LOCK = threading.Lock()
+# (chat_id, user_id) -> timestamps of the last limit + 1 messages;
+# entries idle for a whole window expire on their own.
+USER_MESSAGES = TTLCache(maxsize=TRACKED_USERS, ttl=FLOOD_WINDOW)
+# chat_id -> [window start, messages in the previous window, in this window]
+CHAT_RATE = TTLCache(maxsize=TRACKED_CHATS, ttl=FLOOD_WINDOW * 2)
 
-        flood.user_id = None
-        flood.limit = amount
 
-        CHAT_FLOOD[str(chat_id)] = (None, DEF_COUNT, amount)
-
-        SESSION.add(flood)
-        SESSION.commit()
+def set_flood(chat_id, amount):
+    with session_scope() as session:
+        upsert(
+            session,
+            FloodControl,
+            chat_id=str(chat_id),
+            user_id=None,
+            limit=amount,
+        )
+    CHAT_FLOOD[str(chat_id)] = amount
 
 
-def update_flood(chat_id: str, user_id) -> bool:
-    if str(chat_id) in CHAT_FLOOD:
-        curr_user_id, count, limit = CHAT_FLOOD.get(str(chat_id), DEF_OBJ)
+def __chat_rate(chat_id, now) -> float:
+    """Messages in the chat over the last window, estimated from two buckets."""
+    rate = CHAT_RATE.get(chat_id)
+    if rate is None or now - rate[0] >= FLOOD_WINDOW * 2:
+        rate = [now, 0, 0]
+    elif now - rate[0] >= FLOOD_WINDOW:
+        rate = [rate[0] + FLOOD_WINDOW, rate[2], 0]
+    rate[2] += 1
+    CHAT_RATE[chat_id] = rate
+    elapsed = (now - rate[0]) / FLOOD_WINDOW
+    return rate[1] * (1 - elapsed) + rate[2]
 
-        if limit == 0:  # no antiflood
-            return False
 
-        if user_id != curr_user_id or user_id is None:  # other user
-            CHAT_FLOOD[str(chat_id)] = (user_id, DEF_COUNT, limit)
-            return False
+def update_flood(chat_id: str, user_id) -> bool:
+    """Record a message and tell whether its sender is flooding."""
+    chat_id = str(chat_id)
+    limit = CHAT_FLOOD.get(chat_id, DEF_LIMIT)
+    if not limit or user_id is None:  # no antiflood, or an admin
+        return False
 
-        count += 1
-        if count > limit:  # too many msgs, kick
-            CHAT_FLOOD[str(chat_id)] = (None, DEF_COUNT, limit)
+    now = time.monotonic()
+    key = (chat_id, user_id)
+    spike, factor = CHAT_SPIKE.get(chat_id, (False, DEF_SPIKE_FACTOR))
+    with FLOOD_TRACK_LOCK:
+        if (
+            spike
+            and limit > MIN_SPIKE_LIMIT
+            and __chat_rate(chat_id, now) > limit * factor
+        ):
+            limit = max(MIN_SPIKE_LIMIT, limit // 2)
+
+        sent = USER_MESSAGES.get(key)
+        if sent is None or sent.maxlen != limit + 1:
+            sent = deque(sent or (), maxlen=limit + 1)
+        sent.append(now)
+
+        if len(sent) > limit and now - sent[0] <= FLOOD_WINDOW:
+            # too many msgs, start counting again after acting on it
+            USER_MESSAGES.pop(key, None)
             return True
 
-        # default -> update
-        CHAT_FLOOD[str(chat_id)] = (user_id, count, limit)
+        USER_MESSAGES[key] = sent
         return False
 
 
 def get_flood_limit(chat_id):
-    return CHAT_FLOOD.get(str(chat_id), DEF_OBJ)[2]
+    return CHAT_FLOOD.get(str(chat_id), DEF_LIMIT)
 
 
 def set_flood_strength(chat_id, flood_type, value):
@@ -97,51 +151,86 @@ def set_flood_strength(chat_id, flood_type, value):
     # 3 = mute
     # 4 = tban
     # 5 = tmute
-    with INSERTION_FLOOD_SETTINGS_LOCK:
-        curr_setting = SESSION.query(FloodSettings).get(str(chat_id))
-        if not curr_setting:
-            curr_setting = FloodSettings(
-                chat_id, flood_type=int(flood_type), value=value
-            )
-
-        curr_setting.flood_type = int(flood_type)
-        curr_setting.value = str(value)
-
-        SESSION.add(curr_setting)
-        SESSION.commit()
+    with session_scope() as session:
+        upsert(
+            session,
+            FloodSettings,
+            chat_id=str(chat_id),
+            flood_type=int(flood_type),
+            value=str(value),
+        )
+    CHAT_FLOOD_SETTINGS[str(chat_id)] = (int(flood_type), str(value))
 
 
 def get_flood_setting(chat_id):
-    try:
-        setting = SESSION.query(FloodSettings).get(str(chat_id))
-        if setting:
-            return setting.flood_type, setting.value
-        else:
-            return 1, "0"
+    return CHAT_FLOOD_SETTINGS.get(str(chat_id), (1, "0"))
+
+
+def set_flood_spike(chat_id, status, factor=None):
+    values = {"status": status}
+    if factor is not None:
+        values["factor"] = factor
+    with session_scope() as session:
+        spike = upsert(
+            session,
+            FloodSpike,
+            returning=(FloodSpike.status, FloodSpike.factor),
+            chat_id=str(chat_id),
+            **values
+        )
+        with INSERTION_FLOOD_SETTINGS_LOCK:
+            CHAT_SPIKE[str(chat_id)] = (spike.status, spike.factor)
 
-    finally:
-        SESSION.close()
+
+def get_flood_spike(chat_id):
+    """(enabled, factor) of the chat's spike mode."""
+    return CHAT_SPIKE.get(str(chat_id), (False, DEF_SPIKE_FACTOR))
 
 
 def migrate_chat(old_chat_id, new_chat_id):
     with INSERTION_FLOOD_LOCK:
         flood = SESSION.query(FloodControl).get(str(old_chat_id))
         if flood:
-            CHAT_FLOOD[str(new_chat_id)] = CHAT_FLOOD.get(
-                str(old_chat_id), DEF_OBJ
+            CHAT_FLOOD[str(new_chat_id)] = CHAT_FLOOD.pop(
+                str(old_chat_id), DEF_LIMIT
             )
             flood.chat_id = str(new_chat_id)
             SESSION.commit()
 
         SESSION.close()
 
+    with INSERTION_FLOOD_SETTINGS_LOCK:
+        setting = SESSION.query(FloodSettings).get(str(old_chat_id))
+        if setting:
+            CHAT_FLOOD_SETTINGS[str(new_chat_id)] = CHAT_FLOOD_SETTINGS.pop(
+                str(old_chat_id), (1, "0")
+            )
+            setting.chat_id = str(new_chat_id)
+            SESSION.commit()
+
+        spike = SESSION.query(FloodSpike).get(str(old_chat_id))
+        if spike:
+            if str(old_chat_id) in CHAT_SPIKE:
+                CHAT_SPIKE[str(new_chat_id)] = CHAT_SPIKE.pop(str(old_chat_id))
+            spike.chat_id = str(new_chat_id)
+            SESSION.commit()
+
+        SESSION.close()
+
 
 def __load_flood_settings():
-    global CHAT_FLOOD
+    global CHAT_FLOOD, CHAT_FLOOD_SETTINGS, CHAT_SPIKE
     try:
         all_chats = SESSION.query(FloodControl).all()
-        CHAT_FLOOD = {
-            chat.chat_id: (None, DEF_COUNT, chat.limit) for chat in all_chats
+        CHAT_FLOOD = {chat.chat_id: chat.limit for chat in all_chats}
+        all_settings = SESSION.query(FloodSettings).all()
+        CHAT_FLOOD_SETTINGS = {
+            setting.chat_id: (setting.flood_type, setting.value)
+            for setting in all_settings
+        }
+        CHAT_SPIKE = {
+            spike.chat_id: (bool(spike.status), spike.factor)
+            for spike in SESSION.query(FloodSpike).all()
         }
     finally:
         SESSION.close()
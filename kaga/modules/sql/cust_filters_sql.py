@@ -11,6 +11,10 @@ from sqlalchemy import (
 )
 
 from kaga.modules.helper_funcs.msg_types import Types
+from kaga.modules.helper_funcs.string_handling import (
+    compile_keywords,
+    first_keyword_match,
+)
 from kaga.modules.sql import BASE, SESSION
 
 
@@ -130,6 +134,8 @@ Buttons.__table__.create(checkfirst=True)
 CUST_FILT_LOCK = threading.RLock()
 BUTTON_LOCK = threading.RLock()
 CHAT_FILTERS = {}
+# chat_id -> compiled matcher for all of that chat's triggers, built lazily
+CHAT_FILTER_MATCHERS = {}
 
 
 def get_all_filters():
@@ -190,6 +196,7 @@ def add_filter(
                 CHAT_FILTERS.get(str(chat_id), []) + [keyword],
                 key=lambda x: (-len(x), x),
             )
+            CHAT_FILTER_MATCHERS.pop(str(chat_id), None)
 
         SESSION.add(filt)
         SESSION.commit()
@@ -241,6 +248,7 @@ def new_add_filter(chat_id, keyword, reply_text, file_type, file_id, buttons):
                 CHAT_FILTERS.get(str(chat_id), []) + [keyword],
                 key=lambda x: (-len(x), x),
             )
+            CHAT_FILTER_MATCHERS.pop(str(chat_id), None)
 
         SESSION.add(filt)
         SESSION.commit()
@@ -256,6 +264,7 @@ def remove_filter(chat_id, keyword):
         if filt:
             if keyword in CHAT_FILTERS.get(str(chat_id), []):  # Sanity check
                 CHAT_FILTERS.get(str(chat_id), []).remove(keyword)
+                CHAT_FILTER_MATCHERS.pop(str(chat_id), None)
 
             with BUTTON_LOCK:
                 prev_buttons = (
@@ -281,6 +290,21 @@ def get_chat_triggers(chat_id):
     return CHAT_FILTERS.get(str(chat_id), set())
 
 
+def get_chat_trigger_match(chat_id, text):
+    """Return the highest priority trigger of the chat found in text, if any."""
+    chat_id = str(chat_id)
+    matcher = CHAT_FILTER_MATCHERS.get(chat_id)
+    if matcher is None:
+        with CUST_FILT_LOCK:
+            triggers = CHAT_FILTERS.get(chat_id)
+            if not triggers:
+                return None
+            matcher = compile_keywords(triggers)
+            CHAT_FILTER_MATCHERS[chat_id] = matcher
+
+    return first_keyword_match(matcher, text)
+
+
 def get_chat_filters(chat_id):
     try:
         return (
@@ -409,6 +433,8 @@ def migrate_chat(old_chat_id, new_chat_id):
         if old_warn_filt is not None:
             CHAT_FILTERS[str(new_chat_id)] = old_warn_filt
             del CHAT_FILTERS[str(old_chat_id)]
+        CHAT_FILTER_MATCHERS.pop(str(old_chat_id), None)
+        CHAT_FILTER_MATCHERS.pop(str(new_chat_id), None)
 
         with BUTTON_LOCK:
             chat_buttons = (
@@ -2,10 +2,11 @@
 import threading
 
 from sqlalchemy import Column, String, UnicodeText, Integer, Boolean
+from sqlalchemy.dialects.postgresql import insert
 from telegram.error import BadRequest, Unauthorized
 
 from kaga import dispatcher
-from kaga.modules.sql import SESSION, BASE
+from kaga.modules.sql import BASE, SESSION, session_scope
 
 
 class Federations(BASE):
@@ -114,11 +115,15 @@ FEDERATION_CHATS_BYID = {}
 
 FEDERATION_BANNED_FULL = {}
 FEDERATION_BANNED_USERID = {}
+FBAN_UPSERT_CHUNK = 1000
 
 FEDERATION_NOTIFICATION = {}
 FEDS_SUBSCRIBER = {}
 MYFEDS_SUBSCRIBER = {}
 
+# user_id -> {fed_id: "owner" or "admin"}
+FEDERATION_USER_ROLES = {}
+
 
 def get_fed_info(fed_id):
     get = FEDERATION_BYFEDID.get(str(fed_id))
@@ -146,46 +151,60 @@ def get_fed_name(chat_id):
 def get_user_fban(fed_id, user_id):
     if not FEDERATION_BANNED_FULL.get(fed_id):
         return False, False, False
-    user_info = FEDERATION_BANNED_FULL[fed_id].get(user_id)
+    user_info = FEDERATION_BANNED_FULL[fed_id].get(str(user_id))
     if not user_info:
         return None, None, None
     return user_info["first_name"], user_info["reason"], user_info["time"]
 
 
+def __index_fed_users(fed_id, fusers):
+    fusers = eval(fusers)
+    for member in eval(fusers["members"]):
+        FEDERATION_USER_ROLES.setdefault(int(member), {})[fed_id] = "admin"
+    FEDERATION_USER_ROLES.setdefault(int(fusers["owner"]), {})[fed_id] = "owner"
+
+
+def __unindex_fed_users(fed_id, fusers):
+    fusers = eval(fusers)
+    for user_id in eval(fusers["members"]) + [fusers["owner"]]:
+        roles = FEDERATION_USER_ROLES.get(int(user_id))
+        if roles is not None:
+            roles.pop(fed_id, None)
+            if not roles:
+                FEDERATION_USER_ROLES.pop(int(user_id))
+
+
+def __user_feds(user_id, role):
+    roles = FEDERATION_USER_ROLES.get(int(user_id), {})
+    return [
+        f for f, r in roles.items() if r == role and f in FEDERATION_BYFEDID
+    ]
+
+
 def get_user_admin_fed_name(user_id):
-    user_feds = []
-    for f in FEDERATION_BYFEDID:
-        if int(user_id) in eval(
-            eval(FEDERATION_BYFEDID[f]["fusers"])["members"]
-        ):
-            user_feds.append(FEDERATION_BYFEDID[f]["fname"])
-    return user_feds
+    return [
+        FEDERATION_BYFEDID[f]["fname"] for f in __user_feds(user_id, "admin")
+    ]
 
 
 def get_user_owner_fed_name(user_id):
-    user_feds = []
-    for f in FEDERATION_BYFEDID:
-        if int(user_id) == int(eval(FEDERATION_BYFEDID[f]["fusers"])["owner"]):
-            user_feds.append(FEDERATION_BYFEDID[f]["fname"])
-    return user_feds
+    return [
+        FEDERATION_BYFEDID[f]["fname"] for f in __user_feds(user_id, "owner")
+    ]
 
 
 def get_user_admin_fed_full(user_id):
-    user_feds = []
-    for f in FEDERATION_BYFEDID:
-        if int(user_id) in eval(
-            eval(FEDERATION_BYFEDID[f]["fusers"])["members"]
-        ):
-            user_feds.append({"fed_id": f, "fed": FEDERATION_BYFEDID[f]})
-    return user_feds
+    return [
+        {"fed_id": f, "fed": FEDERATION_BYFEDID[f]}
+        for f in __user_feds(user_id, "admin")
+    ]
 
 
 def get_user_owner_fed_full(user_id):
-    user_feds = []
-    for f in FEDERATION_BYFEDID:
-        if int(user_id) == int(eval(FEDERATION_BYFEDID[f]["fusers"])["owner"]):
-            user_feds.append({"fed_id": f, "fed": FEDERATION_BYFEDID[f]})
-    return user_feds
+    return [
+        {"fed_id": f, "fed": FEDERATION_BYFEDID[f]}
+        for f in __user_feds(user_id, "owner")
+    ]
 
 
 def get_user_fbanlist(user_id):
@@ -234,6 +253,9 @@ def new_fed(owner_id, fed_name, fed_id):
             "flog": None,
             "fusers": str({"owner": str(owner_id), "members": "[]"}),
         }
+        __index_fed_users(
+            str(fed_id), str({"owner": str(owner_id), "members": "[]"})
+        )
         return fed
 
 
@@ -248,6 +270,7 @@ def del_fed(fed_id):
         owner_id = getfed["owner"]
         fed_name = getfed["fname"]
         # Delete from cache
+        __unindex_fed_users(fed_id, getfed["fusers"])
         FEDERATION_BYOWNER.pop(owner_id)
         FEDERATION_BYFEDID.pop(fed_id)
         FEDERATION_BYNAME.pop(fed_name)
@@ -341,6 +364,9 @@ def user_demote_fed(fed_id, user_id):
         except ValueError:
             return False
         members.remove(user_id)
+        roles = FEDERATION_USER_ROLES.get(int(user_id), {})
+        if roles.get(str(fed_id)) == "admin":
+            roles.pop(str(fed_id))
         # Set user
         FEDERATION_BYOWNER[str(owner_id)]["fusers"] = str(
             {"owner": str(owner_id), "members": str(members)}
@@ -389,6 +415,9 @@ def user_join_fed(fed_id, user_id):
         # Temp set
         members = eval(eval(getfed["fusers"])["members"])
         members.append(user_id)
+        FEDERATION_USER_ROLES.setdefault(int(user_id), {}).setdefault(
+            str(fed_id), "admin"
+        )
         # Set user
         FEDERATION_BYOWNER[str(owner_id)]["fusers"] = str(
             {"owner": str(owner_id), "members": str(members)}
@@ -495,34 +524,67 @@ def get_frules(fed_id):
         return rules
 
 
-def fban_user(fed_id, user_id, first_name, last_name, user_name, reason, time):
-    with FEDS_LOCK:
-        r = SESSION.query(BansF).all()
-        for I in r:
-            if I.fed_id == fed_id:
-                if int(I.user_id) == int(user_id):
-                    SESSION.delete(I)
-
-        r = BansF(
-            str(fed_id),
-            str(user_id),
-            first_name,
-            last_name,
-            user_name,
-            reason,
-            time,
+def __upsert_fbans(session, bans):
+    # bans: {(fed_id, user_id): row}, written as multi-row upserts keyed on
+    # the (fed_id, user_id) primary key
+    rows = list(bans.values())
+    for i in range(0, len(rows), FBAN_UPSERT_CHUNK):
+        stmt = insert(BansF.__table__).values(rows[i : i + FBAN_UPSERT_CHUNK])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[BansF.fed_id, BansF.user_id],
+            set_={
+                column: stmt.excluded[column]
+                for column in (
+                    "first_name",
+                    "last_name",
+                    "user_name",
+                    "reason",
+                    "time",
+                )
+            },
         )
+        session.execute(stmt)
+
+
+def __cache_fban(row):
+    fed_id, user_id = row["fed_id"], row["user_id"]
+    banned = FEDERATION_BANNED_FULL.setdefault(fed_id, {})
+    if user_id not in banned:
+        FEDERATION_BANNED_USERID.setdefault(fed_id, []).append(int(user_id))
+    banned[user_id] = {
+        "first_name": row["first_name"],
+        "last_name": row["last_name"],
+        "user_name": row["user_name"],
+        "reason": row["reason"],
+        "time": row["time"],
+    }
+
+
+def __fban_row(fed_id, user_id, first_name, last_name, user_name, reason, time):
+    return {
+        "fed_id": str(fed_id),
+        "user_id": str(user_id),
+        "first_name": first_name,
+        "last_name": last_name,
+        "user_name": user_name,
+        "reason": reason,
+        "time": time,
+    }
 
-        SESSION.add(r)
-        try:
-            SESSION.commit()
-        except BaseException:
-            SESSION.rollback()
-            return False
-        finally:
-            SESSION.commit()
-        __load_all_feds_banned()
-        return r
+
+def fban_user(fed_id, user_id, first_name, last_name, user_name, reason, time):
+    row = __fban_row(
+        fed_id, user_id, first_name, last_name, user_name, reason, time
+    )
+    # The upsert needs no lock of its own; FEDS_LOCK only guards the cache
+    try:
+        with session_scope() as session:
+            __upsert_fbans(session, {(row["fed_id"], row["user_id"]): row})
+    except Exception:
+        return False
+    with FEDS_LOCK:
+        __cache_fban(row)
+    return row
 
 
 def multi_fban_user(
@@ -533,84 +595,56 @@ def multi_fban_user(
     multi_user_name,
     multi_reason,
 ):
-    if True:  # with FEDS_LOCK:
-        counter = 0
-        time = 0
-        for x in range(len(multi_fed_id)):
-            fed_id = multi_fed_id[x]
-            user_id = multi_user_id[x]
-            first_name = multi_first_name[x]
-            last_name = multi_last_name[x]
-            user_name = multi_user_name[x]
-            reason = multi_reason[x]
-            r = SESSION.query(BansF).all()
-            for I in r:
-                if I.fed_id == fed_id:
-                    if int(I.user_id) == int(user_id):
-                        SESSION.delete(I)
-
-            r = BansF(
-                str(fed_id),
-                str(user_id),
-                first_name,
-                last_name,
-                user_name,
-                reason,
-                time,
-            )
-
-            SESSION.add(r)
-            counter += 1
-            if str(str(counter)[-2:]) == "00":
-                print(user_id)
-                print(first_name)
-                print(reason)
-                print(counter)
-        try:
-            SESSION.commit()
-        except BaseException:
-            SESSION.rollback()
-            return False
-        finally:
-            SESSION.commit()
-        __load_all_feds_banned()
-        print("Done")
-        return counter
+    bans = {}
+    for x in range(len(multi_fed_id)):
+        row = __fban_row(
+            multi_fed_id[x],
+            multi_user_id[x],
+            multi_first_name[x],
+            multi_last_name[x],
+            multi_user_name[x],
+            multi_reason[x],
+            0,
+        )
+        bans[(row["fed_id"], row["user_id"])] = row
+    try:
+        with session_scope() as session:
+            __upsert_fbans(session, bans)
+    except Exception:
+        return False
+    with FEDS_LOCK:
+        for row in bans.values():
+            __cache_fban(row)
+    return len(multi_fed_id)
 
 
 def un_fban_user(fed_id, user_id):
+    try:
+        with session_scope() as session:
+            deleted = (
+                session.query(BansF)
+                .filter(
+                    BansF.fed_id == str(fed_id),
+                    BansF.user_id == str(user_id),
+                )
+                .delete(synchronize_session=False)
+            )
+    except Exception:
+        return False
     with FEDS_LOCK:
-        r = SESSION.query(BansF).all()
-        for I in r:
-            if I.fed_id == fed_id:
-                if int(I.user_id) == int(user_id):
-                    SESSION.delete(I)
-        try:
-            SESSION.commit()
-        except BaseException:
-            SESSION.rollback()
-            return False
-        finally:
-            SESSION.commit()
-        __load_all_feds_banned()
-        return I
+        banned = FEDERATION_BANNED_FULL.get(str(fed_id), {})
+        if banned.pop(str(user_id), None) is not None:
+            userids = FEDERATION_BANNED_USERID.get(str(fed_id), [])
+            if int(user_id) in userids:
+                userids.remove(int(user_id))
+        return bool(deleted)
 
 
 def get_fban_user(fed_id, user_id):
-    list_fbanned = FEDERATION_BANNED_USERID.get(fed_id)
-    if list_fbanned is None:
-        FEDERATION_BANNED_USERID[fed_id] = []
-    if user_id in FEDERATION_BANNED_USERID[fed_id]:
-        r = SESSION.query(BansF).all()
-        reason = None
-        for I in r:
-            if I.fed_id == fed_id:
-                if int(I.user_id) == int(user_id):
-                    reason = I.reason
-                    time = I.time
-        return True, reason, time
-    else:
+    user_info = FEDERATION_BANNED_FULL.get(fed_id, {}).get(str(user_id))
+    if user_info is None:
         return False, None, None
+    return True, user_info["reason"], user_info["time"]
 
 
 def get_all_fban_users(fed_id):
@@ -819,6 +853,8 @@ def __load_all_feds():
                 "flog": x.fed_log,
                 "fusers": str(x.fed_users),
             }
+            # Feds by user
+            __index_fed_users(str(x.fed_id), str(x.fed_users))
     finally:
         SESSION.close()
 
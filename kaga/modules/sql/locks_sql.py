@@ -2,7 +2,7 @@ import threading
 
 from sqlalchemy import Column, String, Boolean
 
-from kaga.modules.sql import SESSION, BASE
+from kaga.modules.sql import SESSION, BASE, session_scope, upsert
 
 
 class Permissions(BASE):
@@ -78,6 +78,52 @@ Restrictions.__table__.create(checkfirst=True)
 PERM_LOCK = threading.RLock()
 RESTR_LOCK = threading.RLock()
 
+# Every lock type gets one bit in the per-chat cached masks below
+LOCK_BITS = {
+    lock_type: 1 << bit
+    for bit, lock_type in enumerate(
+        (
+            "audio",
+            "voice",
+            "contact",
+            "video",
+            "document",
+            "photo",
+            "sticker",
+            "gif",
+            "url",
+            "bots",
+            "forward",
+            "game",
+            "location",
+            "rtl",
+            "button",
+            "egame",
+            "inline",
+        )
+    )
+}
+RESTR_BITS = {
+    restr_type: 1 << bit
+    for bit, restr_type in enumerate(("messages", "media", "other", "preview"))
+}
+ALL_RESTR = sum(RESTR_BITS.values())
+
+CHAT_LOCKS = {}
+CHAT_RESTRICTIONS = {}
+
+
+def __lock_mask(perm):
+    return sum(
+        bit for lock_type, bit in LOCK_BITS.items() if getattr(perm, lock_type)
+    )
+
+
+def __restr_mask(restr):
+    return sum(
+        bit for restr_type, bit in RESTR_BITS.items() if getattr(restr, restr_type)
+    )
+
 
 def init_permissions(chat_id, reset=False):
     curr_perm = SESSION.query(Permissions).get(str(chat_id))
@@ -87,6 +133,7 @@ def init_permissions(chat_id, reset=False):
     perm = Permissions(str(chat_id))
     SESSION.add(perm)
     SESSION.commit()
+    CHAT_LOCKS[str(chat_id)] = 0
     return perm
 
 
@@ -98,142 +145,68 @@ def init_restrictions(chat_id, reset=False):
     restr = Restrictions(str(chat_id))
     SESSION.add(restr)
     SESSION.commit()
+    CHAT_RESTRICTIONS[str(chat_id)] = 0
     return restr
 
 
 def update_lock(chat_id, lock_type, locked):
-    with PERM_LOCK:
-        curr_perm = SESSION.query(Permissions).get(str(chat_id))
-        if not curr_perm:
-            curr_perm = init_permissions(chat_id)
-
-        if lock_type == "audio":
-            curr_perm.audio = locked
-        elif lock_type == "voice":
-            curr_perm.voice = locked
-        elif lock_type == "contact":
-            curr_perm.contact = locked
-        elif lock_type == "video":
-            curr_perm.video = locked
-        elif lock_type == "document":
-            curr_perm.document = locked
-        elif lock_type == "photo":
-            curr_perm.photo = locked
-        elif lock_type == "sticker":
-            curr_perm.sticker = locked
-        elif lock_type == "gif":
-            curr_perm.gif = locked
-        elif lock_type == "url":
-            curr_perm.url = locked
-        elif lock_type == "bots":
-            curr_perm.bots = locked
-        elif lock_type == "forward":
-            curr_perm.forward = locked
-        elif lock_type == "game":
-            curr_perm.game = locked
-        elif lock_type == "location":
-            curr_perm.location = locked
-        elif lock_type == "rtl":
-            curr_perm.rtl = locked
-        elif lock_type == "button":
-            curr_perm.button = locked
-        elif lock_type == "egame":
-            curr_perm.egame = locked
-        elif lock_type == "inline":
-            curr_perm.inline = locked
-
-        SESSION.add(curr_perm)
-        SESSION.commit()
+    if lock_type not in LOCK_BITS:
+        return
+    with session_scope() as session:
+        perm = upsert(
+            session,
+            Permissions,
+            returning=Permissions.__table__.columns,
+            chat_id=str(chat_id),
+            **{lock_type: locked}
+        )
+        # Still holding the row lock, concurrent updates of the chat's
+        # locks reach the cache in the order they were written
+        with PERM_LOCK:
+            CHAT_LOCKS[str(chat_id)] = __lock_mask(perm)
+
+
+RESTR_COLUMNS = {
+    "messages": ("messages",),
+    "media": ("media",),
+    "other": ("other",),
+    "previews": ("preview",),
+    "all": ("messages", "media", "other", "preview"),
+}
 
 
 def update_restriction(chat_id, restr_type, locked):
-    with RESTR_LOCK:
-        curr_restr = SESSION.query(Restrictions).get(str(chat_id))
-        if not curr_restr:
-            curr_restr = init_restrictions(chat_id)
-
-        if restr_type == "messages":
-            curr_restr.messages = locked
-        elif restr_type == "media":
-            curr_restr.media = locked
-        elif restr_type == "other":
-            curr_restr.other = locked
-        elif restr_type == "previews":
-            curr_restr.preview = locked
-        elif restr_type == "all":
-            curr_restr.messages = locked
-            curr_restr.media = locked
-            curr_restr.other = locked
-            curr_restr.preview = locked
-        SESSION.add(curr_restr)
-        SESSION.commit()
+    columns = RESTR_COLUMNS.get(restr_type)
+    if not columns:
+        return
+    with session_scope() as session:
+        restr = upsert(
+            session,
+            Restrictions,
+            returning=Restrictions.__table__.columns,
+            chat_id=str(chat_id),
+            **dict.fromkeys(columns, locked)
+        )
+        with RESTR_LOCK:
+            CHAT_RESTRICTIONS[str(chat_id)] = __restr_mask(restr)
 
 
-def is_locked(chat_id, lock_type):
-    curr_perm = SESSION.query(Permissions).get(str(chat_id))
-    SESSION.close()
-
-    if not curr_perm:
-        return False
-
-    elif lock_type == "sticker":
-        return curr_perm.sticker
-    elif lock_type == "photo":
-        return curr_perm.photo
-    elif lock_type == "audio":
-        return curr_perm.audio
-    elif lock_type == "voice":
-        return curr_perm.voice
-    elif lock_type == "contact":
-        return curr_perm.contact
-    elif lock_type == "video":
-        return curr_perm.video
-    elif lock_type == "document":
-        return curr_perm.document
-    elif lock_type == "gif":
-        return curr_perm.gif
-    elif lock_type == "url":
-        return curr_perm.url
-    elif lock_type == "bots":
-        return curr_perm.bots
-    elif lock_type == "forward":
-        return curr_perm.forward
-    elif lock_type == "game":
-        return curr_perm.game
-    elif lock_type == "location":
-        return curr_perm.location
-    elif lock_type == "rtl":
-        return curr_perm.rtl
-    elif lock_type == "button":
-        return curr_perm.button
-    elif lock_type == "egame":
-        return curr_perm.egame
-    elif lock_type == "inline":
-        return curr_perm.inline
+def get_lock_mask(chat_id):
+    """Bitmask of the chat's active locks, test it against LOCK_BITS."""
+    return CHAT_LOCKS.get(str(chat_id), 0)
 
 
-def is_restr_locked(chat_id, lock_type):
-    curr_restr = SESSION.query(Restrictions).get(str(chat_id))
-    SESSION.close()
+def is_locked(chat_id, lock_type):
+    return bool(CHAT_LOCKS.get(str(chat_id), 0) & LOCK_BITS.get(lock_type, 0))
 
-    if not curr_restr:
-        return False
 
-    if lock_type == "messages":
-        return curr_restr.messages
-    elif lock_type == "media":
-        return curr_restr.media
-    elif lock_type == "other":
-        return curr_restr.other
+def is_restr_locked(chat_id, lock_type):
+    mask = CHAT_RESTRICTIONS.get(str(chat_id), 0)
+    if lock_type == "all":
+        return mask == ALL_RESTR
     elif lock_type == "previews":
-        return curr_restr.preview
-    elif lock_type == "all":
-        return (
-            curr_restr.messages
-            and curr_restr.media
-            and curr_restr.other
-            and curr_restr.preview
-        )
+        lock_type = "preview"
+    return bool(mask & RESTR_BITS.get(lock_type, 0))
 
 
 def get_locks(chat_id):
@@ -256,9 +229,33 @@ def migrate_chat(old_chat_id, new_chat_id):
         if perms:
             perms.chat_id = str(new_chat_id)
         SESSION.commit()
+        if str(old_chat_id) in CHAT_LOCKS:
+            CHAT_LOCKS[str(new_chat_id)] = CHAT_LOCKS.pop(str(old_chat_id))
 
     with RESTR_LOCK:
         rest = SESSION.query(Restrictions).get(str(old_chat_id))
         if rest:
             rest.chat_id = str(new_chat_id)
         SESSION.commit()
+        if str(old_chat_id) in CHAT_RESTRICTIONS:
+            CHAT_RESTRICTIONS[str(new_chat_id)] = CHAT_RESTRICTIONS.pop(
+                str(old_chat_id)
+            )
+
+
+def __load_chat_locks():
+    global CHAT_LOCKS, CHAT_RESTRICTIONS
+    try:
+        CHAT_LOCKS = {
+            perm.chat_id: __lock_mask(perm)
+            for perm in SESSION.query(Permissions).all()
+        }
+        CHAT_RESTRICTIONS = {
+            restr.chat_id: __restr_mask(restr)
+            for restr in SESSION.query(Restrictions).all()
+        }
+    finally:
+        SESSION.close()
+
+
+__load_chat_locks()
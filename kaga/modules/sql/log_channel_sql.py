@@ -1,6 +1,6 @@
 import threading
 
-from kaga.modules.sql import BASE, SESSION
+from kaga.modules.sql import BASE, SESSION, session_scope, upsert
 from sqlalchemy import Column, String, distinct, func
 
 
@@ -22,16 +22,14 @@ CHANNELS = {}
 
 
 def set_chat_log_channel(chat_id, log_channel):
-    with LOGS_INSERTION_LOCK:
-        res = SESSION.query(GroupLogs).get(str(chat_id))
-        if res:
-            res.log_channel = log_channel
-        else:
-            res = GroupLogs(chat_id, log_channel)
-            SESSION.add(res)
-
-        CHANNELS[str(chat_id)] = log_channel
-        SESSION.commit()
+    with session_scope() as session:
+        upsert(
+            session,
+            GroupLogs,
+            chat_id=str(chat_id),
+            log_channel=str(log_channel),
+        )
+    CHANNELS[str(chat_id)] = log_channel
 
 
 def get_chat_log_channel(chat_id):
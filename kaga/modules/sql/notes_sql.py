@@ -1,7 +1,9 @@
 # Note: chat_id's are stored as strings because the int is too large to be
 # stored in a PSQL database.
 import threading
+from collections import namedtuple
 
+from cachetools import LRUCache
 from sqlalchemy import (
     Column,
     String,
@@ -10,10 +12,17 @@ from sqlalchemy import (
     Integer,
     func,
     distinct,
+    text,
 )
+from telegram import InlineKeyboardMarkup
 
+from kaga.modules.helper_funcs.misc import build_keyboard
 from kaga.modules.helper_funcs.msg_types import Types
-from kaga.modules.sql import SESSION, BASE
+from kaga.modules.helper_funcs.string_handling import (
+    escape_invalid_curly_brackets,
+    markdown_to_html,
+)
+from kaga.modules.sql import BASE, SESSION, session_scope, upsert
 
 
 class Notes(BASE):
@@ -56,90 +65,204 @@ class Buttons(BASE):
 
 Notes.__table__.create(checkfirst=True)
 Buttons.__table__.create(checkfirst=True)
+# Notes are looked up by lower(name), which the primary key can't serve
+SESSION.execute(
+    text(
+        "CREATE INDEX IF NOT EXISTS ix_notes_chat_id_lower_name "
+        "ON notes (chat_id, lower(name))"
+    )
+)
+SESSION.commit()
 
 NOTES_INSERTION_LOCK = threading.RLock()
 BUTTONS_INSERTION_LOCK = threading.RLock()
 
+VALID_NOTE_FORMATTERS = [
+    "first",
+    "last",
+    "fullname",
+    "username",
+    "id",
+    "chatname",
+    "mention",
+]
+
+# Notes (and names that aren't notes, for #hashtags) kept in memory
+NOTE_CACHE_SIZE = 20000
+
+Button = namedtuple("Button", ["name", "url", "same_line"])
+# text is the note with invalid curly brackets escaped, html is the same
+# text already run through markdown_to_html, both still to be formatted
+CachedNote = namedtuple(
+    "CachedNote",
+    [
+        "name",
+        "value",
+        "file",
+        "is_reply",
+        "msgtype",
+        "buttons",
+        "text",
+        "html",
+        "keyboard",
+    ],
+)
 
-def add_note_to_db(
-    chat_id, note_name, note_data, msgtype, buttons=None, file=None
-):
-    if not buttons:
-        buttons = []
-
-    with NOTES_INSERTION_LOCK:
-        prev = SESSION.query(Notes).get((str(chat_id), note_name))
-        if prev:
-            with BUTTONS_INSERTION_LOCK:
-                prev_buttons = (
-                    SESSION.query(Buttons)
-                    .filter(
-                        Buttons.chat_id == str(chat_id),
-                        Buttons.note_name == note_name,
-                    )
-                    .all()
-                )
-                for btn in prev_buttons:
-                    SESSION.delete(btn)
-            SESSION.delete(prev)
-        note = Notes(
-            str(chat_id),
-            note_name,
-            note_data or "",
-            msgtype=msgtype.value,
-            file=file,
-        )
-        SESSION.add(note)
-        SESSION.commit()
-
-    for b_name, url, same_line in buttons:
-        add_note_button_to_db(chat_id, note_name, b_name, url, same_line)
+# (chat_id, lowercase name) -> CachedNote, or None when there's no such note
+NOTE_CACHE = LRUCache(maxsize=NOTE_CACHE_SIZE)
+# chat_id -> times its notes were written, a load that raced a write
+# isn't cached
+CHAT_VERSIONS = {}
+CACHE_LOCK = threading.RLock()
 
 
-def get_note(chat_id, note_name):
+def __load_note(chat_id, note_name):
     try:
-        return (
+        note = (
             SESSION.query(Notes)
             .filter(
                 func.lower(Notes.name) == note_name,
-                Notes.chat_id == str(chat_id),
+                Notes.chat_id == chat_id,
             )
             .first()
         )
+        if not note:
+            return None
+        buttons = tuple(
+            Button(btn.name, btn.url, btn.same_line)
+            for btn in SESSION.query(Buttons)
+            .filter(Buttons.chat_id == chat_id, Buttons.note_name == note.name)
+            .order_by(Buttons.id)
+            .all()
+        )
     finally:
         SESSION.close()
 
+    note_text = escape_invalid_curly_brackets(
+        note.value, VALID_NOTE_FORMATTERS
+    )
+    return CachedNote(
+        name=note.name,
+        value=note.value,
+        file=note.file,
+        is_reply=note.is_reply,
+        msgtype=note.msgtype,
+        buttons=buttons,
+        text=note_text,
+        html=markdown_to_html(note_text) if note_text else "",
+        keyboard=InlineKeyboardMarkup(build_keyboard(buttons)),
+    )
+
+
+def __invalidate(*chat_ids):
+    chat_ids = set(map(str, chat_ids))
+    with CACHE_LOCK:
+        for key in [key for key in NOTE_CACHE if key[0] in chat_ids]:
+            NOTE_CACHE.pop(key, None)
+        if len(CHAT_VERSIONS) > NOTE_CACHE_SIZE:
+            CHAT_VERSIONS.clear()
+        for chat_id in chat_ids:
+            CHAT_VERSIONS[chat_id] = CHAT_VERSIONS.get(chat_id, 0) + 1
+
+
+def add_note_to_db(
+    chat_id, note_name, note_data, msgtype, buttons=None, file=None
+):
+    # The note and its buttons are replaced in one transaction, so readers
+    # never see the new note with the old buttons
+    with session_scope() as session:
+        session.query(Buttons).filter(
+            Buttons.chat_id == str(chat_id), Buttons.note_name == note_name
+        ).delete(synchronize_session=False)
+        upsert(
+            session,
+            Notes,
+            chat_id=str(chat_id),
+            name=note_name,
+            value=note_data or "",
+            file=file,
+            is_reply=False,
+            has_buttons=False,
+            msgtype=msgtype.value,
+        )
+        session.add_all(
+            Buttons(chat_id, note_name, b_name, url, same_line)
+            for b_name, url, same_line in buttons or []
+        )
+    __invalidate(chat_id)
+
+
+def add_notes_to_db(chat_id, notes) -> int:
+    """Save many notes in one transaction, for imports.
+
+    notes are (note_name, note_data, msgtype, buttons, file) tuples; notes
+    that already exist are replaced. Returns how many were saved.
+    """
+    notes = {note[0]: note for note in notes}
+    if not notes:
+        return 0
+
+    with session_scope() as session:
+        session.query(Buttons).filter(
+            Buttons.chat_id == str(chat_id),
+            Buttons.note_name.in_(list(notes)),
+        ).delete(synchronize_session=False)
+        session.query(Notes).filter(
+            Notes.chat_id == str(chat_id), Notes.name.in_(list(notes))
+        ).delete(synchronize_session=False)
+
+        for note_name, note_data, msgtype, buttons, file in notes.values():
+            session.add(
+                Notes(
+                    str(chat_id),
+                    note_name,
+                    note_data or "",
+                    msgtype=msgtype.value,
+                    file=file,
+                )
+            )
+            for b_name, url, same_line in buttons or []:
+                session.add(
+                    Buttons(chat_id, note_name, b_name, url, same_line)
+                )
+    __invalidate(chat_id)
+
+    return len(notes)
+
+
+def get_note(chat_id, note_name):
+    """The CachedNote called note_name in the chat, or None."""
+    key = (str(chat_id), note_name.lower())
+    with CACHE_LOCK:
+        if key in NOTE_CACHE:
+            return NOTE_CACHE[key]
+        version = CHAT_VERSIONS.get(key[0], 0)
+
+    note = __load_note(*key)
+    with CACHE_LOCK:
+        if CHAT_VERSIONS.get(key[0], 0) == version:
+            NOTE_CACHE[key] = note
+    return note
+
 
 def rm_note(chat_id, note_name):
-    with NOTES_INSERTION_LOCK:
-        note = (
-            SESSION.query(Notes)
+    with session_scope() as session:
+        deleted = (
+            session.query(Notes)
             .filter(
                 func.lower(Notes.name) == note_name,
                 Notes.chat_id == str(chat_id),
             )
-            .first()
+            .delete(synchronize_session=False)
         )
-        if note:
-            with BUTTONS_INSERTION_LOCK:
-                buttons = (
-                    SESSION.query(Buttons)
-                    .filter(
-                        Buttons.chat_id == str(chat_id),
-                        Buttons.note_name == note_name,
-                    )
-                    .all()
-                )
-                for btn in buttons:
-                    SESSION.delete(btn)
-
-            SESSION.delete(note)
-            SESSION.commit()
-            return True
-
-        else:
-            SESSION.close()
+        if not deleted:
             return False
+        session.query(Buttons).filter(
+            Buttons.chat_id == str(chat_id),
+            Buttons.note_name == note_name,
+        ).delete(synchronize_session=False)
+    __invalidate(chat_id)
+    return True
 
 
 def get_all_chat_notes(chat_id):
@@ -155,10 +278,9 @@ def get_all_chat_notes(chat_id):
 
 
 def add_note_button_to_db(chat_id, note_name, b_name, url, same_line):
-    with BUTTONS_INSERTION_LOCK:
-        button = Buttons(chat_id, note_name, b_name, url, same_line)
-        SESSION.add(button)
-        SESSION.commit()
+    with session_scope() as session:
+        session.add(Buttons(chat_id, note_name, b_name, url, same_line))
+    __invalidate(chat_id)
 
 
 def get_buttons(chat_id, note_name):
@@ -175,6 +297,22 @@ def get_buttons(chat_id, note_name):
         SESSION.close()
 
 
+def get_chat_buttons(chat_id) -> dict:
+    """The buttons of every note in the chat, by note name."""
+    try:
+        buttons = {}
+        for btn in (
+            SESSION.query(Buttons)
+            .filter(Buttons.chat_id == str(chat_id))
+            .order_by(Buttons.id)
+            .all()
+        ):
+            buttons.setdefault(btn.note_name, []).append(btn)
+        return buttons
+    finally:
+        SESSION.close()
+
+
 def num_notes():
     try:
         return SESSION.query(Notes).count()
@@ -209,3 +347,4 @@ def migrate_chat(old_chat_id, new_chat_id):
                 btn.chat_id = str(new_chat_id)
 
         SESSION.commit()
+        __invalidate(old_chat_id, new_chat_id)
@@ -9,10 +9,15 @@ from sqlalchemy import (
     func,
     distinct,
     Boolean,
+    update,
 )
 from sqlalchemy.dialects import postgresql
 
-from kaga.modules.sql import SESSION, BASE
+from kaga.modules.helper_funcs.string_handling import (
+    compile_keywords,
+    first_keyword_match,
+)
+from kaga.modules.sql import SESSION, BASE, session_scope, upsert
 
 
 class Warns(BASE):
@@ -78,76 +83,64 @@ Warns.__table__.create(checkfirst=True)
 WarnFilters.__table__.create(checkfirst=True)
 WarnSettings.__table__.create(checkfirst=True)
 
-WARN_INSERTION_LOCK = threading.RLock()
 WARN_FILTER_INSERTION_LOCK = threading.RLock()
 WARN_SETTINGS_LOCK = threading.RLock()
 
 WARN_FILTERS = {}
+# chat_id -> compiled matcher for all of that chat's warn filters, built lazily
+WARN_FILTER_MATCHERS = {}
+DEF_WARN_SETTING = (3, False)
+WARN_SETTINGS = {}  # chat_id -> (warn_limit, soft_warn)
 
+WARNS_KEY = [Warns.user_id, Warns.chat_id]
 
-def warn_user(user_id, chat_id, reason=None):
-    with WARN_INSERTION_LOCK:
-        warned_user = SESSION.query(Warns).get((user_id, str(chat_id)))
-        if not warned_user:
-            warned_user = Warns(user_id, str(chat_id))
-
-        warned_user.num_warns += 1
-
-        if reason == "":
-            reason = "No reason given."
-
-        if reason:
-            if warned_user.reasons is None:
-                warned_user.reasons = [reason]
-            else:
-                # TODO:: double check this Daan: Not really wizardry, it adds a
-                # new entry to a list/array which can be done this way,
-                # basically append equivalent
-                warned_user.reasons = warned_user.reasons + [reason]
 
-        reasons = warned_user.reasons
-        num = warned_user.num_warns
-
-        SESSION.add(warned_user)
-        SESSION.commit()
-
-        return num, reasons
+def warn_user(user_id, chat_id, reason=None):
+    if reason == "":
+        reason = "No reason given."
+
+    stmt = postgresql.insert(Warns.__table__).values(
+        user_id=user_id,
+        chat_id=str(chat_id),
+        num_warns=1,
+        reasons=[reason] if reason else [],
+    )
+    changes = {"num_warns": Warns.num_warns + 1}
+    if reason:
+        changes["reasons"] = func.array_append(Warns.reasons, reason)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=WARNS_KEY, set_=changes
+    ).returning(Warns.num_warns, Warns.reasons)
+
+    with session_scope() as session:
+        num, reasons = session.execute(stmt).first()
+    return num, reasons
 
 
 def remove_warn(user_id, chat_id):
-    with WARN_INSERTION_LOCK:
-        removed = False
-        warned_user = SESSION.query(Warns).get((user_id, str(chat_id)))
-        temp_reason = []
-
-        if warned_user and warned_user.num_warns > 0:
-            warned_user.num_warns -= 1
-
-            if warned_user and warned_user.reasons is not None:
-                len(warned_user.reasons)
-                for reason in warned_user.reasons:
-                    temp_reason.append(reason)
-                del temp_reason[-1]
-                warned_user.reasons = temp_reason
-
-            SESSION.add(warned_user)
-            SESSION.commit()
-            removed = True
-
-        SESSION.close()
-        return removed
+    stmt = (
+        update(Warns.__table__)
+        .where(Warns.user_id == user_id)
+        .where(Warns.chat_id == str(chat_id))
+        .where(Warns.num_warns > 0)
+        .values(
+            num_warns=Warns.num_warns - 1,
+            reasons=Warns.reasons[1 : func.array_length(Warns.reasons, 1) - 1],
+        )
+    )
+    with session_scope() as session:
+        return session.execute(stmt).rowcount > 0
 
 
 def reset_warns(user_id, chat_id):
-    with WARN_INSERTION_LOCK:
-        warned_user = SESSION.query(Warns).get((user_id, str(chat_id)))
-        if warned_user:
-            warned_user.num_warns = 0
-            warned_user.reasons = []
-
-            SESSION.add(warned_user)
-            SESSION.commit()
-        SESSION.close()
+    stmt = (
+        update(Warns.__table__)
+        .where(Warns.user_id == user_id)
+        .where(Warns.chat_id == str(chat_id))
+        .values(num_warns=0, reasons=[])
+    )
+    with session_scope() as session:
+        session.execute(stmt)
 
 
 def get_warns(user_id, chat_id):
@@ -171,6 +164,7 @@ def add_warn_filter(chat_id, keyword, reply):
                 WARN_FILTERS.get(str(chat_id), []) + [keyword],
                 key=lambda x: (-len(x), x),
             )
+            WARN_FILTER_MATCHERS.pop(str(chat_id), None)
 
         SESSION.merge(warn_filt)  # merge to avoid duplicate key issues
         SESSION.commit()
@@ -182,6 +176,7 @@ def remove_warn_filter(chat_id, keyword):
         if warn_filt:
             if keyword in WARN_FILTERS.get(str(chat_id), []):  # sanity check
                 WARN_FILTERS.get(str(chat_id), []).remove(keyword)
+                WARN_FILTER_MATCHERS.pop(str(chat_id), None)
 
             SESSION.delete(warn_filt)
             SESSION.commit()
@@ -194,6 +189,24 @@ def get_chat_warn_triggers(chat_id):
     return WARN_FILTERS.get(str(chat_id), set())
 
 
+def get_chat_warn_match(chat_id, text):
+    """Return the chat's warn filter keyword found in text, if any.
+
+    When several match, the one that comes first in the chat's triggers wins.
+    """
+    chat_id = str(chat_id)
+    matcher = WARN_FILTER_MATCHERS.get(chat_id)
+    if matcher is None:
+        with WARN_FILTER_INSERTION_LOCK:
+            keywords = WARN_FILTERS.get(chat_id)
+            if not keywords:
+                return None
+            matcher = compile_keywords(keywords)
+            WARN_FILTER_MATCHERS[chat_id] = matcher
+
+    return first_keyword_match(matcher, text)
+
+
 def get_chat_warn_filters(chat_id):
     try:
         return (
@@ -213,39 +226,23 @@ def get_warn_filter(chat_id, keyword):
 
 
 def set_warn_limit(chat_id, warn_limit):
+    with session_scope() as session:
+        upsert(session, WarnSettings, chat_id=str(chat_id), warn_limit=warn_limit)
     with WARN_SETTINGS_LOCK:
-        curr_setting = SESSION.query(WarnSettings).get(str(chat_id))
-        if not curr_setting:
-            curr_setting = WarnSettings(chat_id, warn_limit=warn_limit)
-
-        curr_setting.warn_limit = warn_limit
-
-        SESSION.add(curr_setting)
-        SESSION.commit()
+        _, soft_warn = get_warn_setting(chat_id)
+        WARN_SETTINGS[str(chat_id)] = (warn_limit, soft_warn)
 
 
 def set_warn_strength(chat_id, soft_warn):
+    with session_scope() as session:
+        upsert(session, WarnSettings, chat_id=str(chat_id), soft_warn=soft_warn)
     with WARN_SETTINGS_LOCK:
-        curr_setting = SESSION.query(WarnSettings).get(str(chat_id))
-        if not curr_setting:
-            curr_setting = WarnSettings(chat_id, soft_warn=soft_warn)
-
-        curr_setting.soft_warn = soft_warn
-
-        SESSION.add(curr_setting)
-        SESSION.commit()
+        warn_limit, _ = get_warn_setting(chat_id)
+        WARN_SETTINGS[str(chat_id)] = (warn_limit, soft_warn)
 
 
 def get_warn_setting(chat_id):
-    try:
-        setting = SESSION.query(WarnSettings).get(str(chat_id))
-        if setting:
-            return setting.warn_limit, setting.soft_warn
-        else:
-            return 3, False
-
-    finally:
-        SESSION.close()
+    return WARN_SETTINGS.get(str(chat_id), DEF_WARN_SETTING)
 
 
 def num_warns():
@@ -309,16 +306,22 @@ def __load_chat_warn_filters():
         SESSION.close()
 
 
+def __load_warn_settings():
+    global WARN_SETTINGS
+    try:
+        WARN_SETTINGS = {
+            setting.chat_id: (setting.warn_limit, setting.soft_warn)
+            for setting in SESSION.query(WarnSettings).all()
+        }
+    finally:
+        SESSION.close()
+
+
 def migrate_chat(old_chat_id, new_chat_id):
-    with WARN_INSERTION_LOCK:
-        chat_notes = (
-            SESSION.query(Warns)
-            .filter(Warns.chat_id == str(old_chat_id))
-            .all()
+    with session_scope() as session:
+        session.query(Warns).filter(Warns.chat_id == str(old_chat_id)).update(
+            {Warns.chat_id: str(new_chat_id)}, synchronize_session=False
         )
-        for note in chat_notes:
-            note.chat_id = str(new_chat_id)
-        SESSION.commit()
 
     with WARN_FILTER_INSERTION_LOCK:
         chat_filters = (
@@ -333,6 +336,8 @@ def migrate_chat(old_chat_id, new_chat_id):
         if old_filt:
             WARN_FILTERS[str(new_chat_id)] = old_filt
             del WARN_FILTERS[str(old_chat_id)]
+        WARN_FILTER_MATCHERS.pop(str(old_chat_id), None)
+        WARN_FILTER_MATCHERS.pop(str(new_chat_id), None)
 
     with WARN_SETTINGS_LOCK:
         chat_settings = (
@@ -343,6 +348,9 @@ def migrate_chat(old_chat_id, new_chat_id):
         for setting in chat_settings:
             setting.chat_id = str(new_chat_id)
         SESSION.commit()
+        if str(old_chat_id) in WARN_SETTINGS:
+            WARN_SETTINGS[str(new_chat_id)] = WARN_SETTINGS.pop(str(old_chat_id))
 
 
 __load_chat_warn_filters()
+__load_warn_settings()
@@ -1,14 +1,22 @@
 import random
 import threading
+from collections import namedtuple
 from typing import Union
 
+from cachetools import LRUCache
+
+from kaga.modules.helper_funcs.misc import build_keyboard
 from kaga.modules.helper_funcs.msg_types import Types
-from kaga.modules.sql import BASE, SESSION
+from kaga.modules.sql import BASE, SESSION, session_scope, upsert
 from sqlalchemy import (BigInteger, Boolean, Column, Integer, String,
                         UnicodeText)
 
 DEFAULT_WELCOME = 'Selamat datang {frist}'
 DEFAULT_GOODBYE = 'Sampai jumpa kembali {frist}!'
+# Raid mode: joins within the raid window that start it, and how long
+# (seconds) the joiners are muted for
+DEFAULT_RAID_THRESHOLD = 20
+DEFAULT_RAID_MUTE_TIME = 24 * 60 * 60
 
 DEFAULT_WELCOME_MESSAGES = [
     "{first} ada di sini!", #Discord selamat datang disalin
@@ -335,6 +343,17 @@ class CleanServiceSetting(BASE):
         return "<Chat used clean service ({})>".format(self.chat_id)
 
 
+class RaidMode(BASE):
+    __tablename__ = "raid_mode"
+    chat_id = Column(String(14), primary_key=True)
+    status = Column(Boolean, default=False)
+    threshold = Column(Integer, default=DEFAULT_RAID_THRESHOLD)
+    mute_time = Column(Integer, default=DEFAULT_RAID_MUTE_TIME)
+
+    def __repr__(self):
+        return "<Chat raid mode ({}): {}>".format(self.chat_id, self.status)
+
+
 Welcome.__table__.create(checkfirst=True)
 WelcomeButtons.__table__.create(checkfirst=True)
 GoodbyeButtons.__table__.create(checkfirst=True)
@@ -344,34 +363,154 @@ CleanServiceSetting.__table__.create(checkfirst=True)
 CombotCASStatus.__table__.create(checkfirst=True)
 DefenseMode.__table__.create(checkfirst=True)
 AutoKickSafeMode.__table__.create(checkfirst=True)
+RaidMode.__table__.create(checkfirst=True)
 
 INSERTION_LOCK = threading.RLock()
 WELC_BTN_LOCK = threading.RLock()
 LEAVE_BTN_LOCK = threading.RLock()
-WM_LOCK = threading.RLock()
-CS_LOCK = threading.RLock()
-CAS_LOCK = threading.RLock()
-DEFENSE_LOCK = threading.RLock()
-AUTOKICK_LOCK = threading.RLock()
 
-def welcome_mutes(chat_id):
+# Chats whose settings are kept in memory, loaded on their first join/leave
+SETTINGS_CACHE_SIZE = 10000
+
+Button = namedtuple("Button", ["name", "url", "same_line"])
+WelcomeSettings = namedtuple(
+    "WelcomeSettings",
+    [
+        "should_welcome",
+        "custom_welcome",
+        "custom_content",
+        "welcome_type",
+        "should_goodbye",
+        "custom_leave",
+        "leave_type",
+        "clean_welcome",
+        "welcome_mutes",
+        "welcome_buttons",
+        "welcome_keyboard",
+        "goodbye_buttons",
+        "goodbye_keyboard",
+        "cas_status",
+        "cas_autoban",
+        "clean_service",
+        "defense",
+        "kick_time",
+        "raid_mode",
+        "raid_threshold",
+        "raid_mute_time",
+    ],
+)
+
+CHAT_SETTINGS = LRUCache(maxsize=SETTINGS_CACHE_SIZE)
+# chat_id -> times its settings were written, a load that raced a write
+# isn't cached
+CHAT_VERSIONS = {}
+SETTINGS_LOCK = threading.RLock()
+
+
+def __load_buttons(table, chat_id):
+    return tuple(
+        Button(btn.name, btn.url, btn.same_line)
+        for btn in SESSION.query(table)
+        .filter(table.chat_id == chat_id)
+        .order_by(table.id)
+        .all()
+    )
+
+
+def __load_settings(chat_id):
     try:
-        welcomemutes = SESSION.query(WelcomeMute).get(str(chat_id))
-        if welcomemutes:
-            return welcomemutes.welcomemutes
-        return False
+        welc = SESSION.query(Welcome).get(chat_id)
+        mutes = SESSION.query(WelcomeMute).get(chat_id)
+        cas = SESSION.query(CombotCASStatus).get(chat_id)
+        clean = SESSION.query(CleanServiceSetting).get(chat_id)
+        defense = SESSION.query(DefenseMode).get(chat_id)
+        kick = SESSION.query(AutoKickSafeMode).get(chat_id)
+        raid = SESSION.query(RaidMode).get(chat_id)
+        welc_buttons = __load_buttons(WelcomeButtons, chat_id)
+        gdbye_buttons = __load_buttons(GoodbyeButtons, chat_id)
+
+        if welc:
+            welc_pref = (
+                welc.should_welcome,
+                welc.custom_welcome,
+                welc.custom_content,
+                welc.welcome_type,
+                welc.should_goodbye,
+                welc.custom_leave,
+                welc.leave_type,
+                welc.clean_welcome,
+            )
+        else:
+            # Welcome by default.
+            welc_pref = (
+                True,
+                DEFAULT_WELCOME,
+                None,
+                Types.TEXT,
+                True,
+                DEFAULT_GOODBYE,
+                Types.TEXT,
+                False,
+            )
+
+        return WelcomeSettings(
+            *welc_pref,
+            welcome_mutes=mutes.welcomemutes if mutes else False,
+            welcome_buttons=welc_buttons,
+            welcome_keyboard=build_keyboard(welc_buttons),
+            goodbye_buttons=gdbye_buttons,
+            goodbye_keyboard=build_keyboard(gdbye_buttons),
+            cas_status=cas.status if cas else True,
+            cas_autoban=bool(cas and cas.autoban),
+            clean_service=clean.clean_service if clean else False,
+            defense=defense.status if defense else False,
+            kick_time=kick.timeK if kick else 90,
+            raid_mode=bool(raid and raid.status),
+            raid_threshold=raid.threshold if raid else DEFAULT_RAID_THRESHOLD,
+            raid_mute_time=raid.mute_time if raid else DEFAULT_RAID_MUTE_TIME,
+        )
     finally:
         SESSION.close()
 
 
+def get_settings(chat_id) -> WelcomeSettings:
+    """Every welcome setting of a chat, read from the database once."""
+    chat_id = str(chat_id)
+    with SETTINGS_LOCK:
+        settings = CHAT_SETTINGS.get(chat_id)
+        if settings is not None:
+            return settings
+        version = CHAT_VERSIONS.get(chat_id, 0)
+
+    settings = __load_settings(chat_id)
+    with SETTINGS_LOCK:
+        if CHAT_VERSIONS.get(chat_id, 0) == version:
+            CHAT_SETTINGS[chat_id] = settings
+    return settings
+
+
+def __invalidate(*chat_ids):
+    with SETTINGS_LOCK:
+        for chat_id in map(str, chat_ids):
+            CHAT_SETTINGS.pop(chat_id, None)
+            if len(CHAT_VERSIONS) > SETTINGS_CACHE_SIZE:
+                CHAT_VERSIONS.clear()
+            CHAT_VERSIONS[chat_id] = CHAT_VERSIONS.get(chat_id, 0) + 1
+
+
+def welcome_mutes(chat_id):
+    return get_settings(chat_id).welcome_mutes
+
+
 def set_welcome_mutes(chat_id, welcomemutes):
-    with WM_LOCK:
-        prev = SESSION.query(WelcomeMute).get((str(chat_id)))
-        if prev:
-            SESSION.delete(prev)
-        welcome_m = WelcomeMute(str(chat_id), welcomemutes)
-        SESSION.add(welcome_m)
-        SESSION.commit()
+    with session_scope() as session:
+        upsert(
+            session,
+            WelcomeMute,
+            chat_id=str(chat_id),
+            welcomemutes=welcomemutes,
+        )
+    __invalidate(chat_id)
 
 
 def set_human_checks(user_id, chat_id):
@@ -403,80 +542,59 @@ def get_human_checks(user_id, chat_id):
 
 
 def get_welc_mutes_pref(chat_id):
-    welcomemutes = SESSION.query(WelcomeMute).get(str(chat_id))
-    SESSION.close()
-
-    if welcomemutes:
-        return welcomemutes.welcomemutes
-
-    return False
+    return get_settings(chat_id).welcome_mutes
 
 
 def get_welc_pref(chat_id):
-    welc = SESSION.query(Welcome).get(str(chat_id))
-    SESSION.close()
-    if welc:
-        return welc.should_welcome, welc.custom_welcome, welc.custom_content, welc.welcome_type
-
-    else:
-        # Welcome by default.
-        return True, DEFAULT_WELCOME, None, Types.TEXT
+    settings = get_settings(chat_id)
+    return (
+        settings.should_welcome,
+        settings.custom_welcome,
+        settings.custom_content,
+        settings.welcome_type,
+    )
 
 
 def get_gdbye_pref(chat_id):
-    welc = SESSION.query(Welcome).get(str(chat_id))
-    SESSION.close()
-    if welc:
-        return welc.should_goodbye, welc.custom_leave, welc.leave_type
-    else:
-        # Welcome by default.
-        return True, DEFAULT_GOODBYE, Types.TEXT
+    settings = get_settings(chat_id)
+    return settings.should_goodbye, settings.custom_leave, settings.leave_type
 
 
 def set_clean_welcome(chat_id, clean_welcome):
-    with INSERTION_LOCK:
-        curr = SESSION.query(Welcome).get(str(chat_id))
-        if not curr:
-            curr = Welcome(str(chat_id))
-
-        curr.clean_welcome = int(clean_welcome)
-
-        SESSION.add(curr)
-        SESSION.commit()
+    with session_scope() as session:
+        upsert(
+            session,
+            Welcome,
+            chat_id=str(chat_id),
+            clean_welcome=int(clean_welcome),
+        )
+    __invalidate(chat_id)
 
 
 def get_clean_pref(chat_id):
-    welc = SESSION.query(Welcome).get(str(chat_id))
-    SESSION.close()
-
-    if welc:
-        return welc.clean_welcome
-
-    return False
+    return get_settings(chat_id).clean_welcome
 
 
 def set_welc_preference(chat_id, should_welcome):
-    with INSERTION_LOCK:
-        curr = SESSION.query(Welcome).get(str(chat_id))
-        if not curr:
-            curr = Welcome(str(chat_id), should_welcome=should_welcome)
-        else:
-            curr.should_welcome = should_welcome
-
-        SESSION.add(curr)
-        SESSION.commit()
+    with session_scope() as session:
+        upsert(
+            session,
+            Welcome,
+            chat_id=str(chat_id),
+            should_welcome=should_welcome,
+        )
+    __invalidate(chat_id)
 
 
 def set_gdbye_preference(chat_id, should_goodbye):
-    with INSERTION_LOCK:
-        curr = SESSION.query(Welcome).get(str(chat_id))
-        if not curr:
-            curr = Welcome(str(chat_id), should_goodbye=should_goodbye)
-        else:
-            curr.should_goodbye = should_goodbye
-
-        SESSION.add(curr)
-        SESSION.commit()
+    with session_scope() as session:
+        upsert(
+            session,
+            Welcome,
+            chat_id=str(chat_id),
+            should_goodbye=should_goodbye,
+        )
+    __invalidate(chat_id)
 
 
 def set_custom_welcome(chat_id,
@@ -487,168 +605,131 @@ def set_custom_welcome(chat_id,
     if buttons is None:
         buttons = []
 
-    with INSERTION_LOCK:
-        welcome_settings = SESSION.query(Welcome).get(str(chat_id))
-        if not welcome_settings:
-            welcome_settings = Welcome(str(chat_id), True)
-
-        if custom_welcome or custom_content:
-            welcome_settings.custom_content = custom_content
-            welcome_settings.custom_welcome = custom_welcome
-            welcome_settings.welcome_type = welcome_type.value
-
-        else:
-            welcome_settings.custom_welcome = DEFAULT_WELCOME
-            welcome_settings.welcome_type = Types.TEXT.value
-
-        SESSION.add(welcome_settings)
-
-        with WELC_BTN_LOCK:
-            prev_buttons = SESSION.query(WelcomeButtons).filter(
-                WelcomeButtons.chat_id == str(chat_id)).all()
-            for btn in prev_buttons:
-                SESSION.delete(btn)
-
-            for b_name, url, same_line in buttons:
-                button = WelcomeButtons(chat_id, b_name, url, same_line)
-                SESSION.add(button)
-
-        SESSION.commit()
+    if custom_welcome or custom_content:
+        values = {
+            "custom_content": custom_content,
+            "custom_welcome": custom_welcome,
+            "welcome_type": welcome_type.value,
+        }
+    else:
+        values = {
+            "custom_welcome": DEFAULT_WELCOME,
+            "welcome_type": Types.TEXT.value,
+        }
+
+    # The message and its buttons are replaced in one transaction
+    with session_scope() as session:
+        upsert(session, Welcome, chat_id=str(chat_id), **values)
+        session.query(WelcomeButtons).filter(
+            WelcomeButtons.chat_id == str(chat_id)).delete(
+                synchronize_session=False)
+        session.add_all(
+            WelcomeButtons(chat_id, b_name, url, same_line)
+            for b_name, url, same_line in buttons)
+    __invalidate(chat_id)
 
 
 def get_custom_welcome(chat_id):
-    welcome_settings = SESSION.query(Welcome).get(str(chat_id))
-    ret = DEFAULT_WELCOME
-    if welcome_settings and welcome_settings.custom_welcome:
-        ret = welcome_settings.custom_welcome
-
-    SESSION.close()
-    return ret
+    return get_settings(chat_id).custom_welcome or DEFAULT_WELCOME
 
 
 def set_custom_gdbye(chat_id, custom_goodbye, goodbye_type, buttons=None):
     if buttons is None:
         buttons = []
 
-    with INSERTION_LOCK:
-        welcome_settings = SESSION.query(Welcome).get(str(chat_id))
-        if not welcome_settings:
-            welcome_settings = Welcome(str(chat_id), True)
-
-        if custom_goodbye:
-            welcome_settings.custom_leave = custom_goodbye
-            welcome_settings.leave_type = goodbye_type.value
-
-        else:
-            welcome_settings.custom_leave = DEFAULT_GOODBYE
-            welcome_settings.leave_type = Types.TEXT.value
+    if custom_goodbye:
+        values = {
+            "custom_leave": custom_goodbye,
+            "leave_type": goodbye_type.value,
+        }
+    else:
+        values = {
+            "custom_leave": DEFAULT_GOODBYE,
+            "leave_type": Types.TEXT.value,
+        }
+
+    with session_scope() as session:
+        upsert(session, Welcome, chat_id=str(chat_id), **values)
+        session.query(GoodbyeButtons).filter(
+            GoodbyeButtons.chat_id == str(chat_id)).delete(
+                synchronize_session=False)
+        session.add_all(
+            GoodbyeButtons(chat_id, b_name, url, same_line)
+            for b_name, url, same_line in buttons)
+    __invalidate(chat_id)
 
-        SESSION.add(welcome_settings)
 
-        with LEAVE_BTN_LOCK:
-            prev_buttons = SESSION.query(GoodbyeButtons).filter(
-                GoodbyeButtons.chat_id == str(chat_id)).all()
-            for btn in prev_buttons:
-                SESSION.delete(btn)
+def get_custom_gdbye(chat_id):
+    return get_settings(chat_id).custom_leave or DEFAULT_GOODBYE
 
-            for b_name, url, same_line in buttons:
-                button = GoodbyeButtons(chat_id, b_name, url, same_line)
-                SESSION.add(button)
 
-        SESSION.commit()
+def get_welc_buttons(chat_id):
+    return list(get_settings(chat_id).welcome_buttons)
 
 
-def get_custom_gdbye(chat_id):
-    welcome_settings = SESSION.query(Welcome).get(str(chat_id))
-    ret = DEFAULT_GOODBYE
-    if welcome_settings and welcome_settings.custom_leave:
-        ret = welcome_settings.custom_leave
+def get_gdbye_buttons(chat_id):
+    return list(get_settings(chat_id).goodbye_buttons)
 
-    SESSION.close()
-    return ret
 
+def get_welc_keyboard(chat_id):
+    return [list(row) for row in get_settings(chat_id).welcome_keyboard]
 
-def get_welc_buttons(chat_id):
-    try:
-        return SESSION.query(WelcomeButtons).filter(
-            WelcomeButtons.chat_id == str(chat_id)).order_by(
-                WelcomeButtons.id).all()
-    finally:
-        SESSION.close()
 
-
-def get_gdbye_buttons(chat_id):
-    try:
-        return SESSION.query(GoodbyeButtons).filter(
-            GoodbyeButtons.chat_id == str(chat_id)).order_by(
-                GoodbyeButtons.id).all()
-    finally:
-        SESSION.close()
+def get_gdbye_keyboard(chat_id):
+    return [list(row) for row in get_settings(chat_id).goodbye_keyboard]
 
         
 def get_cas_status(chat_id):
-    try:
-        resultObj = SESSION.query(CombotCASStatus).get(str(chat_id))
-        if resultObj:
-            return resultObj.status
-        return True
-    finally:
-        SESSION.close()       
+    return get_settings(chat_id).cas_status
 
         
 def set_cas_status(chat_id, status):
-    with CAS_LOCK:
-        ban = False
-        prevObj = SESSION.query(CombotCASStatus).get(str(chat_id))
-        if prevObj:
-            ban = prevObj.autoban
-            SESSION.delete(prevObj)
-        newObj = CombotCASStatus(str(chat_id), status, ban)
-        SESSION.add(newObj)
-        SESSION.commit()
+    with session_scope() as session:
+        upsert(session, CombotCASStatus, chat_id=str(chat_id), status=status)
+    __invalidate(chat_id)
 
         
 def get_cas_autoban(chat_id):
-    try:
-        resultObj = SESSION.query(CombotCASStatus).get(str(chat_id))
-        if resultObj and resultObj.autoban:
-            return resultObj.autoban
-        return False
-    finally:
-        SESSION.close()
+    return get_settings(chat_id).cas_autoban
         
 
 def set_cas_autoban(chat_id, autoban):
-    with CAS_LOCK:
-        status = True
-        prevObj = SESSION.query(CombotCASStatus).get(str(chat_id))
-        if prevObj:
-            status = prevObj.status
-            SESSION.delete(prevObj)
-        newObj = CombotCASStatus(str(chat_id), status, autoban)
-        SESSION.add(newObj)
-        SESSION.commit()
+    with session_scope() as session:
+        upsert(
+            session, CombotCASStatus, chat_id=str(chat_id), autoban=autoban)
+    __invalidate(chat_id)
         
                 
 def clean_service(chat_id: Union[str, int]) -> bool:
-    try:
-        chat_setting = SESSION.query(CleanServiceSetting).get(str(chat_id))
-        if chat_setting:
-            return chat_setting.clean_service
-        return False
-    finally:
-        SESSION.close()
+    return get_settings(chat_id).clean_service
 
 
 def set_clean_service(chat_id: Union[int, str], setting: bool):
-    with CS_LOCK:
-        chat_setting = SESSION.query(CleanServiceSetting).get(str(chat_id))
-        if not chat_setting:
-            chat_setting = CleanServiceSetting(chat_id)
+    with session_scope() as session:
+        upsert(
+            session,
+            CleanServiceSetting,
+            chat_id=str(chat_id),
+            clean_service=setting,
+        )
+    __invalidate(chat_id)
+
+
+def get_raid_mode(chat_id):
+    """(enabled, threshold, mute_time) of the chat's raid mode."""
+    settings = get_settings(chat_id)
+    return settings.raid_mode, settings.raid_threshold, settings.raid_mute_time
 
-        chat_setting.clean_service = setting
-        SESSION.add(chat_setting)
-        SESSION.commit()
+
+def set_raid_mode(chat_id, status, threshold=None, mute_time=None):
+    values = {"status": status}
+    if threshold is not None:
+        values["threshold"] = threshold
+    if mute_time is not None:
+        values["mute_time"] = mute_time
+    with session_scope() as session:
+        upsert(session, RaidMode, chat_id=str(chat_id), **values)
+    __invalidate(chat_id)
 
 
 def migrate_chat(old_chat_id, new_chat_id):
@@ -669,41 +750,28 @@ def migrate_chat(old_chat_id, new_chat_id):
             for btn in chat_buttons:
                 btn.chat_id = str(new_chat_id)
 
+        raid = SESSION.query(RaidMode).get(str(old_chat_id))
+        if raid:
+            raid.chat_id = str(new_chat_id)
+
         SESSION.commit()
+        __invalidate(old_chat_id, new_chat_id)
+
 # ANYONE LOOKING AT THIS COMMIT... YOU ARE ALLOWED TO FUCK ME
 
 def getDefenseStatus(chat_id):
-    try:
-        resultObj = SESSION.query(DefenseMode).get(str(chat_id))
-        if resultObj:
-            return resultObj.status
-        return False #default
-    finally:
-        SESSION.close()
+    return get_settings(chat_id).defense
 
 def setDefenseStatus(chat_id, status):
-    with DEFENSE_LOCK:
-        prevObj = SESSION.query(DefenseMode).get(str(chat_id))
-        if prevObj:
-            SESSION.delete(prevObj)
-        newObj = DefenseMode(str(chat_id), status)
-        SESSION.add(newObj)
-        SESSION.commit()
+    with session_scope() as session:
+        upsert(session, DefenseMode, chat_id=str(chat_id), status=status)
+    __invalidate(chat_id)
 
 def getKickTime(chat_id):
-    try:
-        resultObj = SESSION.query(AutoKickSafeMode).get(str(chat_id))
-        if resultObj:
-            return resultObj.timeK
-        return 90 #90 seconds
-    finally:
-        SESSION.close()
+    return get_settings(chat_id).kick_time
 
 def setKickTime(chat_id, value):
-    with AUTOKICK_LOCK:
-        prevObj = SESSION.query(AutoKickSafeMode).get(str(chat_id))
-        if prevObj:
-            SESSION.delete(prevObj)
-        newObj = AutoKickSafeMode(str(chat_id), int(value))
-        SESSION.add(newObj)
-        SESSION.commit()
+    with session_scope() as session:
+        upsert(
+            session, AutoKickSafeMode, chat_id=str(chat_id), timeK=int(value))
+    __invalidate(chat_id)
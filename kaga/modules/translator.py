@@ -1,7 +1,6 @@
 import json
 import os
 
-import requests
 from emoji import UNICODE_EMOJI
 from google_trans_new import google_translator, LANGUAGES
 from gtts import gTTS
@@ -10,6 +9,7 @@ from telegram.utils.helpers import escape_markdown
 
 from kaga import dispatcher
 from kaga.modules.disable import DisableAbleCommandHandler
+from kaga.modules.helper_funcs import http_client
 from kaga.modules.helper_funcs.alternate import send_action, typing_action
 
 
@@ -83,7 +83,7 @@ def spellcheck(update, context):
             lang="US", clientVersion="2.0", apiKey=API_KEY, text=msg.text
         )
 
-        res = requests.get(URL, params=params)
+        res = http_client.get(URL, params=params)
         changes = json.loads(res.text).get("LightGingerTheTextResult")
         curr_string = ""
         prev_end = 0
@@ -1,7 +1,7 @@
-import requests
 from kaga import dispatcher
 from kaga.modules.disable import DisableAbleCommandHandler
 from telegram import ParseMode, Update
+from kaga.modules.helper_funcs import http_client
 from kaga.modules.helper_funcs.alternate import typing_action
 
 
@@ -9,8 +9,10 @@ from kaga.modules.helper_funcs.alternate import typing_action
 def ud(update, context):
     message = update.effective_message
     text = message.text[len('/ud '):]
-    results = requests.get(
-        f'https://api.urbandictionary.com/v0/define?term={text}').json()
+    results = http_client.get(
+        'https://api.urbandictionary.com/v0/define',
+        params={'term': text},
+        cache_ttl=60 * 60).json()
     try:
         reply_text = f'*{text}*\n\n{results["list"][0]["definition"]}\n\n_{results["list"][0]["example"]}_'
     except:
@@ -1,13 +1,12 @@
 from io import BytesIO
-from time import sleep
 
-from telegram import TelegramError
 from telegram.error import BadRequest, TimedOut, Unauthorized
 from telegram.ext import CommandHandler, Filters, MessageHandler
 
 from kaga.modules.no_sql import users_db
 import kaga.modules.sql.users_sql as sql
 from kaga import LOGGER, OWNER_ID, dispatcher
+from kaga.modules.helper_funcs.broadcast import register_source, start_broadcast
 from kaga.modules.helper_funcs.filters import CustomFilters
 
 USERS_GROUP = 4
@@ -50,45 +49,32 @@ def broadcast(update, context):
     to_send = update.effective_message.text.split(None, 1)
 
     if len(to_send) >= 2:
-        to_group = False
-        to_user = False
-        if to_send[0] == '/broadcastgroups':
-            to_group = True
-        if to_send[0] == '/broadcastusers':
-            to_user = True
-        else:
-            to_group = to_user = True
-        chats = users_db.get_all_chats() or []
-        users = users_db.get_all_users()
-        failed = 0
-        failed_user = 0
-        if to_group:
-            for chat in chats:
-                try:
-                    context.bot.sendMessage(
-                        int(chat["chat_id"]),
-                        to_send[1],
-                        parse_mode="MARKDOWN",
-                        disable_web_page_preview=True)
-                    sleep(0.1)
-                except TelegramError:
-                    failed += 1
-        if to_user:
-            for user in users:
-                try:
-                    context.bot.sendMessage(
-                        int(user["_id"]),
-                        to_send[1],
-                        parse_mode="MARKDOWN",
-                        disable_web_page_preview=True)
-                    sleep(0.1)
-                except TelegramError:
-                    failed_user += 1
+        command = to_send[0].split("@")[0]
+        targets = []
+        if command in ("/broadcastgroups", "/broadcastall"):
+            targets.append(("chats", None))
+        if command in ("/broadcastusers", "/broadcastall"):
+            targets.append(("users", None))
+        start_broadcast(to_send[1], targets, update.effective_chat.id)
         update.effective_message.reply_text(
-            f"Siaran selesai.\nSiaran ke grup gagal: {failed}.\nSiaran ke pengguna gagal: {failed_user}."
+            "Siaran dimulai, saya akan mengabari jika sudah selesai."
         )
 
 
+def broadcast_chats(arg, after, limit):
+    return [
+        (chat["_id"], int(chat["chat_id"]))
+        for chat in users_db.get_chats_page(after, limit)
+    ]
+
+
+def broadcast_users(arg, after, limit):
+    return [
+        (user["_id"], int(user["_id"]))
+        for user in users_db.get_users_page(after, limit)
+    ]
+
+
 def log_user(update, context):
     chat = update.effective_chat
     msg = update.effective_message
@@ -109,6 +95,10 @@ def log_user(update, context):
         users_db.update_user(msg.forward_from.id, msg.forward_from.username)
 
 
+def flush_users(context):
+    users_db.flush_users()
+
+
 def chats(update, context):
     all_chats = users_db.get_all_chats() or []
     chatfile = "List of chats.\n"
@@ -193,8 +183,14 @@ CHAT_CHECKER_HANDLER = MessageHandler(
     Filters.all & Filters.chat_type.groups, chat_checker, run_async=True
 )
 
+register_source("chats", broadcast_chats)
+register_source("users", broadcast_users)
+
 dispatcher.add_handler(USER_HANDLER, USERS_GROUP)
 dispatcher.add_handler(BROADCAST_HANDLER)
 dispatcher.add_handler(CHATLIST_HANDLER)
 dispatcher.add_handler(USERLIST_HANDLER)
 dispatcher.add_handler(CHAT_CHECKER_HANDLER, CHAT_GROUP)
+dispatcher.job_queue.run_repeating(
+    flush_users, interval=users_db.FLUSH_INTERVAL, first=users_db.FLUSH_INTERVAL
+)
@@ -16,7 +16,6 @@ from telegram.ext import (
     CommandHandler,
     DispatcherHandlerStop,
     Filters,
-    MessageHandler,
 )
 from telegram.utils.helpers import escape_markdown, mention_html
 
@@ -38,6 +37,7 @@ from kaga.modules.helper_funcs.extraction import (
 )
 from kaga.modules.helper_funcs.filters import CustomFilters
 from kaga.modules.helper_funcs.misc import split_message
+from kaga.modules.helper_funcs.moderation import register_stage
 from kaga.modules.helper_funcs.string_handling import split_quotes
 from kaga.modules.log_channel import loggable
 from kaga.modules.sql import warns_sql as sql
@@ -482,18 +482,19 @@ def reply_filter(update, context) -> str:
     chat = update.effective_chat
     message = update.effective_message
 
-    chat_warn_filters = sql.get_chat_warn_triggers(chat.id)
     to_match = extract_text(message)
     if not to_match:
         return ""
 
-    for keyword in chat_warn_filters:
-        pattern = r"( |^|[^\w])" + re.escape(keyword) + r"( |$|[^\w])"
-        if re.search(pattern, to_match, flags=re.IGNORECASE):
-            user = update.effective_user
-            warn_filter = sql.get_warn_filter(chat.id, keyword)
-            return warn(user, chat, warn_filter.reply, message)
-    return ""
+    keyword = sql.get_chat_warn_match(chat.id, to_match)
+    if keyword is None:
+        return ""
+
+    user = update.effective_user
+    warn_filter = sql.get_warn_filter(chat.id, keyword)
+    if not warn_filter:
+        return ""
+    return warn(user, chat, warn_filter.reply, message)
 
 
 @user_admin
@@ -699,9 +700,6 @@ LIST_WARN_HANDLER = DisableAbleCommandHandler(
     admin_ok=True,
     run_async=True,
 )
-WARN_FILTER_HANDLER = MessageHandler(
-    CustomFilters.has_text & Filters.chat_type.groups, reply_filter, run_async=True
-)
 WARN_LIMIT_HANDLER = CommandHandler(
     "warnlimit", set_warn_limit, pass_args=True, run_async=True
 )
@@ -719,4 +717,10 @@ dispatcher.add_handler(RM_WARN_HANDLER)
 dispatcher.add_handler(LIST_WARN_HANDLER)
 dispatcher.add_handler(WARN_LIMIT_HANDLER)
 dispatcher.add_handler(WARN_STRENGTH_HANDLER)
-dispatcher.add_handler(WARN_FILTER_HANDLER, WARN_HANDLER_GROUP)
+register_stage(
+    WARN_HANDLER_GROUP,
+    "warn filters",
+    reply_filter,
+    filters=CustomFilters.has_text,
+    settings=sql.get_chat_warn_triggers,
+)
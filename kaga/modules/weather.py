@@ -1,15 +1,13 @@
 import json
-import time
 
-import requests
 from pytz import country_names as cname
 from telegram import ParseMode
-from telegram.error import BadRequest
 
 from kaga import API_WEATHER as APPID
 from kaga import dispatcher
 from kaga.modules.disable import DisableAbleCommandHandler
-from kaga.modules.helper_funcs.alternate import typing_action
+from kaga.modules.helper_funcs import http_client
+from kaga.modules.helper_funcs.alternate import delete_after, typing_action
 
 
 @typing_action
@@ -22,21 +20,13 @@ def weather(update, context):
             parse_mode=ParseMode.MARKDOWN,
             disable_web_page_preview=True,
         )
-        time.sleep(5)
-        try:
-            del_msg.delete()
-            update.effective_message.delete()
-        except BadRequest as err:
-            if (err.message == "Message to delete not found") or (
-                err.message == "Message can't be deleted"
-            ):
-                return
+        delete_after(5, del_msg, update.effective_message)
 
         return
 
     CITY = " ".join(args)
     url = f"https://api.openweathermap.org/data/2.5/weather?q={CITY}&appid={APPID}"
-    request = requests.get(url)
+    request = http_client.get(url, cache_ttl=10 * 60)
     result = json.loads(request.text)
     if request.status_code != 200:
         reply = "Lokasi tidak valid."
@@ -45,15 +35,7 @@ def weather(update, context):
             parse_mode=ParseMode.MARKDOWN,
             disable_web_page_preview=True,
         )
-        time.sleep(5)
-        try:
-            del_msg.delete()
-            update.effective_message.delete()
-        except BadRequest as err:
-            if (err.message == "Message to delete not found") or (
-                err.message == "Message can't be deleted"
-            ):
-                return
+        delete_after(5, del_msg, update.effective_message)
         return
 
     try:
@@ -112,15 +94,7 @@ def weather(update, context):
         parse_mode=ParseMode.MARKDOWN,
         disable_web_page_preview=True,
     )
-    time.sleep(30)
-    try:
-        del_msg.delete()
-        update.effective_message.delete()
-    except BadRequest as err:
-        if (err.message == "Message to delete not found") or (
-            err.message == "Message can't be deleted"
-        ):
-            return
+    delete_after(30, del_msg, update.effective_message)
 
 
 __help__ = """
@@ -1,16 +1,24 @@
 import html
 import random
 import re
+import threading
 import time
+from collections import deque
 from functools import partial
 
+from cachetools import TTLCache
+
 import kaga.modules.sql.welcome_sql as sql
-from kaga import (DEV_USERS, LOGGER, OWNER_ID, spamwtc, dispatcher, JOIN_LOGGER)
+from kaga import (DEV_USERS, LOGGER, OWNER_ID, dispatcher, JOIN_LOGGER)
 from kaga.modules.helper_funcs.chat_status import (
+    forget_chat_member,
+    invalidate_admin_cache,
     is_user_ban_protected,
     user_admin,
 )
 from kaga.modules.helper_funcs.alternate import send_message, typing_action
+from kaga.modules.helper_funcs.antispam import get_spamwatch_ban
+from kaga.modules.helper_funcs.fanout import INTERACTIVE_EXECUTOR, fan_out
 from kaga.modules.helper_funcs.misc import build_keyboard, revert_buttons
 from kaga.modules.helper_funcs.msg_types import get_welcome_type
 from kaga.modules.helper_funcs.string_handling import (
@@ -62,6 +70,124 @@ ENUM_FUNC_MAP = {
 VERIFIED_USER_WAITLIST = {}
 WELCOMEMUTEVIDEO = "https://telegra.ph/file/448b68c62cb25ae933137.gif"
 
+# Raid mode, off unless a chat turns it on: once the chat's threshold of
+# members join within RAID_WINDOW, welcomes stop, joiners are muted in
+# batches and counted in one summary message. It ends when the joins in the
+# window drop under half the threshold.
+RAID_WINDOW = 60  # seconds
+RAID_FLUSH_INTERVAL = 5  # seconds
+MIN_RAID_THRESHOLD = 5
+MAX_RAID_MUTE_HOURS = 7 * 24
+RAID_LOCK = threading.Lock()
+CHAT_JOINS = TTLCache(maxsize=50000, ttl=RAID_WINDOW)  # chat_id -> join times
+# chat_id -> {"pending": [user_id], "muted": int, "message_id",
+#             "threshold": int, "mute_time": seconds}
+RAIDS = {}
+
+
+def __count_joins(chat_id, now, joined=0) -> int:
+    joins = CHAT_JOINS.get(chat_id) or deque()
+    joins.extend([now] * joined)
+    while joins and now - joins[0] > RAID_WINDOW:
+        joins.popleft()
+    if joins:
+        CHAT_JOINS[chat_id] = joins
+    return len(joins)
+
+
+def track_raid(chat_id, joined, suspects, threshold, mute_time):
+    """Count `joined` new members, queueing `suspects` while under a raid.
+
+    Returns None when the chat isn't raided, else whether the raid just began.
+    """
+    with RAID_LOCK:
+        joins = __count_joins(chat_id, time.monotonic(), joined)
+        raid = RAIDS.get(chat_id)
+        started = raid is None
+        if started:
+            if joins < threshold:
+                return None
+            raid = RAIDS[chat_id] = {
+                "pending": [],
+                "muted": 0,
+                "message_id": None,
+                "threshold": threshold,
+                "mute_time": mute_time,
+            }
+        raid["pending"].extend(suspects)
+    return started
+
+
+def end_raid(chat_id):
+    """Stop a chat's raid, when raid mode is turned off during one."""
+    with RAID_LOCK:
+        RAIDS.pop(chat_id, None)
+        CHAT_JOINS.pop(chat_id, None)
+
+
+def __raid_summary(bot, chat_id, raid, text):
+    try:
+        if raid["message_id"]:
+            bot.edit_message_text(text, chat_id, raid["message_id"])
+        else:
+            raid["message_id"] = bot.send_message(chat_id, text).message_id
+    except BadRequest:
+        pass
+
+
+def __mute_raider(bot, chat_id, until, user_id):
+    bot.restrict_chat_member(
+        chat_id,
+        user_id,
+        permissions=ChatPermissions(can_send_messages=False),
+        until_date=until,
+    )
+    return True
+
+
+def flush_raids(context):
+    bot = context.bot
+    now = time.monotonic()
+    with RAID_LOCK:
+        batches = []
+        ended = []
+        for chat_id, raid in list(RAIDS.items()):
+            if raid["pending"]:
+                batches.append((chat_id, raid, raid["pending"]))
+                raid["pending"] = []
+                raid["muted"] += len(batches[-1][2])
+            elif __count_joins(chat_id, now) < raid["threshold"] // 2:
+                ended.append((chat_id, RAIDS.pop(chat_id)))
+
+    for chat_id, raid, user_ids in batches:
+        until = int(time.time() + raid["mute_time"])
+        fan_out(
+            "raid mute {}".format(chat_id),
+            user_ids,
+            partial(__mute_raider, bot, chat_id, until),
+            executor=INTERACTIVE_EXECUTOR,
+        )
+        __raid_summary(
+            bot,
+            chat_id,
+            raid,
+            "Mode anti-raid aktif! Terlalu banyak anggota baru bergabung, "
+            "{} dari mereka dibisukan selama {} jam.".format(
+                raid["muted"], raid["mute_time"] // 3600
+            ),
+        )
+
+    for chat_id, raid in ended:
+        __raid_summary(
+            bot,
+            chat_id,
+            raid,
+            "Mode anti-raid selesai, {} anggota baru dibisukan selama {} jam.".format(
+                raid["muted"], raid["mute_time"] // 3600
+            ),
+        )
+
+
 # do not async
 def send(update, message, keyboard, backup_message):
     chat = update.effective_chat
@@ -134,13 +260,46 @@ def new_member(update, context):
     user = update.effective_user
     msg = update.effective_message
 
+    new_members = update.effective_message.new_chat_members
+    if any(new_mem.id == bot.id for new_mem in new_members):
+        # Re-added, our own rights may have changed
+        invalidate_admin_cache(chat.id)
+
+    raid_mode, raid_threshold, raid_mute_time = sql.get_raid_mode(chat.id)
+    raid_started = None
+    if raid_mode:
+        raid_started = track_raid(
+            chat.id,
+            len(new_members),
+            [
+                new_mem.id
+                for new_mem in new_members
+                if new_mem.id != bot.id
+                and not new_mem.is_bot
+                and not is_user_ban_protected(chat, new_mem.id)
+            ],
+            raid_threshold,
+            raid_mute_time,
+        )
+    if raid_started is not None:
+        # No welcomes while raided, flush_raids mutes and reports the joiners
+        if sql.clean_service(chat.id):
+            try:
+                msg.delete()
+            except BadRequest:
+                pass
+        if raid_started:
+            return (f"{html.escape(chat.title)}\n"
+                    f"#RAID\n"
+                    f"Mode anti-raid aktif setelah {raid_threshold} anggota "
+                    f"bergabung dalam {RAID_WINDOW} detik")
+        return ""
+
     should_welc, cust_welcome, cust_content, welc_type = sql.get_welc_pref(
         chat.id)
     welc_mutes = sql.welcome_mutes(chat.id)
     human_checks = sql.get_human_checks(user.id, chat.id)
 
-    new_members = update.effective_message.new_chat_members
-
     for new_mem in new_members:
 
         welcome_log = None
@@ -150,10 +309,8 @@ def new_member(update, context):
         welcome_bool = True
         media_wel = False
 
-        if spamwtc != None:
-            sw_ban = spamwtc.get_ban(new_mem.id)
-            if sw_ban:
-                return
+        if get_spamwatch_ban(new_mem.id):
+            return
 
         if should_welc:
 
@@ -211,8 +368,7 @@ def new_member(update, context):
                 continue
 
             else:
-                buttons = sql.get_welc_buttons(chat.id)
-                keyb = build_keyboard(buttons)
+                keyb = sql.get_welc_keyboard(chat.id)
 
                 if welc_type not in (sql.Types.TEXT, sql.Types.BUTTON_TEXT):
                     media_wel = True
@@ -271,8 +427,7 @@ def new_member(update, context):
             reply = None
 
         # User exceptions from welcomemutes
-        if (is_user_ban_protected(chat, new_mem.id, chat.get_member(new_mem.id))
-                or human_checks):
+        if is_user_ban_protected(chat, new_mem.id) or human_checks:
             should_mute = False
         # Join welcome: soft mute
         if new_mem.is_bot:
@@ -416,6 +571,11 @@ def left_member(update, context):
     user = update.effective_user
     should_goodbye, cust_goodbye, goodbye_type = sql.get_gdbye_pref(chat.id)
 
+    if update.effective_message.left_chat_member:
+        forget_chat_member(
+            chat.id, update.effective_message.left_chat_member.id
+        )
+
     if user.id == bot.id:
         return
 
@@ -435,10 +595,8 @@ def left_member(update, context):
         if left_mem:
 
             # Thingy for spamwatched users
-            if spamwtc != None:
-                sw_ban = spamwtc.get_ban(left_mem.id)
-                if sw_ban:
-                    return
+            if get_spamwatch_ban(left_mem.id):
+                return
 
             # Dont say goodbyes to gbanned users
             if is_user_gbanned(left_mem.id):
@@ -498,8 +656,7 @@ def left_member(update, context):
                     chatname=escape_markdown(chat.title),
                     id=left_mem.id,
                 )
-                buttons = sql.get_gdbye_buttons(chat.id)
-                keyb = build_keyboard(buttons)
+                keyb = sql.get_gdbye_keyboard(chat.id)
 
             else:
                 res = random.choice(
@@ -830,6 +987,82 @@ def cleanservice(update, context) -> str:
                 "Layanan pembersihan selamat datang : off", parse_mode=ParseMode.MARKDOWN)
 
 
+@typing_action
+@user_admin
+@loggable
+def raidmode(update, context) -> str:
+    args = context.args
+    chat = update.effective_chat
+    user = update.effective_user
+    msg = update.effective_message
+
+    if not args:
+        enabled, threshold, mute_time = sql.get_raid_mode(chat.id)
+        msg.reply_text(
+            "Mode anti-raid: `{}`\n"
+            "Aktif setelah `{}` anggota bergabung dalam {} detik, "
+            "mereka dibisukan selama `{}` jam.\n"
+            "Penggunaan: `/raidmode on [jumlah anggota] [jam]` atau `/raidmode off`".format(
+                "on" if enabled else "off",
+                threshold,
+                RAID_WINDOW,
+                mute_time // 3600,
+            ),
+            parse_mode=ParseMode.MARKDOWN,
+        )
+        return ""
+
+    if args[0].lower() in ("off", "no"):
+        sql.set_raid_mode(chat.id, False)
+        end_raid(chat.id)
+        msg.reply_text("Mode anti-raid : off")
+        return (
+            f"<b>{html.escape(chat.title)}:</b>\n"
+            f"#RAID_MODE\n"
+            f"<b>• Admin:</b> {mention_html(user.id, user.first_name)}\n"
+            f"Has toggled raid mode to <b>OFF</b>.")
+
+    if args[0].lower() not in ("on", "yes"):
+        msg.reply_text(
+            "Saya hanya mengerti 'on/yes' atau 'off/no'.")
+        return ""
+
+    threshold = mute_hours = None
+    try:
+        if len(args) >= 2:
+            threshold = int(args[1])
+        if len(args) >= 3:
+            mute_hours = int(args[2])
+    except ValueError:
+        msg.reply_text("Jumlah anggota dan jam harus berupa angka.")
+        return ""
+    if threshold is not None and threshold < MIN_RAID_THRESHOLD:
+        msg.reply_text(
+            "Jumlah anggota minimal {}.".format(MIN_RAID_THRESHOLD))
+        return ""
+    if mute_hours is not None and not 1 <= mute_hours <= MAX_RAID_MUTE_HOURS:
+        msg.reply_text(
+            "Jam harus antara 1 dan {}.".format(MAX_RAID_MUTE_HOURS))
+        return ""
+
+    sql.set_raid_mode(
+        chat.id,
+        True,
+        threshold=threshold,
+        mute_time=mute_hours * 3600 if mute_hours is not None else None,
+    )
+    _, threshold, mute_time = sql.get_raid_mode(chat.id)
+    msg.reply_text(
+        "Mode anti-raid : on\n"
+        "Anggota baru dibisukan selama {} jam setelah {} anggota bergabung "
+        "dalam {} detik.".format(mute_time // 3600, threshold, RAID_WINDOW))
+    return (
+        f"<b>{html.escape(chat.title)}:</b>\n"
+        f"#RAID_MODE\n"
+        f"<b>• Admin:</b> {mention_html(user.id, user.first_name)}\n"
+        f"Has toggled raid mode to <b>ON</b> ({threshold} joins, {mute_time // 3600}h).")
+
+
 @typing_action
 def user_button(update, context):
     chat = update.effective_chat
@@ -977,6 +1210,7 @@ __help__ = """
  × /cleanwelcome <on/off>*:* Pada anggota baru, coba hapus pesan selamat datang sebelumnya untuk menghindari spamming pada obrolan.
  × /welcomemutehelp*:* memberikan informasi tentang pembungkaman selamat datang.
  × /cleanservice <on/off*:* menghapus pesan layanan selamat datang / tinggalkan telegram.
+ × /raidmode <on/off> [jumlah anggota] [jam]*:* bila terlalu banyak anggota bergabung dalam satu menit, hentikan pesan selamat datang dan bisukan anggota baru (bawaan: 20 anggota, 24 jam). Nonaktif secara bawaan.
  *Contoh:*
 pengguna bergabung dengan obrolan, pengguna meninggalkan obrolan.
 
@@ -1000,6 +1234,8 @@ WELCOMEMUTE_HANDLER = CommandHandler(
     "welcomemute", welcomemute, filters=Filters.chat_type.groups, run_async=True)
 CLEAN_SERVICE_HANDLER = CommandHandler(
     "cleanservice", cleanservice, filters=Filters.chat_type.groups, run_async=True)
+RAID_MODE_HANDLER = CommandHandler(
+    "raidmode", raidmode, filters=Filters.chat_type.groups, run_async=True)
 CLEAN_WELCOME = CommandHandler(
     "cleanwelcome", clean_welcome, filters=Filters.chat_type.groups, run_async=True)
 WELCOME_HELP = CommandHandler("welcomehelp", welcome_help, run_async=True)
@@ -1007,6 +1243,9 @@ WELCOME_MUTE_HELP = CommandHandler("welcomemutehelp", welcome_mute_help, run_asy
 BUTTON_VERIFY_HANDLER = CallbackQueryHandler(user_button, pattern=r"user_join_", run_async=True)
 
 dispatcher.add_handler(NEW_MEM_HANDLER)
+dispatcher.job_queue.run_repeating(
+    flush_raids, interval=RAID_FLUSH_INTERVAL, first=RAID_FLUSH_INTERVAL
+)
 dispatcher.add_handler(LEFT_MEM_HANDLER)
 dispatcher.add_handler(WELC_PREF_HANDLER)
 dispatcher.add_handler(GOODBYE_PREF_HANDLER)
@@ -1018,6 +1257,7 @@ dispatcher.add_handler(CLEAN_WELCOME)
 dispatcher.add_handler(WELCOME_HELP)
 dispatcher.add_handler(WELCOMEMUTE_HANDLER)
 dispatcher.add_handler(CLEAN_SERVICE_HANDLER)
+dispatcher.add_handler(RAID_MODE_HANDLER)
 dispatcher.add_handler(BUTTON_VERIFY_HANDLER)
 dispatcher.add_handler(WELCOME_MUTE_HELP)
 
@@ -1036,6 +1276,7 @@ __handlers__ = [
     WELCOME_HELP,
     WELCOMEMUTE_HANDLER,
     CLEAN_SERVICE_HANDLER,
+    RAID_MODE_HANDLER,
     BUTTON_VERIFY_HANDLER,
     WELCOME_MUTE_HELP,
 ]